@@ -78,6 +78,12 @@ def create_app(config_name='default'):
     # Импорт моделей для регистрации в SQLAlchemy
     from app import models
     
+    # Инкрементальное обновление in-memory индекса алертов
+    from app.services.alert_index import register_alert_index_events
+    register_alert_index_events()
+    from app.services.stats_service import register_daily_stats_events
+    register_daily_stats_events()
+    
     # Регистрация blueprints
     from app.routes import bp as main_bp
     from app.routes import auth, practice, doctor, patient, booking, search, legal, calendar_integration, chat, help_chat, admin
@@ -178,4 +184,84 @@ def create_app(config_name='default'):
         db.session.commit()
         print("Тестовые данные созданы успешно!")
 
+    @app.cli.command("send-reminders")
+    @click.option('--batch-size', type=int, default=None, help='Размер пачки')
+    @click.option('--max-batches', type=int, default=None, help='Максимум пачек за запуск')
+    def send_reminders(batch_size, max_batches):
+        """Отправить напоминания о терминах (запускать по cron)"""
+        from app.services.reminder_service import dispatch_due_reminders
+
+        run = dispatch_due_reminders(batch_size=batch_size, max_batches=max_batches)
+        print(f"Отправлено напоминаний: {run.succeeded} ({run.throughput_per_second} в секунду)")
+
+    @app.cli.command("sweep-bookings")
+    @click.option('--batch-size', type=int, default=None, help='Размер пачки')
+    @click.option('--grace-hours', type=int, default=None, help='Часов после окончания термина')
+    def sweep_bookings(batch_size, grace_hours):
+        """Закрыть прошедшие неотмеченные термины как completed (запускать по cron)"""
+        from app.services.booking_sweeper import sweep_past_bookings
+
+        run = sweep_past_bookings(batch_size=batch_size, grace_hours=grace_hours)
+        print(f"Закрыто бронирований: {run.succeeded} ({run.throughput_per_second} в секунду)")
+
+    @app.cli.command("process-waitlist")
+    @click.option('--batch-size', type=int, default=None, help='Размер пачки')
+    def process_waitlist(batch_size):
+        """Истекшие предложения листа ожидания передать следующим пациентам (запускать каждую минуту)"""
+        from app.services.waitlist_service import expire_offers
+
+        run = expire_offers(batch_size=batch_size)
+        print(f"Истекло предложений: {run.processed}, предложено заново: {run.succeeded}")
+
+    @app.cli.command("send-notifications")
+    @click.option('--batch-size', type=int, default=None, help='Пациентов за пачку')
+    def send_notifications(batch_size):
+        """Отправить дайджесты уведомлений по алертам из outbox (запускать каждые несколько минут)"""
+        from app.services.notification_service import dispatch_notification_digests
+
+        run = dispatch_notification_digests(batch_size=batch_size)
+        print(f"Отправлено дайджестов: {run.succeeded} уведомлений ({run.throughput_per_second} в секунду)")
+
+    @app.cli.command("refresh-daily-stats")
+    @click.option('--batch-size', type=int, default=None, help='Дней врачей за пачку')
+    def refresh_daily_stats_command(batch_size):
+        """Пересчитать помеченные дни daily_stats (worker делает это каждую минуту)"""
+        from app.services.stats_service import refresh_daily_stats
+
+        run = refresh_daily_stats(batch_size=batch_size)
+        print(f"Пересчитано дней врачей: {run.processed}")
+
+    @app.cli.command("backfill-daily-stats")
+    @click.option('--days-back', type=int, default=365, help='Дней в прошлое')
+    @click.option('--days-ahead', type=int, default=90, help='Дней в будущее')
+    @click.option('--batch-size', type=int, default=None, help='Дней врачей за пачку')
+    def backfill_daily_stats_command(days_back, days_ahead, batch_size):
+        """Заполнить daily_stats по существующим слотам и бронированиям"""
+        from app.services.stats_service import backfill_daily_stats
+
+        run = backfill_daily_stats(days_back=days_back, days_ahead=days_ahead, batch_size=batch_size)
+        print(f"Заполнено дней врачей: {run.processed} ({run.throughput_per_second} в секунду)")
+
+    @app.cli.command("rebuild-recommendations")
+    @click.option('--speciality', default=None, help='Только эта специальность')
+    def rebuild_recommendations_command(speciality):
+        """Пересчитать снимок рекомендуемых врачей (worker делает это каждые 5 минут)"""
+        from app.services.recommendation_service import rebuild_recommendations
+
+        run = rebuild_recommendations(speciality=speciality)
+        print(f"Рекомендаций в снимке: {run.succeeded}")
+
+    @app.cli.command("job-stats")
+    @click.option('--hours', type=int, default=24, help='За сколько часов')
+    def job_stats(hours):
+        """Метрики фоновых задач: количество и время выполнения по типу/статусу"""
+        from app.services.job_queue import job_metrics
+        from datetime import datetime, timedelta
+
+        for row in job_metrics(since=datetime.utcnow() - timedelta(hours=hours)):
+            print(
+                f"{row['job_type']:<25} {row['status']:<10} {row['count']:>6}  "
+                f"avg {row['avg_duration_ms']} ms  max {row['max_duration_ms']} ms  wait {row['avg_wait_ms']} ms"
+            )
+
     return app
@@ -11,6 +11,13 @@ from app.models.patient_alert import PatientAlert
 from app.models.booking import Booking
 from app.models.practice_review import PracticeReview
 from app.models.admin import Admin
+from app.models.task_run import TaskRun
+from app.models.slot_offer import SlotOffer
+from app.models.notification_outbox import NotificationOutbox
+from app.models.background_job import BackgroundJob
+from app.models.daily_stat import DailyStat
+from app.models.doctor_recommendation import DoctorRecommendation
+from app.models.external_calendar_event import ExternalCalendarEvent
 
 __all__ = [
     'Practice',
@@ -23,4 +30,11 @@ __all__ = [
     'Booking',
     'PracticeReview',
     'Admin',
+    'TaskRun',
+    'SlotOffer',
+    'NotificationOutbox',
+    'BackgroundJob',
+    'DailyStat',
+    'DoctorRecommendation',
+    'ExternalCalendarEvent',
 ]
@@ -0,0 +1,95 @@
+"""
+BackgroundJob Model - Персистентная очередь фоновых задач
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+import json
+
+
+class BackgroundJob(db.Model):
+    """
+    Фоновая задача (проверка алертов, предложение слота и т.д.)
+
+    Воркеры захватывают задачи через FOR UPDATE SKIP LOCKED, поэтому
+    несколько процессов worker.py могут работать одновременно.
+    """
+    __tablename__ = 'background_jobs'
+    __table_args__ = (
+        db.Index('ix_background_jobs_status_run_at', 'status', 'run_at'),
+        db.Index('ix_background_jobs_type_created', 'job_type', 'created_at'),
+        get_table_args(),
+    )
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Задача
+    job_type = db.Column(db.String(50), nullable=False)
+    # Например: 'alerts.check_doctor', 'waitlist.offer_slot'
+    payload = db.Column(db.Text, nullable=True)  # JSON аргументы
+
+    # Статус
+    status = db.Column(db.String(20), default='queued', nullable=False)
+    # Возможные значения: 'queued', 'running', 'succeeded', 'failed'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    progress = db.Column(db.Text, nullable=True)  # JSON прогресс длинной задачи (report_progress)
+
+    # Планирование и блокировка
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=True)
+
+    # Метрики
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    wait_ms = db.Column(db.Integer, nullable=True)  # от run_at до старта последней попытки
+    duration_ms = db.Column(db.Integer, nullable=True)  # длительность последней попытки
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.job_type} ({self.status})>'
+
+    @property
+    def payload_dict(self):
+        """Получить payload как словарь"""
+        if self.payload:
+            try:
+                return json.loads(self.payload)
+            except (TypeError, ValueError):
+                return {}
+        return {}
+
+    @property
+    def progress_dict(self):
+        """Получить progress как словарь"""
+        if self.progress:
+            try:
+                return json.loads(self.progress)
+            except (TypeError, ValueError):
+                return {}
+        return {}
+
+    def to_dict(self):
+        """Сериализация для API"""
+        return {
+            'id': str(self.id),
+            'job_type': self.job_type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'last_error': self.last_error,
+            'progress': self.progress_dict,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'wait_ms': self.wait_ms,
+            'duration_ms': self.duration_ms,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
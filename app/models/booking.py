@@ -18,13 +18,25 @@ class Booking(db.Model):
     Связывает пациента со слотом через Stripe оплату
     """
     __tablename__ = 'bookings'
-    __table_args__ = get_table_args()
+    __table_args__ = (
+        # История бронирований пациента: keyset-пагинация по статусу и дате создания
+        db.Index('ix_bookings_patient_status_created', 'patient_id', 'status', 'created_at'),
+        # Поиск неотправленных напоминаний (join с time_slots по timeslot_id)
+        db.Index('ix_bookings_reminder_due', 'reminder_sent', 'status', 'timeslot_id'),
+        # Один активный термин на слот; отмененные бронирования не мешают перебронированию
+        db.Index(
+            'uq_bookings_active_timeslot', 'timeslot_id', unique=True,
+            postgresql_where=db.text("status <> 'cancelled'"),
+            sqlite_where=db.text("status <> 'cancelled'")
+        ),
+        get_table_args(),
+    )
     
     # Primary Key
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     
     # Foreign Keys
-    timeslot_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.time_slots.id'), nullable=False, unique=True, index=True)
+    timeslot_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.time_slots.id'), nullable=False, index=True)
     patient_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.patients.id'), nullable=False, index=True)
     
     # Статус
@@ -62,7 +74,7 @@ class Booking(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
-    timeslot = db.relationship('TimeSlot', back_populates='booking')
+    timeslot = db.relationship('TimeSlot')
     patient = db.relationship('Patient', back_populates='bookings')
     
     def __repr__(self):
@@ -161,18 +173,31 @@ class Booking(db.Model):
         else:
             return "Keine Rückerstattung möglich"
     
-    def mark_attended(self, attended=True):
-        """Отметить посещение/неявку"""
+    def mark_attended(self, attended=True, commit=True):
+        """
+        Отметить посещение/неявку
+
+        Если sweeper уже закрыл бронирование, счетчики пациента
+        корректируются, а не увеличиваются повторно.
+        """
+        previous_status = self.status
         self.attended = attended
+        self.status = 'completed' if attended else 'no_show'
         
-        if attended:
-            self.status = 'completed'
+        if previous_status == self.status:
+            # Повторная отметка - счетчики не меняются
+            pass
+        elif attended:
             self.patient.attended_appointments += 1
+            if previous_status == 'no_show':
+                self.patient.no_show_count -= 1
         else:
-            self.status = 'no_show'
             self.patient.no_show_count += 1
+            if previous_status == 'completed':
+                self.patient.attended_appointments -= 1
         
-        db.session.commit()
+        if commit:
+            db.session.commit()
     
     def cancel(self, cancelled_by='patient', reason=None):
         """
@@ -201,9 +226,13 @@ class Booking(db.Model):
         if self.timeslot:
             self.timeslot.status = 'available'
             
-            # TODO: Send alerts and cancellation notifications
-            # Note: Email notifications temporarily disabled after Redis removal
-            # Will implement direct email sending in future if needed
+            # Лист ожидания: слот предлагается следующему пациенту фоновой задачей
+            from app.services.waitlist_service import on_slot_released
+            on_slot_released(self.timeslot_id, exclude_patient_id=self.patient_id, commit=False)
+        
+        # Внешние календари врача: событие термина удаляется фоновой задачей
+        from app.services.calendar_integration_service import on_booking_changed
+        on_booking_changed(self, commit=False)
         
         # Обновляем статистику пациента (опционально уменьшаем счетчик)
         # self.patient.total_bookings -= 1  # Можно раскомментировать если нужно
@@ -173,7 +173,7 @@ class TimeSlot(db.Model):
     
     # Статус
     status = db.Column(db.String(20), default='available', nullable=False, index=True)
-    # Возможные значения: 'available', 'booked', 'blocked'
+    # Возможные значения: 'available', 'booked', 'blocked', 'held' (предложен из листа ожидания)
     
     # Если заблокирован вручную (обед, meeting и т.д.)
     block_reason = db.Column(db.String(200), nullable=True)
@@ -184,7 +184,13 @@ class TimeSlot(db.Model):
     
     # Relationships
     calendar = db.relationship('Calendar', back_populates='time_slots')
-    booking = db.relationship('Booking', back_populates='timeslot', uselist=False)
+    # Активное (не отмененное) бронирование слота
+    booking = db.relationship(
+        'Booking',
+        primaryjoin="and_(TimeSlot.id == Booking.timeslot_id, Booking.status != 'cancelled')",
+        uselist=False,
+        viewonly=True
+    )
     
     def __repr__(self):
         return f'<TimeSlot {self.start_time} - {self.status}>'
@@ -15,7 +15,10 @@ class CalendarIntegration(db.Model):
     Поддерживает: Google Calendar, Apple/iCloud Calendar, Outlook/Office 365, CalDAV
     """
     __tablename__ = 'calendar_integrations'
-    __table_args__ = get_table_args()
+    __table_args__ = (
+        db.Index('ix_calendar_integrations_next_sync_at', 'next_sync_at'),
+        get_table_args(),
+    )
     
     # Primary Key
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -49,12 +52,20 @@ class CalendarIntegration(db.Model):
     
     # Статус синхронизации
     last_sync_at = db.Column(db.DateTime, nullable=True)
-    next_sync_at = db.Column(db.DateTime, nullable=True)
+    next_sync_at = db.Column(db.DateTime, nullable=True)  # Плановая синхронизация (worker), NULL - как можно скорее
+    sync_interval_seconds = db.Column(db.Integer, nullable=True)  # Текущий адаптивный интервал плановой синхронизации
+    sync_requested_at = db.Column(db.DateTime, nullable=True)  # Первое необработанное webhook-уведомление
+    sync_locked_until = db.Column(db.DateTime, nullable=True)  # Аренда воркера на время синхронизации
     sync_status = db.Column(db.String(20), default='active', nullable=False)
     # Допустимые значения: 'active', 'error', 'disconnected', 'paused'
     sync_error_message = db.Column(db.Text, nullable=True)
     sync_error_count = db.Column(db.Integer, default=0, nullable=False)
     
+    # Инкрементальная синхронизация
+    sync_cursor = db.Column(db.Text, nullable=True)  # Google syncToken / Graph deltaLink / CalDAV sync-token
+    sync_ctag = db.Column(db.String(200), nullable=True)  # CalDAV getctag на момент последней синхронизации
+    last_full_sync_at = db.Column(db.DateTime, nullable=True)  # Последняя полная синхронизация окна
+    
     # Webhook Configuration (для Google, Outlook)
     external_webhook_id = db.Column(db.String(200), nullable=True)  # Channel ID
     external_resource_id = db.Column(db.String(200), nullable=True)  # Resource ID
@@ -103,6 +114,7 @@ class CalendarIntegration(db.Model):
             'sync_status': self.sync_status,
             'last_sync_at': self.last_sync_at.isoformat() if self.last_sync_at else None,
             'next_sync_at': self.next_sync_at.isoformat() if self.next_sync_at else None,
+            'last_full_sync_at': self.last_full_sync_at.isoformat() if self.last_full_sync_at else None,
             'sync_error_message': self.sync_error_message if self.sync_status == 'error' else None,
             'settings': {
                 'event_title_template': self.event_title_template,
@@ -157,3 +169,9 @@ class CalendarIntegration(db.Model):
         self.sync_error_message = None
         if self.sync_status == 'paused':
             self.sync_status = 'active'
+    
+    def reset_sync_cursor(self):
+        """Забыть курсор - следующая синхронизация будет полной"""
+        self.sync_cursor = None
+        self.sync_ctag = None
+        self.last_full_sync_at = None
@@ -0,0 +1,65 @@
+"""
+DailyStat Model - Дневная статистика врача, практики и платформы
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+
+
+class DailyStat(db.Model):
+    """
+    Факт-таблица: состояние слотов и бронирований за день термина
+
+    scope: 'doctor', 'practice' или 'platform' (scope_id = PLATFORM_ID).
+    Строки врача пересчитываются по флагу dirty, который ставится при
+    изменении слотов и бронирований; строки практики и платформы -
+    суммы строк врачей за тот же день.
+    """
+    __tablename__ = 'daily_stats'
+    __table_args__ = (
+        db.UniqueConstraint('scope', 'scope_id', 'day', name='uq_daily_stats_scope_day'),
+        db.Index('ix_daily_stats_dirty', 'dirty', 'scope'),
+        get_table_args(),
+    )
+
+    # Строка платформы (NULL в уникальном ключе не сравнивается)
+    PLATFORM_ID = uuid.UUID(int=0)
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Ключ
+    scope = db.Column(db.String(20), nullable=False)
+    scope_id = db.Column(UUID(as_uuid=True), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    # Слоты по статусу
+    slots_total = db.Column(db.Integer, default=0, nullable=False)
+    slots_available = db.Column(db.Integer, default=0, nullable=False)
+    slots_booked = db.Column(db.Integer, default=0, nullable=False)
+    slots_blocked = db.Column(db.Integer, default=0, nullable=False)
+
+    # Бронирования по статусу
+    bookings_total = db.Column(db.Integer, default=0, nullable=False)
+    bookings_confirmed = db.Column(db.Integer, default=0, nullable=False)
+    bookings_completed = db.Column(db.Integer, default=0, nullable=False)
+    bookings_cancelled = db.Column(db.Integer, default=0, nullable=False)
+    bookings_no_show = db.Column(db.Integer, default=0, nullable=False)
+
+    # Выручка за вычетом возвратов
+    revenue = db.Column(db.Numeric(10, 2), default=0, nullable=False)
+
+    # Требует пересчета
+    dirty = db.Column(db.Boolean, default=True, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    COUNTERS = (
+        'slots_total', 'slots_available', 'slots_booked', 'slots_blocked',
+        'bookings_total', 'bookings_confirmed', 'bookings_completed',
+        'bookings_cancelled', 'bookings_no_show', 'revenue',
+    )
+
+    def __repr__(self):
+        return f'<DailyStat {self.scope}:{self.scope_id} {self.day}>'
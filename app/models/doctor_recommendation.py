@@ -0,0 +1,48 @@
+"""
+DoctorRecommendation Model - Снимок рекомендуемых врачей по специальности и городу
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+
+
+class DoctorRecommendation(db.Model):
+    """
+    Строка снимка рекомендаций: врач на месте rank в корзине (speciality, city_key)
+
+    city_key = '' - корзина специальности по всем городам. Снимок
+    пересчитывается целиком (по расписанию или при новых слотах), поэтому
+    free_slots_count и next_slot_at согласованы между собой.
+    """
+    __tablename__ = 'doctor_recommendations'
+    __table_args__ = (
+        db.Index('ix_doctor_recommendations_bucket', 'speciality', 'city_key', 'rank'),
+        get_table_args(),
+    )
+
+    # Корзина "все города"
+    ANY_CITY = ''
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Корзина
+    speciality = db.Column(db.String(50), nullable=False)
+    city_key = db.Column(db.String(100), nullable=False, default='')
+    rank = db.Column(db.Integer, nullable=False)
+
+    # Врач (денормализовано для чтения одним запросом)
+    doctor_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.doctors.id', ondelete='CASCADE'), nullable=False)
+    doctor_name = db.Column(db.String(200), nullable=False)
+    practice_name = db.Column(db.String(200), nullable=True)
+    practice_city = db.Column(db.String(100), nullable=True)
+
+    # Доступность на момент снимка
+    free_slots_count = db.Column(db.Integer, default=0, nullable=False)
+    next_slot_at = db.Column(db.DateTime, nullable=True)
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<DoctorRecommendation {self.speciality}/{self.city_key or "*"} #{self.rank}>'
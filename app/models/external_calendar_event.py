@@ -0,0 +1,55 @@
+"""
+ExternalCalendarEvent Model - Связь бронирования с событием во внешнем календаре
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+
+
+class ExternalCalendarEvent(db.Model):
+    """
+    Событие, созданное TerminFinder во внешнем календаре для бронирования
+
+    По этой связи отмена и перенос бронирования отправляются точечным
+    update/delete, а синхронизация одним запросом узнает свои события
+    среди изменений провайдера.
+    """
+    __tablename__ = 'external_calendar_events'
+    __table_args__ = (
+        db.UniqueConstraint('integration_id', 'booking_id', name='uq_external_calendar_events_booking'),
+        db.Index('ix_external_calendar_events_event', 'integration_id', 'external_event_id'),
+        get_table_args(),
+    )
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Foreign Keys
+    integration_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.calendar_integrations.id', ondelete='CASCADE'), nullable=False)
+    booking_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.bookings.id', ondelete='CASCADE'), nullable=False, index=True)
+
+    # Событие у провайдера
+    provider = db.Column(db.String(20), nullable=False)
+    external_event_id = db.Column(db.String(500), nullable=False)
+    etag = db.Column(db.String(200), nullable=True)  # Версия события у провайдера (если известна)
+
+    # Время термина, отправленное провайдеру (для поиска переносов)
+    start_time = db.Column(db.DateTime, nullable=False)
+    end_time = db.Column(db.DateTime, nullable=False)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    integration = db.relationship('CalendarIntegration')
+
+    def __repr__(self):
+        return f'<ExternalCalendarEvent {self.provider}:{self.external_event_id} for Booking {self.booking_id}>'
+
+    def is_outdated(self, booking):
+        """Отличается ли время события от текущего времени бронирования"""
+        slot = booking.timeslot
+        return slot is not None and (self.start_time != slot.start_time or self.end_time != slot.end_time)
@@ -0,0 +1,64 @@
+"""
+NotificationOutbox Model - Очередь исходящих уведомлений
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+import json
+
+
+class NotificationOutbox(db.Model):
+    """
+    Уведомление, ожидающее отправки
+
+    Обработчики запросов только добавляют строки; отправкой занимается
+    периодическая задача, которая объединяет уведомления одного пациента
+    в дайджест (окно NOTIFICATION_DIGEST_WINDOW_MINUTES).
+    """
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_notification_outbox_status_patient', 'status', 'patient_id', 'created_at'),
+        get_table_args(),
+    )
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Тип уведомления
+    kind = db.Column(db.String(50), default='alert.slots', nullable=False)
+
+    # Получатель и источник
+    patient_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.patients.id'), nullable=False)
+    alert_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.patient_alerts.id', ondelete='SET NULL'), nullable=True)
+    doctor_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.doctors.id'), nullable=True)
+
+    # Содержимое (JSON): {'slots': [{'id', 'start'}], 'total': int}
+    payload = db.Column(db.Text, nullable=True)
+
+    # Статус
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    # Возможные значения: 'pending', 'sent', 'skipped', 'failed'
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    # Relationships
+    patient = db.relationship('Patient')
+    doctor = db.relationship('Doctor')
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.kind} for {self.patient_id} ({self.status})>'
+
+    @property
+    def payload_dict(self):
+        """Получить payload как словарь"""
+        if self.payload:
+            try:
+                return json.loads(self.payload)
+            except (TypeError, ValueError):
+                return {}
+        return {}
@@ -5,6 +5,7 @@ from app import db
 from app.models import get_table_args
 from datetime import datetime
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import validates
 import uuid
 import os
 
@@ -16,7 +17,14 @@ class PatientAlert(db.Model):
     Пациент может подписаться на уведомления для определенных критериев поиска
     """
     __tablename__ = 'patient_alerts'
-    __table_args__ = get_table_args()
+    __table_args__ = (
+        # Очередь листа ожидания: алерты на врача / на специальность в порядке создания
+        db.Index('ix_patient_alerts_waitlist_doctor', 'doctor_id', 'is_active', 'created_at'),
+        db.Index('ix_patient_alerts_waitlist_speciality', 'speciality', 'is_active', 'created_at'),
+        # Матчинг слотов: бакет (специальность, нормализованный город)
+        db.Index('ix_patient_alerts_speciality_city', 'speciality', 'city_key', 'is_active'),
+        get_table_args(),
+    )
     
     # Primary Key
     id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -28,6 +36,7 @@ class PatientAlert(db.Model):
     # Критерии поиска
     speciality = db.Column(db.String(50), nullable=True)  # Если не указан конкретный врач
     city = db.Column(db.String(100), nullable=True)
+    city_key = db.Column(db.String(100), nullable=True)  # normalize_city(city), заполняется автоматически
     date_from = db.Column(db.Date, nullable=True)  # Желаемый период
     date_to = db.Column(db.Date, nullable=True)
     
@@ -43,6 +52,10 @@ class PatientAlert(db.Model):
     last_notification_at = db.Column(db.DateTime, nullable=True)
     last_slot_notified_id = db.Column(UUID(as_uuid=True), nullable=True)  # Чтобы не отправлять дубли
     
+    # Уже отправленные слоты: компактный Bloom-фильтр (см. notification_service.SlotSeenSet)
+    seen_slots = db.Column(db.LargeBinary, nullable=True)
+    seen_slots_count = db.Column(db.Integer, default=0, nullable=False)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -51,6 +64,25 @@ class PatientAlert(db.Model):
     patient = db.relationship('Patient', back_populates='alerts')
     doctor = db.relationship('Doctor', foreign_keys=[doctor_id])
     
+    @staticmethod
+    def normalize_city(value):
+        """
+        Нормализованный ключ города: без лишних пробелов, в нижнем регистре
+        
+        Returns:
+            str или None если город не указан
+        """
+        if not value:
+            return None
+        key = ' '.join(str(value).split()).lower()
+        return key or None
+    
+    @validates('city')
+    def _sync_city_key(self, key, value):
+        """Поддерживать city_key в соответствии с city"""
+        self.city_key = PatientAlert.normalize_city(value)
+        return value
+    
     def to_dict(self):
         """Сериализация для API"""
         from app.constants.specialities import SPECIALITIES
@@ -0,0 +1,75 @@
+"""
+SlotOffer Model - Предложение освободившегося слота из листа ожидания
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+
+
+class SlotOffer(db.Model):
+    """
+    Предложение освободившегося слота пациенту из листа ожидания
+
+    Пока предложение 'pending', слот имеет статус 'held' и доступен
+    для бронирования только этому пациенту до expires_at.
+    """
+    __tablename__ = 'slot_offers'
+    __table_args__ = (
+        db.UniqueConstraint('timeslot_id', 'patient_id', name='uq_slot_offers_slot_patient'),
+        db.Index('ix_slot_offers_status_expires', 'status', 'expires_at'),
+        get_table_args(),
+    )
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Foreign Keys
+    timeslot_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.time_slots.id'), nullable=False, index=True)
+    patient_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.patients.id'), nullable=False, index=True)
+    alert_id = db.Column(UUID(as_uuid=True), db.ForeignKey('terminfinder.patient_alerts.id', ondelete='SET NULL'), nullable=True)
+
+    # Статус
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    # Возможные значения: 'pending', 'accepted', 'declined', 'expired'
+
+    # Время
+    offered_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    responded_at = db.Column(db.DateTime, nullable=True)
+
+    # Relationships
+    timeslot = db.relationship('TimeSlot')
+    patient = db.relationship('Patient')
+    alert = db.relationship('PatientAlert')
+
+    def __repr__(self):
+        return f'<SlotOffer {self.timeslot_id} -> {self.patient_id} ({self.status})>'
+
+    def is_open(self, now=None):
+        """Предложение еще можно принять"""
+        now = now or datetime.utcnow()
+        return self.status == 'pending' and self.expires_at > now
+
+    def to_dict(self):
+        """Сериализация для API"""
+        slot = self.timeslot
+        doctor = slot.calendar.doctor if slot and slot.calendar else None
+
+        return {
+            'id': str(self.id),
+            'status': self.status,
+            'offered_at': self.offered_at.isoformat() if self.offered_at else None,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'slot': {
+                'id': str(slot.id),
+                'start_time': slot.start_time.isoformat(),
+                'end_time': slot.end_time.isoformat()
+            } if slot else None,
+            'doctor': {
+                'id': str(doctor.id),
+                'name': f"{doctor.first_name} {doctor.last_name}",
+                'speciality': doctor.speciality
+            } if doctor else None
+        }
@@ -0,0 +1,95 @@
+"""
+TaskRun Model - Журнал запусков периодических задач
+"""
+from app import db
+from app.models import get_table_args
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import UUID
+import uuid
+import json
+
+
+class TaskRun(db.Model):
+    """
+    Один запуск периодической задачи (напоминания, sweeper и т.д.)
+
+    Хранит длительность и счетчики обработки для метрик пропускной способности
+    """
+    __tablename__ = 'task_runs'
+    __table_args__ = (
+        db.Index('ix_task_runs_task_started', 'task_name', 'started_at'),
+        get_table_args(),
+    )
+
+    # Primary Key
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+
+    # Задача
+    task_name = db.Column(db.String(50), nullable=False)
+    # Например: 'booking.reminders'
+
+    # Время выполнения
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+
+    # Счетчики
+    processed = db.Column(db.Integer, default=0, nullable=False)
+    succeeded = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    skipped = db.Column(db.Integer, default=0, nullable=False)
+    batches = db.Column(db.Integer, default=0, nullable=False)
+
+    # Дополнительные данные (JSON)
+    details = db.Column(db.Text, nullable=True)
+
+    def __init__(self, **kwargs):
+        # default=0 колонок применяется только при INSERT, а счетчики
+        # увеличиваются (run.batches += 1) до сохранения записи
+        for counter in ('processed', 'succeeded', 'failed', 'skipped', 'batches'):
+            kwargs.setdefault(counter, 0)
+        super().__init__(**kwargs)
+
+    def __repr__(self):
+        return f'<TaskRun {self.task_name} {self.started_at}>'
+
+    @property
+    def details_dict(self):
+        """Получить details как словарь"""
+        if self.details:
+            try:
+                return json.loads(self.details)
+            except (TypeError, ValueError):
+                return {}
+        return {}
+
+    @property
+    def throughput_per_second(self):
+        """Обработано записей в секунду"""
+        if not self.duration_ms:
+            return None
+        return round(self.processed / (self.duration_ms / 1000), 2)
+
+    def finish(self, details=None):
+        """Зафиксировать окончание запуска"""
+        self.finished_at = datetime.utcnow()
+        self.duration_ms = int((self.finished_at - self.started_at).total_seconds() * 1000)
+        if details is not None:
+            self.details = json.dumps(details)
+
+    def to_dict(self):
+        """Сериализация для API"""
+        return {
+            'id': str(self.id),
+            'task_name': self.task_name,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'processed': self.processed,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'batches': self.batches,
+            'throughput_per_second': self.throughput_per_second,
+            'details': self.details_dict
+        }
@@ -1,12 +1,18 @@
 """
 Admin Routes - Админ-панель управления платформой
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, get_jwt
-from app.models import Admin, Patient, Doctor, Practice, Booking, TimeSlot, Calendar
+from app.models import Admin, Patient, Doctor, Practice, Booking, TimeSlot, Calendar, DailyStat, TaskRun
+from app.services.booking_service import booking_query, serialize_booking_summary
+from app.services.stats_service import mark_booking_days_dirty, mark_calendar_range_dirty, daily_stats_report
+from app.services.export_service import build_export_query, stream_export, FORMATS as EXPORT_FORMATS
+from app.services.calendar_http import latency_snapshot
+from app.utils.ttl_cache import TTLCache
 from app import db
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, true
+from sqlalchemy.orm import joinedload
 from functools import wraps
 import uuid
 
@@ -225,41 +231,88 @@ def api_admin_login():
     })
 
 
+# Кэш статистики дашборда (общий для всех админов процесса)
+_dashboard_stats_cache = TTLCache(max_entries=1)
+
+
 @admin_api.route('/dashboard/stats', methods=['GET'])
 @admin_required
 def api_dashboard_stats(admin):
-    """API: Статистика для дашборда"""
-    
-    # Общее количество пользователей
-    total_patients = Patient.query.count()
-    total_doctors = Doctor.query.count()
-    total_practices = Practice.query.count()
-    
-    # Количество за последние 30 дней
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    new_patients = Patient.query.filter(Patient.created_at >= thirty_days_ago).count()
-    new_doctors = Doctor.query.filter(Doctor.created_at >= thirty_days_ago).count()
-    
-    # Бронирования
-    total_bookings = Booking.query.count()
-    active_bookings = Booking.query.filter(Booking.status == 'confirmed').count()
-    cancelled_bookings = Booking.query.filter(Booking.status == 'cancelled').count()
-    completed_bookings = Booking.query.filter(Booking.status == 'completed').count()
-    
-    # Бронирования за последние 30 дней
-    recent_bookings = Booking.query.filter(Booking.created_at >= thirty_days_ago).count()
-    
-    # Верификация
-    verified_doctors = Doctor.query.filter(Doctor.is_verified == True).count()
-    unverified_doctors = Doctor.query.filter(Doctor.is_verified == False).count()
-    
-    # Доступные слоты
-    available_slots = TimeSlot.query.filter(
+    """
+    API: Статистика для дашборда
+
+    Один запрос (агрегаты с FILTER по каждой таблице), кэш на
+    ADMIN_STATS_CACHE_SECONDS; еще ADMIN_STATS_STALE_SECONDS отдается
+    прошлый результат, пока новый считается в фоне.
+    """
+    config = current_app.config
+    stats, age = _dashboard_stats_cache.get(
+        'dashboard',
+        _dashboard_stats,
+        ttl=config.get('ADMIN_STATS_CACHE_SECONDS', 30),
+        stale_ttl=config.get('ADMIN_STATS_STALE_SECONDS', 300)
+    )
+    return jsonify({**stats, 'cache_age_seconds': round(age, 1)})
+
+
+
+def _dashboard_stats():
+    """Все счетчики дашборда одним SELECT из однострочных подзапросов"""
+    now = datetime.utcnow()
+    thirty_days_ago = now - timedelta(days=30)
+
+    patients = db.session.query(
+        func.count().label('total'),
+        func.count().filter(Patient.created_at >= thirty_days_ago).label('new')
+    ).select_from(Patient).subquery()
+
+    doctors = db.session.query(
+        func.count().label('total'),
+        func.count().filter(Doctor.created_at >= thirty_days_ago).label('new'),
+        func.count().filter(Doctor.is_verified == True).label('verified'),
+        func.count().filter(Doctor.is_verified == False).label('unverified')
+    ).select_from(Doctor).subquery()
+
+    practices = db.session.query(
+        func.count().label('total')
+    ).select_from(Practice).subquery()
+
+    bookings = db.session.query(
+        func.count().label('total'),
+        func.count().filter(Booking.status == 'confirmed').label('active'),
+        func.count().filter(Booking.status == 'cancelled').label('cancelled'),
+        func.count().filter(Booking.status == 'completed').label('completed'),
+        func.count().filter(Booking.created_at >= thirty_days_ago).label('recent')
+    ).select_from(Booking).subquery()
+
+    slots = db.session.query(
+        func.count().label('available')
+    ).select_from(TimeSlot).filter(
         TimeSlot.status == 'available',
-        TimeSlot.start_time >= datetime.utcnow()
-    ).count()
-    
-    return jsonify({
+        TimeSlot.start_time >= now
+    ).subquery()
+
+    row = db.session.query(
+        patients.c.total, patients.c.new,
+        doctors.c.total, doctors.c.new, doctors.c.verified, doctors.c.unverified,
+        practices.c.total,
+        bookings.c.total, bookings.c.active, bookings.c.cancelled, bookings.c.completed, bookings.c.recent,
+        slots.c.available
+    ).select_from(patients).join(
+        doctors, true()
+    ).join(
+        practices, true()
+    ).join(
+        bookings, true()
+    ).join(
+        slots, true()
+    ).one()
+
+    (total_patients, new_patients, total_doctors, new_doctors, verified_doctors, unverified_doctors,
+     total_practices, total_bookings, active_bookings, cancelled_bookings, completed_bookings,
+     recent_bookings, available_slots) = row
+
+    return {
         'users': {
             'total_patients': total_patients,
             'total_doctors': total_doctors,
@@ -280,10 +333,79 @@ def api_dashboard_stats(admin):
         },
         'slots': {
             'available': available_slots
-        }
+        },
+        'generated_at': now.isoformat()
+    }
+
+
+@admin_api.route('/stats/daily', methods=['GET'])
+@admin_required
+def api_daily_stats(admin):
+    """
+    API: Дневная статистика платформы или практики из daily_stats
+    
+    Query params:
+    - practice_id: статистика практики (по умолчанию - вся платформа)
+    - date_from, date_to: YYYY-MM-DD, включительно (по умолчанию последние 30 дней)
+    """
+    try:
+        today = datetime.utcnow().date()
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else today
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from') else date_to - timedelta(days=30)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    if date_from > date_to:
+        return jsonify({'error': 'date_from must not be after date_to'}), 400
+    
+    practice_id = request.args.get('practice_id')
+    if practice_id:
+        try:
+            practice = Practice.query.get(uuid.UUID(practice_id))
+        except ValueError:
+            practice = None
+        if not practice:
+            return jsonify({'error': 'Practice not found'}), 404
+        return jsonify(daily_stats_report('practice', practice.id, date_from, date_to))
+    
+    return jsonify(daily_stats_report('platform', DailyStat.PLATFORM_ID, date_from, date_to))
+
+
+@admin_api.route('/calendar/http-latency', methods=['GET'])
+@admin_required
+def api_calendar_http_latency(admin):
+    """
+    API: Гистограммы длительности запросов к Graph/CalDAV
+    
+    Гистограммы живут в памяти процесса: web - снимок процесса, который
+    обработал запрос (ручные синхронизации и т.п.), worker - последний
+    отчет воркера из task_runs ('calendar.http_latency').
+    """
+    worker_run = TaskRun.query.filter_by(
+        task_name='calendar.http_latency'
+    ).order_by(TaskRun.started_at.desc()).first()
+    
+    return jsonify({
+        'web': latency_snapshot(),
+        'worker': worker_run.details_dict if worker_run else {},
+        'worker_reported_at': worker_run.finished_at.isoformat() if worker_run and worker_run.finished_at else None
     })
 
 
+def _counts_by(key_column, counted_column, ids, join=None):
+    """
+    Количество строк по ключу для страницы списка одним GROUP BY
+
+    Returns:
+        dict: key -> count (ключей без строк нет)
+    """
+    if not ids:
+        return {}
+    query = db.session.query(key_column, func.count(counted_column))
+    if join is not None:
+        query = query.select_from(counted_column.class_).join(*join)
+    return dict(query.filter(key_column.in_(ids)).group_by(key_column).all())
+
+
 @admin_api.route('/patients', methods=['GET'])
 @admin_required
 def api_get_patients(admin):
@@ -309,17 +431,17 @@ def api_get_patients(admin):
         page=page, per_page=per_page, error_out=False
     )
     
+    # Бронирования всех пациентов страницы - один GROUP BY
+    bookings_counts = _counts_by(Booking.patient_id, Booking.id, [p.id for p in pagination.items])
+    
     patients = []
     for patient in pagination.items:
-        # Подсчет бронирований
-        bookings_count = Booking.query.filter_by(patient_id=patient.id).count()
-        
         patients.append({
             'id': str(patient.id),
             'phone': patient.phone,
             'name': patient.name or 'N/A',
             'total_bookings': patient.total_bookings or 0,
-            'bookings_count': bookings_count,
+            'bookings_count': bookings_counts.get(patient.id, 0),
             'created_at': patient.created_at.isoformat() if patient.created_at else None
         })
     
@@ -359,21 +481,21 @@ def api_get_doctors(admin):
     elif verified == 'false':
         query = query.filter(Doctor.is_verified == False)
     
-    # Пагинация
-    pagination = query.order_by(Doctor.created_at.desc()).paginate(
+    # Пагинация (практика подгружается в том же запросе)
+    pagination = query.options(joinedload(Doctor.practice)).order_by(Doctor.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
+    # Слоты всех врачей страницы - один GROUP BY
+    slots_counts = _counts_by(
+        Calendar.doctor_id, TimeSlot.id, [d.id for d in pagination.items],
+        join=(Calendar, TimeSlot.calendar_id == Calendar.id)
+    )
+    
     doctors = []
     for doctor in pagination.items:
-        # Получаем практику
-        practice = Practice.query.get(doctor.practice_id) if doctor.practice_id else None
-        
-        # Подсчет слотов
-        calendar = Calendar.query.filter_by(doctor_id=doctor.id).first()
-        slots_count = 0
-        if calendar:
-            slots_count = TimeSlot.query.filter_by(calendar_id=calendar.id).count()
+        practice = doctor.practice
+        slots_count = slots_counts.get(doctor.id, 0)
         
         doctors.append({
             'id': str(doctor.id),
@@ -425,23 +547,11 @@ def api_get_patient_bookings(admin, patient_id):
         return jsonify({'error': 'Patient not found'}), 404
     
     # Получаем бронирования
-    bookings = Booking.query.filter_by(patient_id=patient.id).order_by(Booking.created_at.desc()).all()
-    bookings_list = []
-    for booking in bookings:
-        timeslot = booking.timeslot
-        doctor = timeslot.calendar.doctor if timeslot else None
-        
-        bookings_list.append({
-            'id': str(booking.id),
-            'booking_code': booking.booking_code,
-            'status': booking.status,
-            'doctor_name': f'{doctor.first_name} {doctor.last_name}' if doctor else 'N/A',
-            'date': timeslot.start_time.isoformat() if timeslot else None,
-            'amount_paid': float(booking.amount_paid) if booking.amount_paid else 0,
-            'created_at': booking.created_at.isoformat()
-        })
+    bookings = booking_query().filter(
+        Booking.patient_id == patient.id
+    ).order_by(Booking.created_at.desc()).all()
     
-    return jsonify(bookings_list)
+    return jsonify([serialize_booking_summary(booking) for booking in bookings])
 
 
 @admin_api.route('/doctors/<doctor_id>', methods=['GET'])
@@ -504,26 +614,11 @@ def api_get_doctor_bookings(admin, doctor_id):
         return jsonify([])
     
     # Получаем бронирования через слоты
-    bookings = db.session.query(Booking).join(TimeSlot).filter(
+    bookings = booking_query(join_timeslot=True).filter(
         TimeSlot.calendar_id == calendar.id
     ).order_by(Booking.created_at.desc()).limit(50).all()
     
-    bookings_list = []
-    for booking in bookings:
-        patient = booking.patient
-        timeslot = booking.timeslot
-        
-        bookings_list.append({
-            'id': str(booking.id),
-            'booking_code': booking.booking_code,
-            'status': booking.status,
-            'patient_name': patient.name if patient else 'N/A',
-            'date': timeslot.start_time.isoformat() if timeslot else None,
-            'amount_paid': float(booking.amount_paid) if booking.amount_paid else 0,
-            'created_at': booking.created_at.isoformat()
-        })
-    
-    return jsonify(bookings_list)
+    return jsonify([serialize_booking_summary(booking, include_patient=True) for booking in bookings])
 
 
 @admin_api.route('/doctors/<doctor_id>/verify', methods=['POST'])
@@ -588,6 +683,9 @@ def api_delete_patient(admin, patient_id):
     
     # Удаляем все бронирования пациента (если force=true)
     if force:
+        mark_booking_days_dirty(
+            booking_id for booking_id, in db.session.query(Booking.id).filter_by(patient_id=patient.id)
+        )
         Booking.query.filter_by(patient_id=patient.id).delete()
     
     db.session.delete(patient)
@@ -625,6 +723,7 @@ def api_delete_doctor(admin, doctor_id):
         
         # Удаляем все бронирования врача (если force=true)
         if force:
+            mark_calendar_range_dirty(calendar.id, datetime.min)
             # Получаем все слоты этого врача
             time_slots = TimeSlot.query.filter_by(calendar_id=calendar.id).all()
             for slot in time_slots:
@@ -648,7 +747,7 @@ def api_get_bookings(admin):
     per_page = request.args.get('per_page', 50, type=int)
     status = request.args.get('status', '')
     
-    query = Booking.query.join(TimeSlot).join(Calendar).join(Doctor)
+    query = booking_query(join_timeslot=True)
     
     # Фильтр по статусу
     if status:
@@ -659,22 +758,7 @@ def api_get_bookings(admin):
         page=page, per_page=per_page, error_out=False
     )
     
-    bookings = []
-    for booking in pagination.items:
-        patient = booking.patient
-        timeslot = booking.timeslot
-        doctor = timeslot.calendar.doctor if timeslot else None
-        
-        bookings.append({
-            'id': str(booking.id),
-            'booking_code': booking.booking_code,
-            'status': booking.status,
-            'patient_name': patient.name or patient.phone,
-            'doctor_name': f'{doctor.first_name} {doctor.last_name}' if doctor else 'N/A',
-            'date': timeslot.start_time.strftime('%Y-%m-%d') if timeslot else None,
-            'time': timeslot.start_time.strftime('%H:%M') if timeslot else None,
-            'created_at': booking.created_at.isoformat()
-        })
+    bookings = [serialize_booking_summary(booking, include_patient=True) for booking in pagination.items]
     
     return jsonify({
         'bookings': bookings,
@@ -682,3 +766,59 @@ def api_get_bookings(admin):
         'pages': pagination.pages,
         'current_page': page
     })
+
+
+@admin_api.route('/export/<entity>', methods=['GET'])
+@admin_required
+def api_export(admin, entity):
+    """
+    API: Потоковая выгрузка (bookings, patients, doctors)
+    
+    Query params:
+    - format: csv (default) или ndjson
+    - columns: список колонок через запятую (по умолчанию все)
+    - date_from, date_to: YYYY-MM-DD, включительно
+    - date_field: колонка для фильтра дат (bookings: created_at или start_time)
+    - status: фильтр по статусу (bookings)
+    - gzip: 1 - сжать на лету (файл .gz)
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Invalid format. Use one of: {", ".join(EXPORT_FORMATS)}'}), 400
+    
+    columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()] or None
+    gzip = request.args.get('gzip', '').lower() in ('1', 'true')
+    
+    try:
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from') else None
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+    
+    try:
+        query, names = build_export_query(
+            entity,
+            columns=columns,
+            date_from=date_from,
+            date_to=date_to,
+            date_field=request.args.get('date_field'),
+            status=request.args.get('status')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    filename = f"{entity}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    if gzip:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    # Строки читаются серверным курсором по мере отправки ответа
+    return Response(
+        stream_with_context(stream_export(query, names, fmt=fmt, gzip=gzip)),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}',
+            'X-Accel-Buffering': 'no'
+        }
+    )
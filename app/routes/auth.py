@@ -305,16 +305,15 @@ def api_doctor_register():
             
             current_time = slot_end
     
-    db.session.commit()
+    # Проверка алертов для созданных слотов - в фоновом воркере (в той же транзакции)
+    from app.services.job_queue import enqueue_job
+    enqueue_job('alerts.check_doctor', {
+        'doctor_id': str(doctor.id),
+        'date_from': today.isoformat(),
+        'date_to': (today + timedelta(days=7)).isoformat()
+    }, commit=False)
     
-    # Тригер системы оповещений для созданных слотов
-    try:
-        from app.services.alert_service import check_alerts_for_doctor
-        from datetime import date
-        alerts_sent = check_alerts_for_doctor(doctor.id, today, today + timedelta(days=7))
-        print(f"Triggered alert notifications: {alerts_sent} alerts sent")
-    except Exception as e:
-        print(f"Error triggering alerts: {e}")
+    db.session.commit()
     
     return jsonify({
         'message': 'Arzt erfolgreich registriert',
@@ -4,11 +4,10 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.jwt_helpers import get_current_user
-from app.models import Booking, TimeSlot, Patient, Doctor
-from app.constants.specialities import SPECIALITIES
+from app.models import TimeSlot, Patient, Doctor
+from app.services.booking_service import load_booking, load_booking_by_code, serialize_booking_detail
 from app import db
 from datetime import datetime, timedelta
-import uuid
 
 bp = Blueprint('booking', __name__)
 
@@ -25,7 +24,7 @@ def cancel_booking(booking_id):
     identity = get_current_user()
     
     try:
-        booking = Booking.query.get(uuid.UUID(booking_id))
+        booking = load_booking(booking_id)
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
         
@@ -83,7 +82,7 @@ def get_booking(booking_id):
     identity = get_current_user()
     
     try:
-        booking = Booking.query.get(uuid.UUID(booking_id))
+        booking = load_booking(booking_id)
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
         
@@ -94,45 +93,8 @@ def get_booking(booking_id):
         if not is_patient and not is_doctor:
             return jsonify({'error': 'Unauthorized'}), 403
         
-        doctor = booking.timeslot.calendar.doctor
-        practice = doctor.practice
-        
         return jsonify({
-            'booking': {
-                'id': str(booking.id),
-                'booking_code': booking.booking_code,
-                'status': booking.status,
-                'created_at': booking.created_at.isoformat(),
-                'cancellable': booking.can_be_cancelled(),
-                'cancellable_until': booking.cancellable_until.isoformat() if booking.cancellable_until else None,
-                'cancelled_at': booking.cancelled_at.isoformat() if booking.cancelled_at else None,
-                'cancelled_by': booking.cancelled_by,
-                'timeslot': {
-                    'start_time': booking.timeslot.start_time.isoformat(),
-                    'end_time': booking.timeslot.end_time.isoformat(),
-                    'date': booking.timeslot.start_time.strftime('%Y-%m-%d'),
-                    'time': booking.timeslot.start_time.strftime('%H:%M')
-                },
-                'doctor': {
-                    'id': str(doctor.id),
-                    'first_name': doctor.first_name,
-                    'last_name': doctor.last_name,
-                    'full_name': f"{doctor.first_name} {doctor.last_name}",
-                    'speciality': doctor.speciality,
-                    'speciality_display': SPECIALITIES.get(doctor.speciality, {}).get('de', doctor.speciality)
-                },
-                'practice': {
-                    'id': str(practice.id) if practice else None,
-                    'name': practice.name if practice else None,
-                    'address': practice.address if practice else None,
-                    'phone': practice.phone if practice else None
-                } if practice else None,
-                'patient': {
-                    'id': str(booking.patient.id),
-                    'name': booking.patient.name,
-                    'phone': booking.patient.phone
-                } if is_doctor else None
-            }
+            'booking': serialize_booking_detail(booking, include_patient=is_doctor)
         })
     
     except Exception as e:
@@ -145,39 +107,12 @@ def get_booking_by_code(booking_code):
     API: Получить информацию о бронировании по коду (без авторизации)
     """
     try:
-        booking = Booking.query.filter_by(booking_code=booking_code).first()
+        booking = load_booking_by_code(booking_code)
         if not booking:
             return jsonify({'error': 'Booking not found'}), 404
         
-        doctor = booking.timeslot.calendar.doctor
-        practice = doctor.practice
-        
         return jsonify({
-            'booking': {
-                'id': str(booking.id),
-                'booking_code': booking.booking_code,
-                'status': booking.status,
-                'cancellable': booking.can_be_cancelled(),
-                'cancellable_until': booking.cancellable_until.isoformat() if booking.cancellable_until else None,
-                'timeslot': {
-                    'start_time': booking.timeslot.start_time.isoformat(),
-                    'end_time': booking.timeslot.end_time.isoformat(),
-                    'date': booking.timeslot.start_time.strftime('%Y-%m-%d'),
-                    'time': booking.timeslot.start_time.strftime('%H:%M')
-                },
-                'doctor': {
-                    'first_name': doctor.first_name,
-                    'last_name': doctor.last_name,
-                    'full_name': f"{doctor.first_name} {doctor.last_name}",
-                    'speciality': doctor.speciality,
-                    'speciality_display': SPECIALITIES.get(doctor.speciality, {}).get('de', doctor.speciality)
-                },
-                'practice': {
-                    'name': practice.name if practice else None,
-                    'address': practice.address if practice else None,
-                    'phone': practice.phone if practice else None
-                } if practice else None
-            }
+            'booking': serialize_booking_detail(booking, include_ids=False)
         })
     
     except Exception as e:
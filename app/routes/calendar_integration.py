@@ -7,10 +7,13 @@ from app.utils.jwt_helpers import get_current_user
 from app import db
 from app.models.doctor import Doctor
 from app.models.calendar_integration import CalendarIntegration
+from app.models.background_job import BackgroundJob
 from app.services.google_calendar_service import GoogleCalendarService
 from app.services.apple_calendar_service import AppleCalendarService
 from app.services.outlook_calendar_service import OutlookCalendarService
 from app.services.calendar_integration_service import get_calendar_service
+from app.services.job_queue import enqueue_job
+from app.services.calendar_sync_executor import request_webhook_sync, lease_integrations, release_integrations
 import uuid
 import secrets
 from datetime import datetime, timedelta
@@ -145,6 +148,9 @@ def connect_integration(provider):
             db.session.add(integration)
             db.session.commit()
             
+            # Выгрузить уже существующие будущие термины (в фоне)
+            enqueue_job('calendar.backfill', {'integration_id': str(integration.id)})
+            
             return jsonify({
                 'success': True,
                 'integration_id': str(integration.id),
@@ -276,6 +282,10 @@ def oauth_callback(provider):
         db.session.add(integration)
         db.session.commit()
         
+        # Выгрузить уже существующие будущие термины (пакетно, в фоне)
+        if integration.sync_direction in ('both', 'to_external'):
+            enqueue_job('calendar.backfill', {'integration_id': str(integration.id)})
+        
         # Настроить webhook если возможно
         try:
             service = get_calendar_service(integration)
@@ -355,6 +365,10 @@ def update_integration(integration_id):
         if field in data:
             setattr(integration, field, data[field])
     
+    # После включения блокировки инкрементальная синхронизация не увидит старые события
+    if data.get('auto_block_conflicts') or data.get('import_free_busy'):
+        integration.reset_sync_cursor()
+    
     db.session.commit()
     
     return jsonify(integration.to_dict())
@@ -396,10 +410,17 @@ def trigger_sync(integration_id):
     """
     Принудительная синхронизация конкретной интеграции
     
+    Query params:
+        full: 'true' - перечитать окно целиком, игнорируя курсор
+    
+    Если интеграцию сейчас синхронизирует планировщик - 409.
+    
     Response:
         {
             "success": true,
-            "external_events_count": 5,
+            "mode": "incremental",
+            "changes_count": 2,
+            "external_events_count": 1,
             "slots_blocked": 3
         }
     """
@@ -412,17 +433,29 @@ def trigger_sync(integration_id):
     if not integration or str(integration.doctor_id) != identity['id']:
         return jsonify({'error': 'Integration not found'}), 404
     
+    # Аренда та же, что у плановой синхронизации: вторая параллельная не запустится
+    leased_ids = lease_integrations(CalendarIntegration.id == integration.id)
+    if not leased_ids:
+        return jsonify({
+            'success': False,
+            'error': 'Sync already in progress'
+        }), 409
+    
     try:
         service = get_calendar_service(integration)
-        result = service.sync_from_external()
+        result = service.sync_from_external(full=request.args.get('full', 'false').lower() == 'true')
         
         return jsonify(result)
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+    
+    finally:
+        release_integrations(leased_ids)
 
 
 @bp.route('/sync-all', methods=['POST'])
@@ -430,6 +463,19 @@ def trigger_sync(integration_id):
 def sync_all_integrations():
     """
     Синхронизировать все интеграции текущего врача
+    
+    Синхронизация идет в фоне (задача 'calendar.sync', интеграции параллельно),
+    прогресс - GET /sync-jobs/<job_id>.
+    
+    Query params:
+        full: 'true' - перечитать окна целиком, игнорируя курсоры
+    
+    Response (202):
+        {
+            "job_id": "...",
+            "status": "queued",
+            "total": 2
+        }
     """
     identity = get_current_user()
     if identity.get('type') != 'doctor':
@@ -439,34 +485,51 @@ def sync_all_integrations():
     if not doctor:
         return jsonify({'error': 'Doctor not found'}), 404
     
-    integrations = CalendarIntegration.query.filter_by(
+    total = CalendarIntegration.query.filter_by(
         doctor_id=doctor.id,
         sync_enabled=True,
         sync_status='active'
-    ).all()
+    ).count()
     
-    results = []
-    for integration in integrations:
-        try:
-            service = get_calendar_service(integration)
-            result = service.sync_from_external()
-            results.append({
-                'integration_id': str(integration.id),
-                'provider': integration.provider,
-                **result
-            })
-        except Exception as e:
-            results.append({
-                'integration_id': str(integration.id),
-                'provider': integration.provider,
-                'success': False,
-                'error': str(e)
-            })
+    job = enqueue_job('calendar.sync', {
+        'doctor_id': str(doctor.id),
+        'full': request.args.get('full', 'false').lower() == 'true'
+    }, max_attempts=1)
     
     return jsonify({
-        'results': results,
-        'total': len(integrations)
-    })
+        'job_id': str(job.id),
+        'status': job.status,
+        'total': total
+    }), 202
+
+
+@bp.route('/sync-jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_sync_job(job_id):
+    """
+    Статус и прогресс фоновой синхронизации
+    
+    Response:
+        {
+            "id": "...",
+            "status": "running",
+            "progress": {"total": 2, "done": 1, "succeeded": 1, "failed": 0, "results": [...]},
+            ...
+        }
+    """
+    identity = get_current_user()
+    if identity.get('type') != 'doctor':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    try:
+        job = BackgroundJob.query.get(uuid.UUID(job_id))
+    except ValueError:
+        job = None
+    
+    if not job or job.job_type != 'calendar.sync' or job.payload_dict.get('doctor_id') != identity['id']:
+        return jsonify({'error': 'Sync job not found'}), 404
+    
+    return jsonify(job.to_dict())
 
 
 # Webhook endpoints для real-time обновлений
@@ -479,6 +542,9 @@ def google_webhook():
     Headers:
         X-Goog-Channel-ID: Channel ID
         X-Goog-Resource-State: 'sync', 'exists', 'not_exists'
+    
+    Изменение только помечает интеграцию (202), синхронизацию запускает
+    планировщик worker'а после окна debounce.
     """
     channel_id = request.headers.get('X-Goog-Channel-ID')
     resource_state = request.headers.get('X-Goog-Resource-State')
@@ -498,13 +564,10 @@ def google_webhook():
     if resource_state == 'sync':
         return '', 200
     
-    # Изменение в календаре - запустить синхронизацию
+    # Изменение в календаре - пометить для синхронизации
     if resource_state in ['exists', 'not_exists']:
-        try:
-            service = GoogleCalendarService(integration)
-            service.sync_from_external()
-        except Exception as e:
-            print(f"Webhook sync error: {e}")
+        request_webhook_sync(CalendarIntegration.id == integration.id)
+        return '', 202
     
     return '', 200
 
@@ -526,6 +589,8 @@ def outlook_webhook():
                 }
             ]
         }
+    
+    Как и для Google: только метка интеграции (202), синхронизация - в worker.
     """
     data = request.get_json()
     
@@ -536,27 +601,15 @@ def outlook_webhook():
     if not data or 'value' not in data:
         return '', 400
     
-    for notification in data['value']:
-        subscription_id = notification.get('subscriptionId')
-        client_state = notification.get('clientState')
-        
-        # Проверить clientState
-        if client_state != 'terminfinder-secret-state':
-            continue
-        
-        # Найти интеграцию
-        integration = CalendarIntegration.query.filter_by(
-            external_webhook_id=subscription_id
-        ).first()
-        
-        if not integration:
-            continue
-        
-        # Запустить синхронизацию
-        try:
-            service = OutlookCalendarService(integration)
-            service.sync_from_external()
-        except Exception as e:
-            print(f"Webhook sync error: {e}")
+    # Outlook присылает несколько уведомлений в одном запросе - одна метка на подписку
+    subscription_ids = {
+        notification.get('subscriptionId')
+        for notification in data['value']
+        if notification.get('clientState') == 'terminfinder-secret-state'
+        and notification.get('subscriptionId')
+    }
     
-    return '', 200
+    if subscription_ids:
+        request_webhook_sync(CalendarIntegration.external_webhook_id.in_(subscription_ids))
+    
+    return '', 202
@@ -1,17 +1,24 @@
 """
 Маршруты врачей
 """
-from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.utils.jwt_helpers import get_current_user
 from app.models.doctor import Doctor
 from app.models.calendar import Calendar
 from app.models.booking import Booking
 from app.models.calendar import TimeSlot
+from app.models.patient import Patient
+from app.services.booking_service import booking_query, serialize_booking_summary
+from app.services.job_queue import enqueue_job
+from app.services.stats_service import mark_calendar_range_dirty, on_doctor_changes
+from app.utils.ttl_cache import TTLCache
+from app.services.analytics_service import doctor_analytics, doctor_analytics_from_daily_stats, SERIES_BUCKETS
 from app import db
 import uuid
 import json
 from datetime import datetime, timedelta
+from sqlalchemy import func
 
 bp = Blueprint('doctor', __name__, url_prefix='/doctor')
 doctor_api = Blueprint('doctor_api', __name__)
@@ -36,6 +43,87 @@ def calendar_integrations():
     return render_template('doctor/calendar_integrations.html')
 
 
+# Кэш today/this_week дашборда по врачу
+_dashboard_cache = TTLCache(max_entries=2048)
+
+
+def _invalidate_dashboards(doctor_ids):
+    for doctor_id in doctor_ids:
+        _dashboard_cache.invalidate(doctor_id)
+
+
+on_doctor_changes(_invalidate_dashboards)
+
+
+def _dashboard_overview(calendar_id):
+    """Сегодняшние термины (один JOIN) и статистика недели (один агрегат с FILTER)"""
+    now = datetime.utcnow()
+    today = now.date()
+    today_start = datetime.combine(today, datetime.min.time())
+    today_end = datetime.combine(today, datetime.max.time())
+    
+    # Подтвержденные бронирования на сегодня - только нужные колонки
+    today_rows = db.session.query(
+        Booking.id, Booking.status, Patient.name, Patient.phone, TimeSlot.start_time
+    ).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).outerjoin(
+        Patient, Booking.patient_id == Patient.id
+    ).filter(
+        TimeSlot.calendar_id == calendar_id,
+        TimeSlot.start_time >= today_start,
+        TimeSlot.start_time <= today_end,
+        Booking.status == 'confirmed'
+    ).order_by(TimeSlot.start_time).all()
+    
+    today_appointments = []
+    next_appointment = None
+    for booking_id, status, patient_name, patient_phone, start_time in today_rows:
+        appointment_data = {
+            'id': str(booking_id),
+            'patient_name': patient_name if patient_phone else 'Unknown',
+            'patient_phone': patient_phone or 'Unknown',
+            'time': start_time.strftime('%H:%M'),
+            'start_time': start_time.isoformat(),
+            'status': status
+        }
+        today_appointments.append(appointment_data)
+        
+        # Найти следующий термин
+        if not next_appointment and start_time > now:
+            next_appointment = appointment_data
+    
+    # Статистика за эту неделю
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=7)
+    
+    total_slots, booked_slots, available_slots, blocked_slots = db.session.query(
+        func.count(TimeSlot.id),
+        func.count(TimeSlot.id).filter(TimeSlot.status == 'booked'),
+        func.count(TimeSlot.id).filter(TimeSlot.status == 'available'),
+        func.count(TimeSlot.id).filter(TimeSlot.status == 'blocked')
+    ).filter(
+        TimeSlot.calendar_id == calendar_id,
+        TimeSlot.start_time >= week_start,
+        TimeSlot.start_time < week_end
+    ).one()
+    
+    return {
+        'today': {
+            'appointments_count': len(today_appointments),
+            'appointments': today_appointments,
+            'next_appointment': next_appointment
+        },
+        'this_week': {
+            'total_slots': total_slots,
+            'booked_slots': booked_slots,
+            'available_slots': available_slots,
+            'blocked_slots': blocked_slots,
+            'fill_rate': round((booked_slots / total_slots * 100) if total_slots > 0 else 0, 1)
+        }
+    }
+
+
 @doctor_api.route('/dashboard')
 @jwt_required()
 def api_dashboard():
@@ -51,61 +139,18 @@ def api_dashboard():
     # Получаем календарь врача
     calendar = doctor.calendar
     
-    # Сегодняшние данные
-    today = datetime.utcnow().date()
-    today_start = datetime.combine(today, datetime.min.time())
-    today_end = datetime.combine(today, datetime.max.time())
-    
-    today_appointments = []
-    next_appointment = None
-    
     if calendar:
-        # Получаем подтвержденные бронирования на сегодня
-        today_bookings = Booking.query.join(TimeSlot).filter(
-            TimeSlot.calendar_id == calendar.id,
-            TimeSlot.start_time >= today_start,
-            TimeSlot.start_time <= today_end,
-            Booking.status == 'confirmed'
-        ).order_by(TimeSlot.start_time).all()
-        
-        now = datetime.utcnow()
-        for booking in today_bookings:
-            appointment_data = {
-                'id': str(booking.id),
-                'patient_name': booking.patient.name if booking.patient else 'Unknown',
-                'patient_phone': booking.patient.phone if booking.patient else 'Unknown',
-                'time': booking.timeslot.start_time.strftime('%H:%M'),
-                'start_time': booking.timeslot.start_time.isoformat(),
-                'status': booking.status
-            }
-            today_appointments.append(appointment_data)
-            
-            # Найти следующий термин
-            if not next_appointment and booking.timeslot.start_time > now:
-                next_appointment = appointment_data
-        
-        # Статистика за эту неделю
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=7)
-        
-        week_slots = TimeSlot.query.filter(
-            TimeSlot.calendar_id == calendar.id,
-            TimeSlot.start_time >= week_start,
-            TimeSlot.start_time < week_end
-        ).all()
-        
-        total_slots = len(week_slots)
-        booked_slots = sum(1 for slot in week_slots if slot.status == 'booked')
-        available_slots = sum(1 for slot in week_slots if slot.status == 'available')
-        blocked_slots = sum(1 for slot in week_slots if slot.status == 'blocked')
-        
-        fill_rate = round((booked_slots / total_slots * 100) if total_slots > 0 else 0, 1)
+        # Кэш на DOCTOR_DASHBOARD_CACHE_SECONDS, сбрасывается при изменении слотов/бронирований врача
+        overview, _ = _dashboard_cache.get(
+            doctor.id,
+            lambda: _dashboard_overview(calendar.id),
+            ttl=current_app.config.get('DOCTOR_DASHBOARD_CACHE_SECONDS', 30)
+        )
     else:
-        total_slots = 0
-        booked_slots = 0
-        available_slots = 0
-        blocked_slots = 0
-        fill_rate = 0
+        overview = {
+            'today': {'appointments_count': 0, 'appointments': [], 'next_appointment': None},
+            'this_week': {'total_slots': 0, 'booked_slots': 0, 'available_slots': 0, 'blocked_slots': 0, 'fill_rate': 0}
+        }
     
     return jsonify({
         'doctor': {
@@ -115,18 +160,7 @@ def api_dashboard():
             'is_verified': doctor.is_verified,
             'has_calendar': calendar is not None
         },
-        'today': {
-            'appointments_count': len(today_appointments),
-            'appointments': today_appointments,
-            'next_appointment': next_appointment
-        },
-        'this_week': {
-            'total_slots': total_slots,
-            'booked_slots': booked_slots,
-            'available_slots': available_slots,
-            'blocked_slots': blocked_slots,
-            'fill_rate': fill_rate
-        },
+        **overview,
         'calendar': {
             'exists': calendar is not None,
             'working_hours': json.loads(calendar.working_hours) if calendar else {},
@@ -274,8 +308,8 @@ def api_get_bookings():
     date_to = request.args.get('date_to')
     
     # Базовый запрос
-    query = Booking.query.join(Booking.timeslot).filter(
-        Booking.timeslot.has(calendar_id=doctor.calendar.id)
+    query = booking_query(join_timeslot=True).filter(
+        TimeSlot.calendar_id == doctor.calendar.id
     )
     
     # Фильтры
@@ -284,30 +318,20 @@ def api_get_bookings():
     if date_from:
         try:
             from_date = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(Booking.timeslot.has(TimeSlot.start_time >= from_date))
+            query = query.filter(TimeSlot.start_time >= from_date)
         except ValueError:
             pass
     if date_to:
         try:
             to_date = datetime.strptime(date_to, '%Y-%m-%d')
             to_date = to_date + timedelta(days=1)  # Include the entire day
-            query = query.filter(Booking.timeslot.has(TimeSlot.start_time <= to_date))
+            query = query.filter(TimeSlot.start_time <= to_date)
         except ValueError:
             pass
     
     bookings = query.order_by(Booking.created_at.desc()).all()
     
-    bookings_data = []
-    for booking in bookings:
-        bookings_data.append({
-            'id': str(booking.id),
-            'patient_name': booking.patient.name if booking.patient else 'Unknown',
-            'date': booking.timeslot.start_time.strftime('%Y-%m-%d'),
-            'time': booking.timeslot.start_time.strftime('%H:%M'),
-            'status': booking.status,
-            'booking_code': booking.booking_code,
-            'created_at': booking.created_at.isoformat()
-        })
+    bookings_data = [serialize_booking_summary(booking, include_patient=True) for booking in bookings]
     
     return jsonify({'bookings': bookings_data})
 
@@ -547,6 +571,8 @@ def api_generate_slots():
     
     generated_slots = []
     today = datetime.now().date()
+    # Алерты проверяются только по слотам этой генерации (TimeSlot.created_at)
+    generation_started = datetime.utcnow()
     
     # Генерируем на указанное количество недель вперед
     for week_offset in range(weeks_ahead):
@@ -594,17 +620,17 @@ def api_generate_slots():
                 
                 current_time = slot_end
     
-    db.session.commit()
+    # Проверка алертов для созданных слотов - в фоновом воркере (в той же транзакции)
+    enqueue_job('alerts.check_doctor', {
+        'doctor_id': str(doctor.id),
+        'date_from': today.isoformat(),
+        'date_to': (today + timedelta(weeks=weeks_ahead)).isoformat(),
+        'created_since': generation_started.isoformat()
+    }, commit=False)
+    # Новые свободные слоты меняют рекомендации по специальности
+    enqueue_job('recommendations.rebuild', {'speciality': doctor.speciality}, commit=False)
     
-    # Тригер системы оповещений для созданных слотов
-    try:
-        from app.services.alert_service import check_alerts_for_doctor
-        date_from = today
-        date_to = today + timedelta(weeks=weeks_ahead)
-        alerts_sent = check_alerts_for_doctor(doctor.id, date_from, date_to)
-        print(f"Triggered alert notifications: {alerts_sent} alerts sent")
-    except Exception as e:
-        print(f"Error triggering alerts: {e}")
+    db.session.commit()
     
     return jsonify({
         'message': f'Generated {len(generated_slots)} time slots',
@@ -681,6 +707,7 @@ def api_analytics():
     
     Query params:
     - period: week, month, year (default: week)
+    - series: day, week, month - временной ряд по корзинам (опционально)
     """
     identity = get_current_user()
     if identity.get('type') != 'doctor':
@@ -691,6 +718,9 @@ def api_analytics():
         return jsonify({'error': 'Calendar not found'}), 404
     
     period = request.args.get('period', 'week')
+    series = request.args.get('series')
+    if series and series not in SERIES_BUCKETS:
+        return jsonify({'error': f'Invalid series. Use one of: {", ".join(SERIES_BUCKETS)}'}), 400
     
     # Определяем временной диапазон
     now = datetime.utcnow()
@@ -703,47 +733,12 @@ def api_analytics():
     else:
         start_date = now - timedelta(days=7)
     
-    # Получаем все слоты за период
-    all_slots = TimeSlot.query.filter(
-        TimeSlot.calendar_id == doctor.calendar.id,
-        TimeSlot.start_time >= start_date,
-        TimeSlot.start_time <= now
-    ).all()
-    
-    # Получаем все бронирования за период
-    all_bookings = Booking.query.join(TimeSlot).filter(
-        TimeSlot.calendar_id == doctor.calendar.id,
-        TimeSlot.start_time >= start_date,
-        TimeSlot.start_time <= now
-    ).all()
-    
-    # Статистика
-    total_slots = len(all_slots)
-    booked_slots = sum(1 for slot in all_slots if slot.status == 'booked')
-    available_slots = sum(1 for slot in all_slots if slot.status == 'available')
-    blocked_slots = sum(1 for slot in all_slots if slot.status == 'blocked')
-    
-    total_appointments = len(all_bookings)
-    confirmed_appointments = sum(1 for b in all_bookings if b.status == 'confirmed')
-    completed_appointments = sum(1 for b in all_bookings if b.status == 'completed')
-    cancelled_appointments = sum(1 for b in all_bookings if b.status == 'cancelled')
-    no_show_appointments = sum(1 for b in all_bookings if b.status == 'no_show')
-    
-    fill_rate = round((booked_slots / total_slots * 100) if total_slots > 0 else 0, 1)
-    no_show_rate = round((no_show_appointments / completed_appointments * 100) if completed_appointments > 0 else 0, 1)
-    cancellation_rate = round((cancelled_appointments / total_appointments * 100) if total_appointments > 0 else 0, 1)
-    
-    # Распределение по дням недели
-    bookings_by_day = {
-        'monday': 0, 'tuesday': 0, 'wednesday': 0, 
-        'thursday': 0, 'friday': 0, 'saturday': 0, 'sunday': 0
-    }
-    day_names = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
-    
-    for booking in all_bookings:
-        if booking.status in ['confirmed', 'completed']:
-            day_name = day_names[booking.timeslot.start_time.weekday()]
-            bookings_by_day[day_name] += 1
+    if current_app.config.get('ANALYTICS_FROM_DAILY_STATS'):
+        # Сумма по строкам daily_stats (не больше одной строки на день)
+        analytics = doctor_analytics_from_daily_stats(doctor.id, start_date.date(), now.date(), series=series)
+    else:
+        # Агрегаты считает БД (GROUP BY status / день недели), число запросов не зависит от периода
+        analytics = doctor_analytics(doctor.calendar.id, start_date, now, series=series)
     
     return jsonify({
         'period': {
@@ -751,23 +746,7 @@ def api_analytics():
             'start_date': start_date.strftime('%Y-%m-%d'),
             'end_date': now.strftime('%Y-%m-%d')
         },
-        'slots': {
-            'total': total_slots,
-            'booked': booked_slots,
-            'available': available_slots,
-            'blocked': blocked_slots,
-            'fill_rate': fill_rate
-        },
-        'appointments': {
-            'total': total_appointments,
-            'confirmed': confirmed_appointments,
-            'completed': completed_appointments,
-            'cancelled': cancelled_appointments,
-            'no_show': no_show_appointments,
-            'no_show_rate': no_show_rate,
-            'cancellation_rate': cancellation_rate
-        },
-        'bookings_by_day': bookings_by_day
+        **analytics
     })
     """
     API: Открыть день (разблокировать все слоты на день)
@@ -853,6 +832,7 @@ def api_delete_account():
     
     # Delete future time slots
     if doctor.calendar:
+        mark_calendar_range_dirty(doctor.calendar.id, now)
         TimeSlot.query.filter(
             TimeSlot.calendar_id == doctor.calendar.id,
             TimeSlot.start_time > now
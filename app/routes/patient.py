@@ -4,8 +4,12 @@ Patient routes
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_jwt_extended import jwt_required
 from app.utils.jwt_helpers import get_current_user
-from app.models import Patient, Booking, Doctor, Calendar, TimeSlot, PatientAlert
+from app.models import Patient, Booking, Doctor, Calendar, TimeSlot, PatientAlert, SlotOffer
 from app.constants.specialities import SPECIALITIES
+from app.services.booking_service import patient_booking_history, serialize_booking_summary, practice_city
+from app.services.recommendation_service import get_recommendations, serialize_recommendation
+from app.services.waitlist_service import accept_offer, decline_offer
+from app.services.calendar_integration_service import on_booking_changed
 from app import db
 import uuid
 from datetime import datetime, timedelta
@@ -16,33 +20,22 @@ import string
 bp = Blueprint('patient', __name__, url_prefix='/patient')
 patient_api = Blueprint('patient_api', __name__)
 
+# Секции /api/patient/bootstrap
+BOOTSTRAP_SECTIONS = ('profile', 'dashboard', 'bookings', 'alerts', 'offers')
+
 
 @bp.route('/dashboard')
 def dashboard():
     """������� �������� - �������� ��������, ������ ��������� ����� JS"""
     # ��������� ����� ����� JavaScript �� �������
     return render_template('patient/dashboard.html')
-    
-@patient_api.route('/dashboard')
-@jwt_required()
-def api_dashboard():
-    """API ��� ��������� ������ �������� ��������"""
-    identity = get_current_user()
-    if identity.get('type') != 'patient':
-        return jsonify({'error': 'Unauthorized'}), 403
-    
-    patient = Patient.query.get(uuid.UUID(identity['id']))
-    if not patient:
-        return jsonify({'error': 'Patient not found'}), 404
-    
-    now = datetime.utcnow()
-    
+
+
+def _dashboard_overview(patient, now):
+    """Ближайший термин, последние термины и рекомендации (секция дашборда)"""
     # �������� ��������� ����������� ������
-    next_booking = Booking.query.join(TimeSlot).filter(
-        Booking.patient_id == patient.id,
-        Booking.status == 'confirmed',
-        TimeSlot.start_time > now
-    ).order_by(TimeSlot.start_time).first()
+    upcoming_bookings, _ = patient_booking_history(patient.id, view='upcoming', limit=1, now=now)
+    next_booking = upcoming_bookings[0] if upcoming_bookings else None
     
     next_appointment = None
     if next_booking:
@@ -50,10 +43,7 @@ def api_dashboard():
         practice = doctor.practice
         
         # ��������� city �� JSON address
-        practice_city = None
-        if practice:
-            address_dict = practice.address_dict
-            practice_city = address_dict.get('city') if isinstance(address_dict, dict) else None
+        city = practice_city(practice)
         
         next_appointment = {
             'id': str(next_booking.id),
@@ -71,17 +61,16 @@ def api_dashboard():
                 'name': practice.name if practice else None,
                 'address': practice.address if practice else None,
                 'phone': practice.phone if practice else None,
-                'city': practice_city
+                'city': city
             } if practice else None,
             'cancellable': next_booking.can_be_cancelled(),
             'cancellable_until': next_booking.cancellable_until.isoformat() if next_booking.cancellable_until else None
         }
     
     # �������� ������� (��������� 5 ����������� ��� ���������� ��������)
-    history_bookings = Booking.query.join(TimeSlot).filter(
-        Booking.patient_id == patient.id,
-        Booking.status.in_(['completed', 'cancelled'])
-    ).order_by(TimeSlot.start_time.desc()).limit(5).all()
+    history_bookings, _ = patient_booking_history(
+        patient.id, view='past', statuses=['completed', 'cancelled'], limit=5, now=now
+    )
     
     history = []
     for booking in history_bookings:
@@ -106,70 +95,63 @@ def api_dashboard():
             last_speciality = history_bookings[0].timeslot.calendar.doctor.speciality
         
         if last_speciality:
-            # ������� ������ ������ ��� �� ������������� � ���������� �������
-            from sqlalchemy import func
-            
-            # ��������� ��� �������� ��������� ������
-            from app.models import Calendar
-            
-            recommended = db.session.query(Doctor).join(Calendar).join(TimeSlot).filter(
-                Doctor.speciality == last_speciality,
-                Doctor.is_verified == True,
-                TimeSlot.status == 'available',
-                TimeSlot.start_time > now
-            ).group_by(Doctor.id).limit(3).all()
-            
-            for doc in recommended:
-                # ������������ ��������� ����� ��� ������� �����
-                free_count = TimeSlot.query.filter(
-                    TimeSlot.calendar_id == doc.calendar.id,
-                    TimeSlot.status == 'available',
-                    TimeSlot.start_time > now
-                ).count()
-                
-                # ��������� city �� JSON address
-                practice_city = None
-                if doc.practice:
-                    address_dict = doc.practice.address_dict
-                    practice_city = address_dict.get('city') if isinstance(address_dict, dict) else None
-                
-                recommended_doctors.append({
-                    'id': str(doc.id),
-                    'name': f'{doc.first_name} {doc.last_name}',
-                    'speciality': doc.speciality,
-                    'speciality_display': SPECIALITIES.get(doc.speciality, {}).get('de', doc.speciality),
-                    'free_slots_count': free_count,
-                    'practice': {
-                        'name': doc.practice.name if doc.practice else None,
-                        'city': practice_city
-                    } if doc.practice else None
-                })
-    
-    # �������� �������� ������ ��������
-    active_alerts = PatientAlert.query.filter_by(
-        patient_id=patient.id,
-        is_active=True
-    ).order_by(PatientAlert.created_at.desc()).all()
+            # Снимок рекомендаций: один запрос, счетчики свободных слотов из того же снимка
+            last_booking = next_booking or history_bookings[0]
+            city = practice_city(last_booking.timeslot.calendar.doctor.practice)
+            recommended_doctors = [
+                serialize_recommendation(rec)
+                for rec in get_recommendations(last_speciality, city=city, limit=3)
+            ]
+    
+    return {
+        'next_appointment': next_appointment,
+        'history': history,
+        'recommended_doctors': recommended_doctors
+    }
+
+
+def _serialize_patient(patient):
+    return {
+        'id': str(patient.id),
+        'name': patient.name,
+        'phone': patient.phone,
+        'total_bookings': patient.total_bookings,
+        'attended_appointments': patient.attended_appointments
+    }
+
+
+def _split_alerts(alerts, recent_limit, notified_only=False):
+    """
+    Активные алерты и недавние уведомления из одного списка алертов пациента
+
+    Returns:
+        tuple: (active, recent)
+    """
+    active = sorted((a for a in alerts if a.is_active), key=lambda a: a.created_at, reverse=True)
+    inactive = [a for a in alerts if not a.is_active and (a.last_notification_at or not notified_only)]
+    inactive.sort(key=lambda a: (a.last_notification_at is not None, a.last_notification_at or datetime.min), reverse=True)
+    return active, inactive[:recent_limit]
+
+
+@patient_api.route('/dashboard')
+@jwt_required()
+def api_dashboard():
+    """API ��� ��������� ������ �������� ��������"""
+    identity = get_current_user()
+    if identity.get('type') != 'patient':
+        return jsonify({'error': 'Unauthorized'}), 403
     
-    # �������� ��������� ����������� (���������� ������, ������� ���������)
-    recent_notifications = PatientAlert.query.filter_by(
-        patient_id=patient.id,
-        is_active=False
-    ).filter(
-        PatientAlert.last_notification_at != None
-    ).order_by(PatientAlert.last_notification_at.desc()).limit(5).all()
+    patient = Patient.query.get(uuid.UUID(identity['id']))
+    if not patient:
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    # Все алерты пациента одним запросом (активные + недавние уведомления)
+    alerts = PatientAlert.query.filter_by(patient_id=patient.id).all()
+    active_alerts, recent_notifications = _split_alerts(alerts, recent_limit=5, notified_only=True)
     
     return jsonify({
-        'patient': {
-            'id': str(patient.id),
-            'name': patient.name,
-            'phone': patient.phone,
-            'total_bookings': patient.total_bookings,
-            'attended_appointments': patient.attended_appointments
-        },
-        'next_appointment': next_appointment,
-        'history': history,
-        'recommended_doctors': recommended_doctors,
+        'patient': _serialize_patient(patient),
+        **_dashboard_overview(patient, datetime.utcnow()),
         'active_alerts': [alert.to_dict() for alert in active_alerts],
         'recent_notifications': [alert.to_dict() for alert in recent_notifications]
     })
@@ -188,13 +170,7 @@ def api_profile():
         return jsonify({'error': 'Patient not found'}), 404
     
     return jsonify({
-        'patient': {
-            'id': str(patient.id),
-            'name': patient.name,
-            'phone': patient.phone,
-            'total_bookings': patient.total_bookings,
-            'attended_appointments': patient.attended_appointments
-        }
+        'patient': _serialize_patient(patient)
     })
 
 
@@ -210,29 +186,94 @@ def api_bookings():
     if not patient:
         return jsonify({'error': 'Patient not found'}), 404
     
-    # �������� ��� ������������ ��������
-    all_bookings = Booking.query.filter_by(
-        patient_id=patient.id
-    ).order_by(Booking.created_at.desc()).all()
+    # Keyset-пагинация: ?view=upcoming|past|all&status=a,b&cursor=...&limit=50
+    view = request.args.get('view', 'all')
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    cursor = request.args.get('cursor')
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 100)
+    
+    try:
+        bookings, next_cursor = patient_booking_history(
+            patient.id, view=view, statuses=statuses, cursor=cursor, limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
-        'bookings': [{
-            'id': str(booking.id),
-            'booking_code': booking.booking_code,
-            'doctor_id': str(booking.timeslot.calendar.doctor_id) if booking.timeslot and booking.timeslot.calendar else None,
-            'doctor_name': booking.timeslot.calendar.doctor.first_name + ' ' + booking.timeslot.calendar.doctor.last_name if booking.timeslot and booking.timeslot.calendar and booking.timeslot.calendar.doctor else 'Unknown',
-            'practice_name': booking.timeslot.calendar.doctor.practice.name if booking.timeslot and booking.timeslot.calendar and booking.timeslot.calendar.doctor and booking.timeslot.calendar.doctor.practice else 'Unknown',
-            'speciality': booking.timeslot.calendar.doctor.speciality if booking.timeslot and booking.timeslot.calendar and booking.timeslot.calendar.doctor else 'Unknown',
-            'appointment_date': booking.timeslot.start_time.strftime('%Y-%m-%d') if booking.timeslot else '',
-            'appointment_time': booking.timeslot.start_time.strftime('%H:%M') if booking.timeslot else '',
-            'date': booking.timeslot.start_time.strftime('%Y-%m-%d') if booking.timeslot else '',
-            'time': booking.timeslot.start_time.strftime('%H:%M') if booking.timeslot else '',
-            'status': booking.status,
-            'created_at': booking.created_at.strftime('%Y-%m-%d %H:%M') if booking.created_at else ''
-        } for booking in all_bookings]
+        'bookings': [serialize_booking_summary(booking) for booking in bookings],
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None
     })
 
 
+@patient_api.route('/bootstrap')
+@jwt_required()
+def api_bootstrap():
+    """
+    API: Данные страниц пациента одним запросом
+    
+    Пациент загружается один раз, алерты - одним запросом для всех секций.
+    
+    Query params:
+    - sections: через запятую из profile, dashboard, bookings, alerts, offers (по умолчанию все)
+    - bookings_view: upcoming (default), past, all
+    - bookings_limit: размер первой страницы бронирований (default 20, max 100)
+    """
+    identity = get_current_user()
+    if identity.get('type') != 'patient':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    sections = [s for s in request.args.get('sections', '').split(',') if s] or list(BOOTSTRAP_SECTIONS)
+    unknown = [s for s in sections if s not in BOOTSTRAP_SECTIONS]
+    if unknown:
+        return jsonify({'error': f'Unknown sections: {", ".join(unknown)}. Use: {", ".join(BOOTSTRAP_SECTIONS)}'}), 400
+    
+    patient = Patient.query.get(uuid.UUID(identity['id']))
+    if not patient:
+        return jsonify({'error': 'Patient not found'}), 404
+    
+    now = datetime.utcnow()
+    result = {'sections': sections}
+    
+    if 'profile' in sections:
+        result['patient'] = _serialize_patient(patient)
+    
+    if 'dashboard' in sections:
+        result['dashboard'] = _dashboard_overview(patient, now)
+    
+    if 'bookings' in sections:
+        limit = min(max(request.args.get('bookings_limit', 20, type=int), 1), 100)
+        try:
+            bookings, next_cursor = patient_booking_history(
+                patient.id, view=request.args.get('bookings_view', 'upcoming'), limit=limit, now=now
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        result['bookings'] = {
+            'bookings': [serialize_booking_summary(booking) for booking in bookings],
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
+        }
+    
+    if 'alerts' in sections:
+        alerts = PatientAlert.query.filter_by(patient_id=patient.id).all()
+        active_alerts, recent_notifications = _split_alerts(alerts, recent_limit=10)
+        result['alerts'] = {
+            'active_alerts': [alert.to_dict() for alert in active_alerts],
+            'recent_notifications': [alert.to_dict() for alert in recent_notifications]
+        }
+    
+    if 'offers' in sections:
+        offers = SlotOffer.query.filter(
+            SlotOffer.patient_id == patient.id,
+            SlotOffer.status == 'pending',
+            SlotOffer.expires_at > now
+        ).order_by(SlotOffer.expires_at.asc()).all()
+        result['offers'] = [offer.to_dict() for offer in offers]
+    
+    return jsonify(result)
+
+
 @bp.route('/profile')
 def profile():
     """������� ��������"""
@@ -247,6 +288,13 @@ def bookings():
     return render_template('patient/bookings.html')
 
 
+@bp.route('/offers')
+def offers():
+    """Предложения слотов из листа ожидания (ссылка из письма send_slot_offer)"""
+    # Данные загружаются через JavaScript из /api/patient/offers
+    return render_template('patient/offers.html')
+
+
 @bp.route('/search')
 def search():
     """�������� ������ ������"""
@@ -425,12 +473,19 @@ def api_book_slot():
         return jsonify({'error': 'Slot ID required'}), 400
     
     slot = TimeSlot.query.get(uuid.UUID(slot_id))
-    if not slot or slot.status != 'available':
+    if not slot or slot.status not in ('available', 'held'):
         print(f"[ERROR] Slot not available: slot={slot}, status={slot.status if slot else 'None'}")
         return jsonify({'error': 'Slot not available'}), 400
     
+    # Слот удерживается для пациента из листа ожидания
+    if slot.status == 'held' and not accept_offer(slot, patient):
+        return jsonify({'error': 'Slot not available'}), 400
+    
     # ���������, �� ������������ �� ��� ���� ����
-    existing_booking = Booking.query.filter_by(timeslot_id=slot.id).first()
+    existing_booking = Booking.query.filter(
+        Booking.timeslot_id == slot.id,
+        Booking.status != 'cancelled'
+    ).first()
     if existing_booking:
         print(f"[ERROR] Slot already booked: {existing_booking.id}")
         return jsonify({'error': 'Slot already booked'}), 400
@@ -453,6 +508,8 @@ def api_book_slot():
     patient.total_bookings += 1
     
     db.session.add(booking)
+    # Внешние календари врача: событие термина создается фоновой задачей
+    on_booking_changed(booking, doctor_id=slot.calendar.doctor_id, commit=False)
     db.session.commit()
     
     print(f"[SUCCESS] Booking created: {booking.id}, code: {booking.booking_code}")
@@ -521,6 +578,45 @@ def api_cancel_booking(booking_id):
         return jsonify({'error': 'Failed to cancel booking'}), 500
 
 
+# ==================== WAITLIST OFFERS ====================
+
+@patient_api.route('/offers', methods=['GET'])
+@jwt_required()
+def api_get_offers():
+    """API: Действующие предложения слотов из листа ожидания"""
+    identity = get_current_user()
+    if identity.get('type') != 'patient':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    offers = SlotOffer.query.filter(
+        SlotOffer.patient_id == uuid.UUID(identity['id']),
+        SlotOffer.status == 'pending',
+        SlotOffer.expires_at > datetime.utcnow()
+    ).order_by(SlotOffer.expires_at.asc()).all()
+    
+    return jsonify({'offers': [offer.to_dict() for offer in offers]})
+
+
+@patient_api.route('/offers/<offer_id>/decline', methods=['POST'])
+@jwt_required()
+def api_decline_offer(offer_id):
+    """API: Отказаться от предложения (слот сразу предлагается следующему)"""
+    identity = get_current_user()
+    if identity.get('type') != 'patient':
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    offer = SlotOffer.query.get(uuid.UUID(offer_id))
+    if not offer or str(offer.patient_id) != identity['id']:
+        return jsonify({'error': 'Offer not found'}), 404
+    
+    if offer.status != 'pending':
+        return jsonify({'error': f'Offer is already {offer.status}'}), 400
+    
+    decline_offer(offer)
+    
+    return jsonify({'message': 'Offer declined'})
+
+
 # ==================== ALERTS ENDPOINTS ====================
 
 @patient_api.route('/alerts', methods=['GET'])
@@ -535,17 +631,8 @@ def api_get_alerts():
     if not patient:
         return jsonify({'error': 'Patient not found'}), 404
     
-    # �������� �������� ������
-    active_alerts = PatientAlert.query.filter_by(
-        patient_id=patient.id,
-        is_active=True
-    ).order_by(PatientAlert.created_at.desc()).all()
-    
-    # �������� ���������� (��� �����������)
-    inactive_alerts = PatientAlert.query.filter_by(
-        patient_id=patient.id,
-        is_active=False
-    ).order_by(PatientAlert.last_notification_at.desc()).limit(10).all()
+    alerts = PatientAlert.query.filter_by(patient_id=patient.id).all()
+    active_alerts, inactive_alerts = _split_alerts(alerts, recent_limit=10)
     
     return jsonify({
         'active_alerts': [alert.to_dict() for alert in active_alerts],
@@ -0,0 +1,299 @@
+"""
+Alert Index - инвертированный индекс активных алертов для матчинга слотов
+"""
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import db
+from app.models import PatientAlert
+from collections import defaultdict
+from datetime import date
+import bisect
+import threading
+import time
+
+
+_OPEN_START = date.min.toordinal()
+_OPEN_END = date.max.toordinal()
+
+# Ключ сессии для изменений алертов до commit
+_PENDING_KEY = 'alert_index_changes'
+
+
+class _SortedEntries:
+    """ID алертов, отсортированные по ключу (дате начала или конца)"""
+    __slots__ = ('keys', 'ids')
+
+    def __init__(self):
+        self.keys = []
+        self.ids = []
+
+    def add(self, key, alert_id):
+        pos = bisect.bisect_right(self.keys, key)
+        self.keys.insert(pos, key)
+        self.ids.insert(pos, alert_id)
+
+    def remove(self, key, alert_id):
+        pos = bisect.bisect_left(self.keys, key)
+        while pos < len(self.keys) and self.keys[pos] == key:
+            if self.ids[pos] == alert_id:
+                del self.keys[pos]
+                del self.ids[pos]
+                return True
+            pos += 1
+        return False
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class _IntervalBucket:
+    """
+    Алерты одного ключа, разделенные по открытости диапазона дат
+
+    - без начала и конца - подходят всегда;
+    - без начала - отсортированы по концу, подходят с позиции bisect;
+    - без конца - отсортированы по началу, подходят до позиции bisect;
+    - с началом и концом - отсортированы по началу; просматриваются только
+      начавшиеся не раньше day - max_span (самый длинный диапазон бакета).
+    """
+    __slots__ = ('open', 'open_start', 'open_end', 'bounded', 'bounded_ends', 'max_span')
+
+    def __init__(self):
+        self.open = {}  # alert_id -> None (упорядоченное множество)
+        self.open_start = _SortedEntries()  # end -> alert_id
+        self.open_end = _SortedEntries()  # start -> alert_id
+        self.bounded = _SortedEntries()  # start -> alert_id
+        self.bounded_ends = {}  # alert_id -> end
+        self.max_span = 0  # Не уменьшается при удалении - до перестройки индекса
+
+    def add(self, alert_id, start, end):
+        if start == _OPEN_START and end == _OPEN_END:
+            self.open[alert_id] = None
+        elif start == _OPEN_START:
+            self.open_start.add(end, alert_id)
+        elif end == _OPEN_END:
+            self.open_end.add(start, alert_id)
+        else:
+            self.bounded.add(start, alert_id)
+            self.bounded_ends[alert_id] = end
+            self.max_span = max(self.max_span, end - start)
+
+    def remove(self, alert_id, start, end):
+        if start == _OPEN_START and end == _OPEN_END:
+            return self.open.pop(alert_id, False) is None
+        if start == _OPEN_START:
+            return self.open_start.remove(end, alert_id)
+        if end == _OPEN_END:
+            return self.open_end.remove(start, alert_id)
+        self.bounded_ends.pop(alert_id, None)
+        return self.bounded.remove(start, alert_id)
+
+    def match(self, day):
+        matched = list(self.open)
+
+        open_start = self.open_start
+        matched.extend(open_start.ids[bisect.bisect_left(open_start.keys, day):])
+
+        open_end = self.open_end
+        matched.extend(open_end.ids[:bisect.bisect_right(open_end.keys, day)])
+
+        bounded = self.bounded
+        lo = bisect.bisect_left(bounded.keys, day - self.max_span)
+        hi = bisect.bisect_right(bounded.keys, day)
+        ends = self.bounded_ends
+        matched.extend(alert_id for alert_id in bounded.ids[lo:hi] if ends[alert_id] >= day)
+        return matched
+
+    def __len__(self):
+        return len(self.open) + len(self.open_start) + len(self.open_end) + len(self.bounded)
+
+
+class AlertIndex:
+    """
+    In-memory индекс активных алертов
+
+    Бакеты:
+    - doctor_id -> алерты на конкретного врача
+    - (speciality, city_key) -> алерты на специальность; city_key '' - любой город
+
+    Потокобезопасен; обновляется инкрементально после commit изменений
+    PatientAlert в этом процессе и периодически перестраивается из БД
+    (ALERT_INDEX_REFRESH_SECONDS), чтобы подхватить изменения других процессов.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+        self.built_at = None
+
+    def _clear(self):
+        self._by_doctor = defaultdict(_IntervalBucket)
+        self._by_speciality_city = defaultdict(_IntervalBucket)
+        self._cities = defaultdict(set)  # speciality -> city keys с алертами
+        self._entries = {}  # alert_id -> (bucket, bucket_key, start, city_key, end)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def add(self, alert_id, doctor_id, speciality, city_key, date_from, date_to):
+        """Добавить или заменить алерт"""
+        start = date_from.toordinal() if date_from else _OPEN_START
+        end = date_to.toordinal() if date_to else _OPEN_END
+
+        with self._lock:
+            self._discard(alert_id)
+            if doctor_id:
+                bucket_map, bucket_key = self._by_doctor, doctor_id
+            elif speciality:
+                bucket_map, bucket_key = self._by_speciality_city, (speciality, city_key or '')
+                self._cities[speciality].add(city_key or '')
+            else:
+                return
+            bucket_map[bucket_key].add(alert_id, start, end)
+            self._entries[alert_id] = (bucket_map, bucket_key, start, city_key, end)
+
+    def discard(self, alert_id):
+        """Удалить алерт (удален или деактивирован)"""
+        with self._lock:
+            self._discard(alert_id)
+
+    def _discard(self, alert_id):
+        entry = self._entries.pop(alert_id, None)
+        if not entry:
+            return
+        bucket_map, bucket_key, start, _, end = entry
+        bucket = bucket_map[bucket_key]
+        bucket.remove(alert_id, start, end)
+        if not len(bucket):
+            del bucket_map[bucket_key]
+            if bucket_map is self._by_speciality_city:
+                self._cities[bucket_key[0]].discard(bucket_key[1])
+
+    def match(self, doctor_id, speciality, city_key, day):
+        """
+        ID алертов, подходящих под слот
+
+        Args:
+            doctor_id: врач слота
+            speciality: специальность врача
+            city_key: нормализованный город практики (None - неизвестен)
+            day: дата слота
+
+        Returns:
+            list of alert ids
+        """
+        ordinal = day.toordinal()
+        with self._lock:
+            matched = []
+
+            doctor_bucket = self._by_doctor.get(doctor_id)
+            if doctor_bucket:
+                for alert_id in doctor_bucket.match(ordinal):
+                    alert_city = self._entries[alert_id][3]
+                    if alert_city and city_key and alert_city != city_key:
+                        continue
+                    matched.append(alert_id)
+
+            if city_key:
+                city_keys = ('', city_key)
+            else:
+                # Город практики неизвестен - город алерта не проверяется
+                city_keys = tuple(self._cities.get(speciality, ()))
+
+            for key in city_keys:
+                bucket = self._by_speciality_city.get((speciality, key))
+                if bucket:
+                    matched.extend(bucket.match(ordinal))
+
+            return matched
+
+    def rebuild(self, rows):
+        """Перестроить индекс из строк (id, doctor_id, speciality, city_key, date_from, date_to)"""
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self.add(*row)
+            self.built_at = time.monotonic()
+
+
+alert_index = AlertIndex()
+
+
+def _alert_row(alert):
+    return (alert.id, alert.doctor_id, alert.speciality, alert.city_key, alert.date_from, alert.date_to)
+
+
+def load_alert_index():
+    """Построить индекс из активных алертов в БД (только нужные колонки)"""
+    rows = db.session.query(
+        PatientAlert.id,
+        PatientAlert.doctor_id,
+        PatientAlert.speciality,
+        PatientAlert.city_key,
+        PatientAlert.date_from,
+        PatientAlert.date_to
+    ).filter(PatientAlert.is_active == True).all()
+    alert_index.rebuild(rows)
+    return alert_index
+
+
+def get_alert_index():
+    """
+    In-memory индекс, построенный не раньше ALERT_INDEX_REFRESH_SECONDS назад
+
+    Returns:
+        AlertIndex
+    """
+    refresh = current_app.config.get('ALERT_INDEX_REFRESH_SECONDS', 300)
+    if not alert_index.is_built or time.monotonic() - alert_index.built_at > refresh:
+        load_alert_index()
+    return alert_index
+
+
+# ==================== ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ ====================
+
+def _collect_alert_changes(session, flush_context):
+    """after_flush: запомнить изменения алертов до commit"""
+    if not alert_index.is_built:
+        return
+    changes = session.info.setdefault(_PENDING_KEY, [])
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, PatientAlert):
+            if obj.is_active:
+                changes.append(('add', _alert_row(obj)))
+            else:
+                changes.append(('discard', obj.id))
+    for obj in session.deleted:
+        if isinstance(obj, PatientAlert):
+            changes.append(('discard', obj.id))
+
+
+def _apply_alert_changes(session):
+    """after_commit: применить изменения к индексу"""
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes or not alert_index.is_built:
+        return
+    for action, payload in changes:
+        if action == 'add':
+            alert_index.add(*payload)
+        else:
+            alert_index.discard(payload)
+
+
+def _drop_alert_changes(session):
+    """after_rollback: изменения не сохранены"""
+    session.info.pop(_PENDING_KEY, None)
+
+
+def register_alert_index_events():
+    """Подписать индекс на изменения PatientAlert (вызывается один раз в create_app)"""
+    if event.contains(Session, 'after_flush', _collect_alert_changes):
+        return
+    event.listen(Session, 'after_flush', _collect_alert_changes)
+    event.listen(Session, 'after_commit', _apply_alert_changes)
+    event.listen(Session, 'after_rollback', _drop_alert_changes)
@@ -1,10 +1,73 @@
 """
 Alert notification service - проверка и отправка уведомлений пациентам
 """
-from app.models import PatientAlert, TimeSlot, Doctor, Practice
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app.models import PatientAlert, TimeSlot, Calendar, Doctor, Practice
+from app.services.alert_index import get_alert_index
+from app.services.booking_service import practice_city
+from app.services.notification_service import enqueue_alert_slots
 from app import db
+from collections import defaultdict
 from datetime import datetime
-import json
+
+
+def alert_match_filter(doctor, city_key, slot_date=None):
+    """
+    SQL условие матчинга алертов по бакетам индекса
+
+    - алерты на врача: ix_patient_alerts_waitlist_doctor (doctor_id, ...)
+    - алерты на специальность: ix_patient_alerts_speciality_city (speciality, city_key, ...)
+
+    Args:
+        doctor: Doctor
+        city_key: нормализованный город практики (None - город не проверяется)
+        slot_date: дата слота (None - без фильтра по диапазону дат)
+    """
+    doctor_bucket = PatientAlert.doctor_id == doctor.id
+    speciality_bucket = db.and_(
+        PatientAlert.doctor_id == None,
+        PatientAlert.speciality == doctor.speciality
+    )
+    conditions = [PatientAlert.is_active == True]
+
+    if city_key:
+        city_match = db.or_(PatientAlert.city_key == None, PatientAlert.city_key == city_key)
+        conditions.append(db.or_(
+            db.and_(doctor_bucket, city_match),
+            db.and_(speciality_bucket, city_match)
+        ))
+    else:
+        conditions.append(db.or_(doctor_bucket, speciality_bucket))
+
+    if slot_date:
+        conditions.append(db.or_(PatientAlert.date_from == None, PatientAlert.date_from <= slot_date))
+        conditions.append(db.or_(PatientAlert.date_to == None, PatientAlert.date_to >= slot_date))
+
+    return db.and_(*conditions)
+
+
+def find_matching_alerts(doctor, slot_date, city_key):
+    """
+    Активные алерты, подходящие под слот врача на дату
+
+    При ALERT_INDEX_IN_MEMORY кандидаты берутся из in-memory индекса и
+    догружаются по первичному ключу; иначе - один индексированный запрос.
+
+    Returns:
+        list of PatientAlert
+    """
+    if current_app.config.get('ALERT_INDEX_IN_MEMORY'):
+        alert_ids = get_alert_index().match(doctor.id, doctor.speciality, city_key, slot_date)
+        if not alert_ids:
+            return []
+        return PatientAlert.query.filter(
+            PatientAlert.id.in_(alert_ids),
+            PatientAlert.is_active == True
+        ).all()
+
+    return PatientAlert.query.filter(alert_match_filter(doctor, city_key, slot_date)).all()
 
 
 def check_and_notify_alerts(slot_id):
@@ -14,102 +77,146 @@ def check_and_notify_alerts(slot_id):
     Args:
         slot_id: ID слота который стал доступным
     """
-    slot = TimeSlot.query.get(slot_id)
+    slot = TimeSlot.query.options(
+        joinedload(TimeSlot.calendar).joinedload(Calendar.doctor).joinedload(Doctor.practice)
+    ).filter(TimeSlot.id == slot_id).first()
     if not slot or slot.status != 'available':
         return
     
     doctor = slot.calendar.doctor
     slot_date = slot.start_time.date()
     
-    # Получаем город практики для проверки
-    practice_city = None
-    if doctor.practice:
-        try:
-            address_dict = json.loads(doctor.practice.address) if doctor.practice.address else {}
-            practice_city = address_dict.get('city', '').lower() if address_dict else None
-        except:
-            practice_city = None
-    
-    # Находим подходящие алерты
-    alerts = PatientAlert.query.filter(
-        PatientAlert.is_active == True,
-        db.or_(
-            # Алерты на конкретного доктора
-            PatientAlert.doctor_id == doctor.id,
-            # Алерты на специальность этого доктора
-            db.and_(
-                PatientAlert.doctor_id == None,
-                PatientAlert.speciality == doctor.speciality
-            )
-        )
-    ).all()
+    # Город практики (нормализованный ключ бакета)
+    city_key = PatientAlert.normalize_city(practice_city(doctor.practice))
+    
+    # Только кандидаты из бакетов врача и (специальность, город)
+    alerts = find_matching_alerts(doctor, slot_date, city_key)
     
     notifications_sent = []
     
     for alert in alerts:
-        # Проверяем город, если указан в алерте
-        if alert.city and practice_city:
-            if alert.city.lower() != practice_city:
-                continue
-        
-        # Проверяем диапазон дат
-        if alert.date_from and slot_date < alert.date_from:
-            continue
-        if alert.date_to and slot_date > alert.date_to:
+        # Уведомление уходит в outbox; слоты, о которых уже уведомляли,
+        # отбрасываются по seen-set алерта
+        if not enqueue_alert_slots(alert, doctor.id, [(slot.id, slot.start_time)]):
             continue
         
-        # Проверяем что это не тот же слот, о котором уже уведомляли
-        if alert.last_slot_notified_id == slot_id:
-            continue
-        
-        # Обновляем статистику алерта
-        alert.notifications_sent += 1
-        alert.last_notification_at = datetime.utcnow()
-        alert.last_slot_notified_id = slot_id
-        
-        # В продакшене здесь будет отправка email/SMS
-        # Пока просто фиксируем что уведомление отправлено
         notifications_sent.append({
             'patient_id': alert.patient_id,
             'doctor_name': f"{doctor.first_name} {doctor.last_name}",
             'slot_date': slot_date.strftime('%Y-%m-%d'),
             'slot_time': slot.start_time.strftime('%H:%M'),
-            'city': practice_city
+            'city': city_key
         })
     
     if notifications_sent:
         db.session.commit()
-        print(f"Sent {len(notifications_sent)} alert notifications for slot {slot_id}")
+        print(f"Queued {len(notifications_sent)} alert notifications for slot {slot_id}")
     
     return notifications_sent
 
 
-def check_alerts_for_doctor(doctor_id, date_from, date_to):
+def find_new_alert_slots(doctor, date_from, date_to, per_alert=None, created_since=None):
+    """
+    Один запрос: алерты врача x свободные слоты периода
+
+    Join алертов (бакеты alert_match_filter) со слотами календаря врача по
+    диапазону дат алерта. Для каждого алерта возвращаются первые per_alert
+    слотов и общее число подходящих слотов.
+
+    created_since ограничивает выборку слотами, созданными после этого
+    момента (одна генерация). Иначе повторная генерация снова находит самые
+    ранние, уже отправленные слоты, и после отсечения по seen-set о новых
+    слотах уведомление не уходит.
+
+    Returns:
+        list of (alert_id, slot_id, start_time, total) в порядке времени
+    """
+    per_alert = per_alert or current_app.config.get('NOTIFICATION_SLOTS_PER_ALERT', 10)
+    city_key = PatientAlert.normalize_city(practice_city(doctor.practice))
+    slot_day = db.cast(TimeSlot.start_time, db.Date)
+
+    rank = func.row_number().over(
+        partition_by=PatientAlert.id,
+        order_by=(TimeSlot.start_time, TimeSlot.id)
+    ).label('rank')
+    total = func.count().over(partition_by=PatientAlert.id).label('total')
+
+    pairs = db.session.query(
+        PatientAlert.id.label('alert_id'),
+        TimeSlot.id.label('slot_id'),
+        TimeSlot.start_time.label('start_time'),
+        rank,
+        total
+    ).join(
+        TimeSlot,
+        db.and_(
+            TimeSlot.calendar_id == doctor.calendar.id,
+            TimeSlot.status == 'available',
+            TimeSlot.start_time >= datetime.combine(date_from, datetime.min.time()),
+            TimeSlot.start_time <= datetime.combine(date_to, datetime.max.time()),
+            db.or_(PatientAlert.date_from == None, PatientAlert.date_from <= slot_day),
+            db.or_(PatientAlert.date_to == None, PatientAlert.date_to >= slot_day)
+        )
+    ).filter(
+        alert_match_filter(doctor, city_key)
+    )
+    if created_since:
+        pairs = pairs.filter(TimeSlot.created_at >= created_since)
+    pairs = pairs.subquery()
+
+    return db.session.query(
+        pairs.c.alert_id, pairs.c.slot_id, pairs.c.start_time, pairs.c.total
+    ).filter(
+        pairs.c.rank <= per_alert
+    ).order_by(
+        pairs.c.alert_id, pairs.c.start_time
+    ).all()
+
+
+def check_alerts_for_doctor(doctor_id, date_from, date_to, created_since=None):
     """
     Проверить все алерты для врача в заданном диапазоне дат
     Используется при массовом создании слотов
     
+    Контекст врача загружается один раз, алерты сопоставляются со слотами
+    одним запросом, все уведомления ставятся в outbox одним commit.
+    Каждый алерт получает не больше одного уведомления (ближайшие новые
+    слоты + общее число); письма объединяет notification_service.
+    
     Args:
         doctor_id: ID врача
         date_from: начало периода
         date_to: конец периода
+        created_since: только слоты, созданные после этого момента
+    
+    Returns:
+        int: количество уведомлений
     """
-    # Находим все свободные слоты врача в периоде
-    doctor = Doctor.query.get(doctor_id)
+    doctor = Doctor.query.options(
+        joinedload(Doctor.practice),
+        joinedload(Doctor.calendar)
+    ).filter(Doctor.id == doctor_id).first()
     if not doctor or not doctor.calendar:
-        return
+        return 0
     
-    slots = TimeSlot.query.filter(
-        TimeSlot.calendar_id == doctor.calendar.id,
-        TimeSlot.status == 'available',
-        TimeSlot.start_time >= datetime.combine(date_from, datetime.min.time()),
-        TimeSlot.start_time <= datetime.combine(date_to, datetime.max.time())
-    ).all()
+    matches = find_new_alert_slots(doctor, date_from, date_to, created_since=created_since)
+    if not matches:
+        return 0
+    
+    slots_by_alert = defaultdict(list)
+    total_by_alert = {}
+    for alert_id, slot_id, start_time, total in matches:
+        slots_by_alert[alert_id].append((slot_id, start_time))
+        total_by_alert[alert_id] = total
+    
+    alerts = PatientAlert.query.filter(PatientAlert.id.in_(slots_by_alert.keys())).all()
+    
+    queued = 0
+    for alert in alerts:
+        if enqueue_alert_slots(alert, doctor.id, slots_by_alert[alert.id], total_by_alert[alert.id]):
+            queued += 1
     
-    notifications_count = 0
-    for slot in slots:
-        result = check_and_notify_alerts(slot.id)
-        if result:
-            notifications_count += len(result)
+    db.session.commit()
     
-    return notifications_count
+    print(f"Queued {queued} alert notifications for doctor {doctor_id}")
+    return queued
@@ -0,0 +1,201 @@
+"""
+Analytics Service - агрегаты аналитики врача на стороне БД
+"""
+from sqlalchemy import func, extract, distinct
+from app import db
+from app.models import Booking, TimeSlot, DailyStat
+from datetime import timedelta
+
+
+# extract('dow') в PostgreSQL: 0 = воскресенье
+DOW_NAMES = ['sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday']
+
+SERIES_BUCKETS = ('day', 'week', 'month')
+
+
+def _rate(part, whole):
+    return round((part / whole * 100) if whole > 0 else 0, 1)
+
+
+def slot_status_counts(calendar_id, start, end):
+    """Слоты календаря за период: GROUP BY status"""
+    rows = db.session.query(
+        TimeSlot.status, func.count(TimeSlot.id)
+    ).filter(
+        TimeSlot.calendar_id == calendar_id,
+        TimeSlot.start_time >= start,
+        TimeSlot.start_time <= end
+    ).group_by(TimeSlot.status).all()
+    return {status: count for status, count in rows}
+
+
+def booking_status_dow_counts(calendar_id, start, end):
+    """Бронирования за период (по времени термина): GROUP BY status, день недели"""
+    dow = extract('dow', TimeSlot.start_time)
+    return db.session.query(
+        Booking.status, dow, func.count(Booking.id)
+    ).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).filter(
+        TimeSlot.calendar_id == calendar_id,
+        TimeSlot.start_time >= start,
+        TimeSlot.start_time <= end
+    ).group_by(Booking.status, dow).all()
+
+
+def time_series(calendar_id, start, end, bucket='day'):
+    """
+    Временной ряд по корзинам date_trunc(bucket, start_time)
+
+    Один запрос: слоты с LEFT JOIN бронирований и условными агрегатами.
+
+    Returns:
+        list of dict
+    """
+    period = func.date_trunc(bucket, TimeSlot.start_time).label('period')
+    rows = db.session.query(
+        period,
+        func.count(distinct(TimeSlot.id)),
+        func.count(distinct(TimeSlot.id)).filter(TimeSlot.status == 'booked'),
+        func.count(Booking.id).filter(Booking.status.in_(['confirmed', 'completed'])),
+        func.count(Booking.id).filter(Booking.status == 'cancelled'),
+        func.count(Booking.id).filter(Booking.status == 'no_show')
+    ).outerjoin(
+        Booking, Booking.timeslot_id == TimeSlot.id
+    ).filter(
+        TimeSlot.calendar_id == calendar_id,
+        TimeSlot.start_time >= start,
+        TimeSlot.start_time <= end
+    ).group_by(period).order_by(period).all()
+
+    return [{
+        'date': period_start.strftime('%Y-%m-%d'),
+        'slots': slots,
+        'booked': booked,
+        'appointments': appointments,
+        'cancelled': cancelled,
+        'no_show': no_show,
+        'fill_rate': _rate(booked, slots)
+    } for period_start, slots, booked, appointments, cancelled, no_show in rows]
+
+
+def doctor_analytics(calendar_id, start, end, series=None):
+    """
+    Аналитика врача за период постоянным числом запросов (2, с рядом - 3)
+
+    Args:
+        calendar_id: календарь врача
+        start, end: границы периода (по времени термина)
+        series: None или корзина временного ряда ('day', 'week', 'month')
+
+    Returns:
+        dict: slots, appointments, bookings_by_day (+ series)
+    """
+    slot_counts = slot_status_counts(calendar_id, start, end)
+    total_slots = sum(slot_counts.values())
+    booked_slots = slot_counts.get('booked', 0)
+
+    status_counts = {}
+    bookings_by_day = {name: 0 for name in DOW_NAMES[1:] + DOW_NAMES[:1]}
+    for status, dow, count in booking_status_dow_counts(calendar_id, start, end):
+        status_counts[status] = status_counts.get(status, 0) + count
+        if status in ('confirmed', 'completed'):
+            bookings_by_day[DOW_NAMES[int(dow)]] += count
+
+    total_appointments = sum(status_counts.values())
+    completed = status_counts.get('completed', 0)
+    cancelled = status_counts.get('cancelled', 0)
+    no_show = status_counts.get('no_show', 0)
+
+    result = {
+        'slots': {
+            'total': total_slots,
+            'booked': booked_slots,
+            'available': slot_counts.get('available', 0),
+            'blocked': slot_counts.get('blocked', 0),
+            'fill_rate': _rate(booked_slots, total_slots)
+        },
+        'appointments': {
+            'total': total_appointments,
+            'confirmed': status_counts.get('confirmed', 0),
+            'completed': completed,
+            'cancelled': cancelled,
+            'no_show': no_show,
+            'no_show_rate': _rate(no_show, completed),
+            'cancellation_rate': _rate(cancelled, total_appointments)
+        },
+        'bookings_by_day': bookings_by_day
+    }
+
+    if series:
+        result['series'] = time_series(calendar_id, start, end, series)
+
+    return result
+
+
+def _series_period(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def doctor_analytics_from_daily_stats(doctor_id, start_day, end_day, series=None):
+    """
+    Аналитика врача из daily_stats: один запрос, не больше ~365 строк
+
+    Формат результата тот же, что у doctor_analytics.
+    """
+    from app.services.stats_service import daily_stat_rows
+
+    rows = daily_stat_rows('doctor', doctor_id, start_day, end_day)
+    totals = {name: sum(getattr(row, name) for row in rows) for name in DailyStat.COUNTERS}
+
+    bookings_by_day = {name: 0 for name in DOW_NAMES[1:] + DOW_NAMES[:1]}
+    buckets = {}
+    for row in rows:
+        appointments = row.bookings_confirmed + row.bookings_completed
+        # date.weekday(): 0 = понедельник
+        bookings_by_day[DOW_NAMES[(row.day.weekday() + 1) % 7]] += appointments
+        if series:
+            bucket = buckets.setdefault(_series_period(row.day, series), {
+                'slots': 0, 'booked': 0, 'appointments': 0, 'cancelled': 0, 'no_show': 0
+            })
+            bucket['slots'] += row.slots_total
+            bucket['booked'] += row.slots_booked
+            bucket['appointments'] += appointments
+            bucket['cancelled'] += row.bookings_cancelled
+            bucket['no_show'] += row.bookings_no_show
+
+    total_slots = totals['slots_total']
+    total_appointments = totals['bookings_total']
+
+    result = {
+        'slots': {
+            'total': total_slots,
+            'booked': totals['slots_booked'],
+            'available': totals['slots_available'],
+            'blocked': totals['slots_blocked'],
+            'fill_rate': _rate(totals['slots_booked'], total_slots)
+        },
+        'appointments': {
+            'total': total_appointments,
+            'confirmed': totals['bookings_confirmed'],
+            'completed': totals['bookings_completed'],
+            'cancelled': totals['bookings_cancelled'],
+            'no_show': totals['bookings_no_show'],
+            'no_show_rate': _rate(totals['bookings_no_show'], totals['bookings_completed']),
+            'cancellation_rate': _rate(totals['bookings_cancelled'], total_appointments)
+        },
+        'bookings_by_day': bookings_by_day
+    }
+
+    if series:
+        result['series'] = [
+            dict(bucket, date=period.strftime('%Y-%m-%d'), fill_rate=_rate(bucket['booked'], bucket['slots']))
+            for period, bucket in sorted(buckets.items())
+            if bucket['slots'] or bucket['appointments']
+        ]
+
+    return result
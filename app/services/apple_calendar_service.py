@@ -1,16 +1,24 @@
 """
 Apple Calendar Service - Интеграция с Apple Calendar через CalDAV
 """
-from typing import List, Dict
-from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from datetime import datetime, timedelta
 import caldav
+from caldav.elements.base import ValuedBaseElement
+from caldav.lib.error import NotFoundError
 from icalendar import Calendar as iCalendar, Event as iEvent
 
-from app.services.calendar_integration_service import CalendarService
+from app.services.calendar_integration_service import CalendarService, SyncCursorExpired, ExternalEventGone
+from app.services.calendar_http import calendar_session
 from app.models.booking import Booking
 from app.models.calendar_integration import CalendarIntegration
 
 
+class GetCTag(ValuedBaseElement):
+    """CalendarServer getctag - меняется при любом изменении календаря"""
+    tag = '{http://calendarserver.org/ns/}getctag'
+
+
 class AppleCalendarService(CalendarService):
     """
     Сервис для работы с Apple Calendar (iCloud) через CalDAV протокол
@@ -47,6 +55,9 @@ class AppleCalendarService(CalendarService):
                 username=self.integration.caldav_username,
                 password=password
             )
+            # Общий пул соединений с таймаутами и повтором на 429/5xx
+            # (учетные данные передаются в каждом запросе, cookies не хранятся)
+            self.client.session = calendar_session(self.integration.provider)
             
             # Получить principal (пользователя)
             principal = self.client.principal()
@@ -131,24 +142,20 @@ class AppleCalendarService(CalendarService):
         
         Returns:
             bool: True если обновление успешно
+        
+        Raises:
+            ExternalEventGone: события больше нет в календаре (NotFoundError)
         """
         if not self.calendar:
             raise Exception("Not authenticated. Call authenticate() first.")
         
+        # Найти событие по UID (один REPORT, без чтения всего календаря)
+        try:
+            target_event = self.calendar.event_by_uid(external_event_id)
+        except NotFoundError as e:
+            raise ExternalEventGone(str(e))
+        
         try:
-            # Найти событие по UID
-            events = self.calendar.events()
-            target_event = None
-            
-            for event in events:
-                ical_data = event.icalendar_component
-                if str(ical_data.get('uid')) == external_event_id:
-                    target_event = event
-                    break
-            
-            if not target_event:
-                return False
-            
             # Обновить событие
             ical_data = target_event.icalendar_component
             ical_data['summary'] = self.format_event_title(booking)
@@ -161,8 +168,7 @@ class AppleCalendarService(CalendarService):
             return True
             
         except Exception as e:
-            print(f"Failed to update Apple Calendar event: {e}")
-            return False
+            raise Exception(f"Failed to update Apple Calendar event: {e}")
     
     def delete_event(self, external_event_id: str) -> bool:
         """
@@ -178,16 +184,15 @@ class AppleCalendarService(CalendarService):
             raise Exception("Not authenticated. Call authenticate() first.")
         
         try:
-            # Найти событие по UID
-            events = self.calendar.events()
-            
-            for event in events:
-                ical_data = event.icalendar_component
-                if str(ical_data.get('uid')) == external_event_id:
-                    event.delete()
-                    return True
+            # Найти событие по UID (один REPORT, без чтения всего календаря)
+            try:
+                target_event = self.calendar.event_by_uid(external_event_id)
+            except NotFoundError:
+                # Событие уже удалено во внешнем календаре
+                return True
             
-            return False
+            target_event.delete()
+            return True
             
         except Exception as e:
             print(f"Failed to delete Apple Calendar event: {e}")
@@ -220,33 +225,9 @@ class AppleCalendarService(CalendarService):
             
             for event in events:
                 try:
-                    ical_data = event.icalendar_component
-                    
-                    # Получить время начала и окончания
-                    dtstart = ical_data.get('dtstart')
-                    dtend = ical_data.get('dtend')
-                    
-                    if not dtstart or not dtend:
-                        continue
-                    
-                    # Преобразовать в datetime если это date
-                    start_dt = dtstart.dt if hasattr(dtstart, 'dt') else dtstart
-                    end_dt = dtend.dt if hasattr(dtend, 'dt') else dtend
-                    
-                    if not isinstance(start_dt, datetime):
-                        # Пропустить целодневные события
-                        continue
-                    
-                    standardized_event = {
-                        'id': str(ical_data.get('uid', '')),
-                        'title': str(ical_data.get('summary', 'Busy')),
-                        'description': str(ical_data.get('description', '')),
-                        'start': start_dt,
-                        'end': end_dt,
-                        'status': 'confirmed',
-                    }
-                    
-                    standardized_events.append(standardized_event)
+                    standardized_event = self._standardize_ical(event.icalendar_component)
+                    if standardized_event:
+                        standardized_events.append(standardized_event)
                     
                 except Exception as e:
                     print(f"Error parsing CalDAV event: {e}")
@@ -257,6 +238,105 @@ class AppleCalendarService(CalendarService):
         except Exception as e:
             raise Exception(f"Failed to fetch Apple Calendar events: {e}")
     
+    @staticmethod
+    def _standardize_ical(ical_data) -> Optional[Dict]:
+        """
+        VEVENT -> стандартизированный формат
+        
+        Returns:
+            Dict или None для целодневных событий и событий без времени
+        """
+        # Получить время начала и окончания
+        dtstart = ical_data.get('dtstart')
+        dtend = ical_data.get('dtend')
+        
+        if not dtstart or not dtend:
+            return None
+        
+        # Преобразовать в datetime если это date
+        start_dt = dtstart.dt if hasattr(dtstart, 'dt') else dtstart
+        end_dt = dtend.dt if hasattr(dtend, 'dt') else dtend
+        
+        if not isinstance(start_dt, datetime):
+            # Пропустить целодневные события
+            return None
+        
+        status = str(ical_data.get('status', 'CONFIRMED')).lower()
+        return {
+            'id': str(ical_data.get('uid', '')),
+            'title': str(ical_data.get('summary', 'Busy')),
+            'description': str(ical_data.get('description', '')),
+            'start': start_dt,
+            'end': end_dt,
+            'status': 'cancelled' if status == 'cancelled' else 'confirmed',
+        }
+    
+    def _get_ctag(self) -> Optional[str]:
+        """Текущий getctag календаря (None если сервер его не поддерживает)"""
+        try:
+            props = self.calendar.get_properties([GetCTag()])
+            ctag = props.get(GetCTag.tag)
+            return str(ctag) if ctag else None
+        except Exception as e:
+            print(f"CalDAV getctag failed: {e}")
+            return None
+    
+    def list_changes(self, cursor: Optional[str], time_min: datetime,
+                     time_max: datetime) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Инкрементальная выборка через ctag и sync-collection (RFC 6578)
+        
+        Неизменившийся ctag - изменений нет, календарь не читается вовсе.
+        Иначе по sync-token загружаются только изменившиеся объекты. Если
+        среди них есть повторяющиеся (RRULE), окно перечитывается с
+        раскрытием повторений - sync-collection отдает только мастер-событие.
+        Сервер без sync-collection - всегда полная выборка окна.
+        """
+        if not self.calendar:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        ctag = self._get_ctag()
+        if cursor and ctag and ctag == self.integration.sync_ctag:
+            return [], cursor
+        
+        if cursor:
+            try:
+                changes = self.calendar.objects_by_sync_token(sync_token=cursor, load_objects=True)
+            except Exception as e:
+                raise SyncCursorExpired(str(e))
+            
+            standardized_events = []
+            recurring = False
+            for obj in changes:
+                # Удаленный объект: данных нет, слоты не разблокируются
+                if not obj.data:
+                    continue
+                try:
+                    ical_data = obj.icalendar_component
+                    if ical_data.get('rrule'):
+                        recurring = True
+                        break
+                    standardized_event = self._standardize_ical(ical_data)
+                    if standardized_event:
+                        standardized_events.append(standardized_event)
+                except Exception as e:
+                    print(f"Error parsing CalDAV event: {e}")
+            
+            if recurring:
+                standardized_events = self.get_events(time_min, time_max)
+            next_cursor = changes.sync_token
+        else:
+            # Токен берется до чтения окна: изменения между ними придут в следующий раз
+            try:
+                next_cursor = self.calendar.objects_by_sync_token(load_objects=False).sync_token
+            except Exception as e:
+                print(f"CalDAV sync-collection not supported: {e}")
+                next_cursor = None
+            standardized_events = self.get_events(time_min, time_max)
+        
+        self.integration.sync_ctag = ctag
+        return standardized_events, next_cursor
+    
     def list_calendars(self) -> List[Dict]:
         """
         Получить список доступных календарей
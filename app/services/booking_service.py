@@ -0,0 +1,277 @@
+"""
+Booking Service - загрузка бронирований одним запросом и общая сериализация
+"""
+from sqlalchemy import tuple_
+from sqlalchemy.orm import joinedload, contains_eager
+from app.models import Booking, TimeSlot, Calendar, Doctor
+from app.constants.specialities import SPECIALITIES
+from datetime import datetime
+import base64
+import uuid
+
+
+# Статусы по умолчанию для представлений истории бронирований
+HISTORY_VIEWS = {
+    'upcoming': ['confirmed'],
+    'past': ['completed', 'cancelled', 'no_show'],
+    'all': ['confirmed', 'completed', 'cancelled', 'no_show'],
+}
+
+
+def booking_load_options():
+    """
+    Опции eager loading для бронирования
+
+    Подгружает слот, календарь, врача, практику и пациента в том же запросе
+    (LEFT OUTER JOIN), чтобы сериализация не делала lazy-load запросов.
+    """
+    return (
+        joinedload(Booking.timeslot)
+        .joinedload(TimeSlot.calendar)
+        .joinedload(Calendar.doctor)
+        .joinedload(Doctor.practice),
+        joinedload(Booking.patient),
+    )
+
+
+def booking_query(join_timeslot=False):
+    """
+    Booking.query с подключенными опциями eager loading
+
+    join_timeslot=True - слот, календарь и врач присоединяются явно (для
+    фильтров и сортировки по ним) и заполняются из этих же JOIN через
+    contains_eager: таблицы не соединяются второй раз.
+    """
+    if not join_timeslot:
+        return Booking.query.options(*booking_load_options())
+    return Booking.query.join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).join(
+        Doctor, Calendar.doctor_id == Doctor.id
+    ).options(
+        contains_eager(Booking.timeslot)
+        .contains_eager(TimeSlot.calendar)
+        .contains_eager(Calendar.doctor)
+        .joinedload(Doctor.practice),
+        joinedload(Booking.patient),
+    )
+
+
+def load_booking(booking_id):
+    """
+    Загрузить бронирование со всеми связями по ID
+
+    Args:
+        booking_id: UUID или строка
+
+    Returns:
+        Booking или None
+    """
+    if not isinstance(booking_id, uuid.UUID):
+        booking_id = uuid.UUID(str(booking_id))
+    return booking_query().filter(Booking.id == booking_id).first()
+
+
+def load_booking_by_code(booking_code):
+    """Загрузить бронирование со всеми связями по booking_code"""
+    return booking_query().filter(Booking.booking_code == booking_code).first()
+
+
+def get_booking_doctor(booking):
+    """Врач бронирования (без дополнительных запросов при eager loading)"""
+    if booking.timeslot and booking.timeslot.calendar:
+        return booking.timeslot.calendar.doctor
+    return None
+
+
+def practice_city(practice):
+    """Город практики из JSON адреса"""
+    if not practice:
+        return None
+    address_dict = practice.address_dict
+    return address_dict.get('city') if isinstance(address_dict, dict) else None
+
+
+def serialize_booking_detail(booking, include_patient=False, include_ids=True):
+    """
+    Детальная сериализация бронирования (одно бронирование)
+
+    Args:
+        booking: Booking, загруженный через booking_query()
+        include_patient: включить контакт пациента (для врача)
+        include_ids: включить ID врача и практики (для авторизованных запросов)
+    """
+    slot = booking.timeslot
+    doctor = get_booking_doctor(booking)
+    practice = doctor.practice if doctor else None
+
+    data = {
+        'id': str(booking.id),
+        'booking_code': booking.booking_code,
+        'status': booking.status,
+        'cancellable': booking.can_be_cancelled(),
+        'cancellable_until': booking.cancellable_until.isoformat() if booking.cancellable_until else None,
+        'timeslot': {
+            'start_time': slot.start_time.isoformat(),
+            'end_time': slot.end_time.isoformat(),
+            'date': slot.start_time.strftime('%Y-%m-%d'),
+            'time': slot.start_time.strftime('%H:%M')
+        } if slot else None,
+        'doctor': {
+            'first_name': doctor.first_name,
+            'last_name': doctor.last_name,
+            'full_name': f"{doctor.first_name} {doctor.last_name}",
+            'speciality': doctor.speciality,
+            'speciality_display': SPECIALITIES.get(doctor.speciality, {}).get('de', doctor.speciality)
+        } if doctor else None,
+        'practice': {
+            'name': practice.name,
+            'address': practice.address,
+            'phone': practice.phone,
+            'city': practice_city(practice)
+        } if practice else None
+    }
+
+    if include_ids:
+        data['created_at'] = booking.created_at.isoformat() if booking.created_at else None
+        data['cancelled_at'] = booking.cancelled_at.isoformat() if booking.cancelled_at else None
+        data['cancelled_by'] = booking.cancelled_by
+        if doctor:
+            data['doctor']['id'] = str(doctor.id)
+        if practice:
+            data['practice']['id'] = str(practice.id)
+        data['patient'] = {
+            'id': str(booking.patient.id),
+            'name': booking.patient.name,
+            'phone': booking.patient.phone
+        } if include_patient and booking.patient else None
+
+    return data
+
+
+def serialize_booking_summary(booking, include_patient=False):
+    """
+    Плоская сериализация бронирования для списков
+
+    Args:
+        booking: Booking, загруженный через booking_query()
+        include_patient: включить имя и телефон пациента (для врача и админа)
+    """
+    slot = booking.timeslot
+    doctor = get_booking_doctor(booking)
+    practice = doctor.practice if doctor else None
+
+    date_str = slot.start_time.strftime('%Y-%m-%d') if slot else ''
+    time_str = slot.start_time.strftime('%H:%M') if slot else ''
+
+    data = {
+        'id': str(booking.id),
+        'booking_code': booking.booking_code,
+        'status': booking.status,
+        'doctor_id': str(doctor.id) if doctor else None,
+        'doctor_name': f'{doctor.first_name} {doctor.last_name}' if doctor else 'Unknown',
+        'practice_name': practice.name if practice else 'Unknown',
+        'speciality': doctor.speciality if doctor else 'Unknown',
+        'appointment_date': date_str,
+        'appointment_time': time_str,
+        'date': date_str,
+        'time': time_str,
+        'start_time': slot.start_time.isoformat() if slot else None,
+        'amount_paid': float(booking.amount_paid) if booking.amount_paid else 0,
+        'created_at': booking.created_at.isoformat() if booking.created_at else None
+    }
+
+    if include_patient:
+        patient = booking.patient
+        data['patient_name'] = (patient.name or patient.phone) if patient else 'Unknown'
+        data['patient_phone'] = patient.phone if patient else None
+
+    return data
+
+
+def encode_cursor(sort_value, booking_id):
+    """Закодировать позицию keyset-пагинации (значение сортировки + ID)"""
+    raw = f"{sort_value.isoformat()}|{booking_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Раскодировать курсор пагинации
+
+    Raises:
+        ValueError: если курсор поврежден
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        sort_str, id_str = raw.split('|', 1)
+        return datetime.fromisoformat(sort_str), uuid.UUID(id_str)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def patient_booking_history(patient_id, view='all', statuses=None, cursor=None, limit=20, now=None):
+    """
+    Keyset-пагинация истории бронирований пациента
+
+    Каждое представление — один запрос с диапазонным сканированием индекса
+    ix_bookings_patient_status_created (patient_id, status, created_at):
+    - upcoming: подтвержденные будущие термины, по времени термина (ASC)
+    - past / all: по дате создания (DESC)
+
+    Args:
+        patient_id: UUID пациента
+        view: 'upcoming', 'past' или 'all'
+        statuses: список статусов (сужает статусы представления)
+        cursor: курсор из предыдущей страницы
+        limit: размер страницы
+        now: текущее время (по умолчанию utcnow)
+
+    Returns:
+        tuple: (list of Booking, next_cursor или None)
+
+    Raises:
+        ValueError: неизвестное представление или поврежденный курсор
+    """
+    if view not in HISTORY_VIEWS:
+        raise ValueError(f'Unknown view: {view}')
+
+    view_statuses = HISTORY_VIEWS[view]
+    if statuses:
+        view_statuses = [status for status in statuses if status in view_statuses]
+        if not view_statuses:
+            return [], None
+
+    now = now or datetime.utcnow()
+    query = booking_query(join_timeslot=True).filter(
+        Booking.patient_id == patient_id,
+        Booking.status.in_(view_statuses)
+    )
+
+    if view == 'upcoming':
+        sort_column = TimeSlot.start_time
+        query = query.filter(TimeSlot.start_time > now)
+        if cursor:
+            after_value, after_id = decode_cursor(cursor)
+            query = query.filter(tuple_(TimeSlot.start_time, Booking.id) > tuple_(after_value, after_id))
+        query = query.order_by(TimeSlot.start_time.asc(), Booking.id.asc())
+    else:
+        sort_column = Booking.created_at
+        if cursor:
+            before_value, before_id = decode_cursor(cursor)
+            query = query.filter(tuple_(Booking.created_at, Booking.id) < tuple_(before_value, before_id))
+        query = query.order_by(Booking.created_at.desc(), Booking.id.desc())
+
+    # Берем на одну запись больше, чтобы понять, есть ли следующая страница
+    rows = query.limit(limit + 1).all()
+    bookings = rows[:limit]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = bookings[-1]
+        sort_value = last.timeslot.start_time if sort_column is TimeSlot.start_time else last.created_at
+        next_cursor = encode_cursor(sort_value, last.id)
+
+    return bookings, next_cursor
@@ -0,0 +1,143 @@
+"""
+Booking Sweeper - перевод прошедших неотмеченных терминов в completed
+"""
+from flask import current_app
+from sqlalchemy import update, case, func
+from app import db
+from app.models import Booking, TimeSlot, Patient, TaskRun
+from app.services.stats_service import mark_booking_days_dirty
+from datetime import datetime, timedelta
+from collections import defaultdict
+
+
+TASK_NAME = 'booking.sweeper'
+
+
+def _claim_past_booking_ids(cutoff, batch_size):
+    """
+    ID подтвержденных бронирований, термин которых закончился до cutoff
+
+    FOR UPDATE SKIP LOCKED: параллельные sweeper'ы берут разные пачки
+    """
+    rows = db.session.query(Booking.id).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).filter(
+        Booking.status == 'confirmed',
+        TimeSlot.start_time <= cutoff,
+        TimeSlot.end_time <= cutoff
+    ).order_by(
+        TimeSlot.start_time
+    ).limit(batch_size).with_for_update(
+        of=Booking, skip_locked=True
+    ).all()
+    return [row.id for row in rows]
+
+
+def _transition_bookings(booking_ids):
+    """
+    Один set-based UPDATE: confirmed -> completed, attended=True
+
+    Отмеченные врачом бронирования уже не в confirmed (mark_attended
+    сразу ставит completed / no_show), поэтому сюда попадают только
+    неотмеченные - они считаются состоявшимися.
+
+    Returns:
+        list of (id, patient_id) - реально измененные строки
+    """
+    stmt = update(Booking).where(
+        Booking.id.in_(booking_ids),
+        Booking.status == 'confirmed'
+    ).values(
+        status='completed',
+        attended=True,
+        updated_at=datetime.utcnow()
+    ).returning(Booking.id, Booking.patient_id).execution_options(
+        synchronize_session=False
+    )
+    return db.session.execute(stmt).all()
+
+
+def _apply_patient_deltas(attended_deltas):
+    """
+    Обновить счетчики пациентов одним UPDATE с агрегированными дельтами
+    """
+    if not attended_deltas:
+        return
+
+    db.session.execute(
+        update(Patient).where(Patient.id.in_(list(attended_deltas))).values(
+            attended_appointments=func.coalesce(Patient.attended_appointments, 0) + case(
+                attended_deltas, value=Patient.id, else_=0
+            )
+        ).execution_options(
+            synchronize_session=False
+        )
+    )
+
+
+def sweep_past_bookings(batch_size=None, grace_hours=None, now=None):
+    """
+    Закрыть все прошедшие подтвержденные бронирования
+
+    Неявку отмечает только врач (mark_attended(False)) в течение grace_hours
+    после термина; неотмеченные бронирования закрываются как completed с
+    attended=True. Поздняя отметка неявки корректирует счетчики пациента.
+
+    Каждая пачка — одна транзакция: claim (SKIP LOCKED), один UPDATE
+    бронирований с RETURNING, один UPDATE счетчиков пациентов.
+    Безопасно запускать параллельно в нескольких процессах.
+
+    Args:
+        batch_size: размер пачки (по умолчанию SWEEPER_BATCH_SIZE)
+        grace_hours: сколько часов после окончания термина ждать отметки врача
+        now: текущее время (по умолчанию utcnow)
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('SWEEPER_BATCH_SIZE', 500)
+    if grace_hours is None:
+        grace_hours = config.get('SWEEPER_GRACE_HOURS', 12)
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(hours=grace_hours)
+
+    run = TaskRun(task_name=TASK_NAME, started_at=datetime.utcnow())
+    completed_total = 0
+
+    while True:
+        booking_ids = _claim_past_booking_ids(cutoff, batch_size)
+        if not booking_ids:
+            db.session.rollback()
+            break
+
+        changed = _transition_bookings(booking_ids)
+
+        attended_deltas = defaultdict(int)
+        for _, patient_id in changed:
+            attended_deltas[patient_id] += 1
+
+        _apply_patient_deltas(dict(attended_deltas))
+        # Массовый UPDATE мимо ORM - дни статистики помечаем явно
+        mark_booking_days_dirty(booking_id for booking_id, _ in changed)
+        db.session.commit()
+
+        completed_total += len(changed)
+
+        run.batches += 1
+        run.processed += len(booking_ids)
+        run.succeeded += len(changed)
+        run.skipped += len(booking_ids) - len(changed)
+
+        if len(booking_ids) < batch_size:
+            break
+
+    run.finish({
+        'cutoff': cutoff.isoformat(),
+        'completed': completed_total
+    })
+    db.session.add(run)
+    db.session.commit()
+
+    print(f"Sweeper: {completed_total} completed in {run.batches} batches ({run.duration_ms} ms)")
+    return run
@@ -0,0 +1,223 @@
+"""
+Calendar HTTP - общий HTTP транспорт календарных провайдеров (Microsoft Graph, CalDAV)
+"""
+from flask import current_app
+from email.utils import parsedate_to_datetime
+from http.cookiejar import DefaultCookiePolicy
+from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+import bisect
+import random
+import threading
+import time
+import requests
+
+
+# Повторяются всегда (запрос не обработан) / только для идемпотентных методов
+RETRY_ALWAYS_STATUSES = (429, 503)
+RETRY_IDEMPOTENT_STATUSES = (500, 502, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE', 'PATCH', 'PROPFIND', 'REPORT')
+
+# Верхние границы корзин гистограммы, мс (последняя - все, что дольше)
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Потокобезопасная гистограмма длительности запросов"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._total_ms = 0.0
+        self._errors = 0
+        self._retries = 0
+        self._lock = threading.Lock()
+
+    def observe(self, duration_ms, error=False):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, duration_ms)] += 1
+            self._total_ms += duration_ms
+            if error:
+                self._errors += 1
+
+    def retried(self):
+        with self._lock:
+            self._retries += 1
+
+    def _percentile(self, counts, total, q):
+        """Верхняя граница корзины, в которую попадает перцентиль q"""
+        threshold = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= threshold:
+                return self.buckets[i] if i < len(self.buckets) else None
+        return None
+
+    def snapshot(self):
+        """Счетчики корзин и оценки p50/p95 (None - дольше последней корзины)"""
+        with self._lock:
+            counts = list(self._counts)
+            total_ms, errors, retries = self._total_ms, self._errors, self._retries
+        total = sum(counts)
+        return {
+            'count': total,
+            'errors': errors,
+            'retries': retries,
+            'avg_ms': round(total_ms / total, 1) if total else None,
+            'p50_le_ms': self._percentile(counts, total, 0.5) if total else None,
+            'p95_le_ms': self._percentile(counts, total, 0.95) if total else None,
+            'buckets': {
+                (f'le_{bound}' if i < len(self.buckets) else 'inf'): count
+                for i, (bound, count) in enumerate(zip(self.buckets + (None,), counts))
+            }
+        }
+
+
+class _RejectCookies(DefaultCookiePolicy):
+    """Сессия общая для всех врачей - cookies одного аккаунта не должны уйти другому"""
+
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def _retry_after_seconds(response):
+    """Retry-After в секундах (число или HTTP-дата), None если заголовка нет"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CalendarSession(requests.Session):
+    """
+    requests.Session провайдера: keep-alive пул соединений, таймауты по
+    умолчанию, повтор с экспоненциальным backoff на 429/5xx и сетевых
+    ошибках (Retry-After учитывается), гистограмма длительности запросов
+
+    Одна на провайдера и процесс, используется из любых потоков.
+    """
+
+    def __init__(self, provider, timeout, max_retries, backoff_base, backoff_max, pool_size):
+        super().__init__()
+        self.provider = provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.latency = LatencyHistogram()
+        self.cookies.set_policy(_RejectCookies())
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def request(self, method, url, *args, **kwargs):
+        # caldav передает timeout=None явно
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self.latency.observe((time.monotonic() - started) * 1000, error=True)
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                status = response.status_code
+                self.latency.observe((time.monotonic() - started) * 1000, error=status >= 500 or status == 429)
+                retryable = status in RETRY_ALWAYS_STATUSES or (idempotent and status in RETRY_IDEMPOTENT_STATUSES)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                retry_after = _retry_after_seconds(response)
+                if retry_after is not None and retry_after > self.backoff_max:
+                    # Провайдер просит ждать дольше, чем разумно держать поток
+                    return response
+                delay = retry_after if retry_after is not None else self._backoff(attempt)
+                response.close()
+
+            self.latency.retried()
+            attempt += 1
+            time.sleep(delay)
+
+    def close(self):
+        # Общая сессия живет весь процесс (DAVClient.close() не должен закрывать пул)
+        pass
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def calendar_session(provider):
+    """Общая на процесс HTTP сессия провайдера ('outlook', 'apple', 'caldav')"""
+    with _sessions_lock:
+        session = _sessions.get(provider)
+        if session is None:
+            config = current_app.config
+            session = _sessions[provider] = CalendarSession(
+                provider,
+                timeout=(config.get('CALENDAR_HTTP_CONNECT_TIMEOUT', 5), config.get('CALENDAR_HTTP_READ_TIMEOUT', 30)),
+                max_retries=config.get('CALENDAR_HTTP_MAX_RETRIES', 4),
+                backoff_base=config.get('CALENDAR_HTTP_BACKOFF_BASE_SECONDS', 1),
+                backoff_max=config.get('CALENDAR_HTTP_BACKOFF_MAX_SECONDS', 60),
+                pool_size=config.get('CALENDAR_HTTP_POOL_SIZE', 20)
+            )
+        return session
+
+
+def latency_snapshot():
+    """Гистограммы длительности запросов по провайдерам (этого процесса)"""
+    with _sessions_lock:
+        sessions = dict(_sessions)
+    return {provider: session.latency.snapshot() for provider, session in sessions.items()}
+
+
+def report_http_latency():
+    """
+    Периодическая задача: записать гистограммы в task_runs и лог
+
+    Гистограммы накопительные с запуска процесса и только этого процесса:
+    воркер отчитывается здесь, снимок web-процесса (запросы из обработчиков
+    API) отдает GET /api/admin/calendar/http-latency.
+    """
+    from app import db
+    from app.models import TaskRun
+
+    snapshot = latency_snapshot()
+    if not snapshot:
+        return None
+
+    run = TaskRun(task_name='calendar.http_latency', started_at=datetime.utcnow())
+    run.processed = sum(stats['count'] for stats in snapshot.values())
+    run.failed = sum(stats['errors'] for stats in snapshot.values())
+    run.finish(snapshot)
+    db.session.add(run)
+    db.session.commit()
+
+    for provider, stats in snapshot.items():
+        print(
+            f"Calendar HTTP {provider}: {stats['count']} requests, {stats['errors']} errors, "
+            f"{stats['retries']} retries, avg {stats['avg_ms']} ms, p50 <= {stats['p50_le_ms']} ms, "
+            f"p95 <= {stats['p95_le_ms']} ms"
+        )
+    return run
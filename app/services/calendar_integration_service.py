@@ -2,14 +2,63 @@
 Calendar Integration Service - Базовая логика интеграции с внешними календарями
 """
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple, Iterable, Iterator
+from datetime import datetime, timedelta, timezone
+from itertools import chain, islice
 import os
 from cryptography.fernet import Fernet
+from flask import current_app
+from sqlalchemy import and_, column, values, text, DateTime, Integer, String
+from sqlalchemy.orm import joinedload
 from app import db
 from app.models.calendar_integration import CalendarIntegration
+from app.models.external_calendar_event import ExternalCalendarEvent
 from app.models.booking import Booking
-from app.models.calendar import TimeSlot
+from app.models.calendar import Calendar, TimeSlot
+
+
+class SyncCursorExpired(Exception):
+    """Провайдер больше не принимает сохраненный курсор - нужна полная синхронизация"""
+
+
+class ExternalEventGone(Exception):
+    """События больше нет у провайдера (404/410) - его нужно создать заново"""
+
+
+class ChangeFeed:
+    """
+    Ленивая выдача изменений провайдера постранично
+
+    pages - итератор (события страницы, курсор или None); курсор приходит с
+    последней страницей, поэтому self.cursor известен после исчерпания.
+    Первая страница читается сразу: ошибки запроса (в том числе
+    SyncCursorExpired) возникают при создании, а не посреди обработки.
+    Итерируется один раз.
+    """
+
+    def __init__(self, pages: Iterable[Tuple[List[Dict], Optional[str]]]):
+        pages = iter(pages)
+        first = next(pages, None)
+        self._pages = chain([first], pages) if first is not None else pages
+        self.cursor = None
+
+    def __iter__(self) -> Iterator[Dict]:
+        for events, cursor in self._pages:
+            if cursor:
+                self.cursor = cursor
+            yield from events
+
+    def materialize(self) -> 'ChangeFeed':
+        """Дочитать все страницы сразу (выборка в одном потоке, обработка в другом)"""
+        self._pages = iter(list(self._pages))
+        return self
+
+
+def _as_utc_naive(value: datetime) -> datetime:
+    """datetime с таймзоной -> naive UTC (как в БД)"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
 
 class CalendarService(ABC):
@@ -26,6 +75,8 @@ class CalendarService(ABC):
         """
         self.integration = integration
         self.cipher = self._get_cipher()
+        # Версии событий из последних ответов провайдера: event_id -> etag
+        self.etags = {}
     
     def _get_cipher(self):
         """Получить cipher для шифрования/дешифрования"""
@@ -80,6 +131,10 @@ class CalendarService(ABC):
         
         Returns:
             bool: True если обновление успешно
+        
+        Raises:
+            ExternalEventGone: события больше нет во внешнем календаре
+            Exception: любая другая ошибка (событие могло остаться)
         """
         pass
     
@@ -110,57 +165,221 @@ class CalendarService(ABC):
         """
         pass
     
-    def sync_from_external(self):
+    def list_changes(self, cursor: Optional[str], time_min: datetime,
+                     time_max: datetime) -> Tuple[List[Dict], Optional[str]]:
         """
-        Синхронизация из внешнего календаря в TerminFinder
+        События, изменившиеся после курсора
+        
+        Без курсора - все события окна и новый курсор. Удаленные события
+        приходят со status='cancelled'. Реализация по умолчанию (провайдер
+        без инкрементального API) всегда читает окно целиком.
+        
+        Args:
+            cursor: курсор предыдущей синхронизации или None
+            time_min: Начало окна (для полной синхронизации)
+            time_max: Конец окна (для полной синхронизации)
+        
+        Returns:
+            tuple: (события в стандартизированном формате, новый курсор или None)
+        
+        Raises:
+            SyncCursorExpired: курсор больше не действителен
+        """
+        return self.get_events(time_min, time_max), None
+    
+    def iter_events(self, time_min: datetime, time_max: datetime) -> Iterator[Dict]:
+        """
+        События за период по мере чтения страниц
+        
+        Реализация по умолчанию отдает результат get_events(); провайдеры
+        с постраничным API переопределяют, чтобы не держать окно в памяти.
+        """
+        yield from self.get_events(time_min, time_max)
+    
+    def stream_changes(self, cursor: Optional[str], time_min: datetime,
+                       time_max: datetime) -> ChangeFeed:
+        """
+        То же, что list_changes(), но постранично (ChangeFeed)
+        
+        Реализация по умолчанию - одна страница из list_changes().
         
-        Блокирует слоты, которые заняты во внешнем календаре
+        Raises:
+            SyncCursorExpired: курсор больше не действителен
         """
+        return ChangeFeed([self.list_changes(cursor, time_min, time_max)])
+    
+    def _full_resync_due(self, now: datetime) -> bool:
+        """
+        Пора ли перечитать окно целиком
+        
+        Курсор привязан к окну на момент полной синхронизации, а окно
+        сдвигается каждый день - поэтому раз в CALENDAR_FULL_RESYNC_HOURS
+        синхронизация все равно полная.
+        """
+        if not self.integration.sync_cursor or not self.integration.last_full_sync_at:
+            return True
+        hours = current_app.config.get('CALENDAR_FULL_RESYNC_HOURS', 24)
+        return hours > 0 and now - self.integration.last_full_sync_at >= timedelta(hours=hours)
+    
+    def fetch_changes(self, full: bool = False, stream: bool = False) -> Dict:
+        """
+        Сетевая часть синхронизации: аутентификация и выборка изменений
+        
+        В БД не пишет (новые токены и курсор остаются в self.integration),
+        поэтому может выполняться в отдельном потоке.
+        
+        Args:
+            full: принудительно полная синхронизация
+            stream: читать страницы по мере обработки в apply_changes()
+                    (только если обе части идут в одном потоке)
+        
+        Returns:
+            Dict: events (ChangeFeed), full, now, time_max - для apply_changes()
+        """
+        if not self.authenticate():
+            raise Exception("Authentication failed")
+        
+        now = datetime.utcnow()
+        time_max = now + timedelta(days=current_app.config.get('CALENDAR_SYNC_WINDOW_DAYS', 90))
+        
+        cursor = None if full or self._full_resync_due(now) else self.integration.sync_cursor
         try:
-            # Аутентификация
-            if not self.authenticate():
-                raise Exception("Authentication failed")
-            
-            # Получить события на ближайшие 90 дней
-            now = datetime.utcnow()
-            time_max = now + timedelta(days=90)
+            feed = self.stream_changes(cursor, now, time_max)
+        except SyncCursorExpired as e:
+            print(f"Sync cursor expired for integration {self.integration.id}: {e}")
+            cursor = None
+            feed = self.stream_changes(None, now, time_max)
+        
+        return {
+            'events': feed if stream else feed.materialize(),
+            'full': cursor is None,
+            'now': now,
+            'time_max': time_max
+        }
+    
+    def apply_changes(self, fetched: Dict) -> Dict:
+        """
+        Запись результата fetch_changes(): блокировка слотов и статус интеграции
+        
+        Returns:
+            Dict: результат синхронизации для API
+        """
+        now = fetched['now']
+        time_max = fetched['time_max']
+        feed = fetched['events']
+        chunk_size = current_app.config.get('CALENDAR_SYNC_CHUNK_SIZE', 200)
+        
+        # События обрабатываются пачками по мере чтения страниц: в памяти
+        # одна пачка, а не все окно. Курсор сохраняется только в последнем
+        # commit - прерванная синхронизация повторится с прежнего курсора.
+        changes_count = own_count = external_count = blocked_count = 0
+        events_iter = iter(feed)
+        while True:
+            events = list(islice(events_iter, chunk_size))
+            if not events:
+                break
+            changes_count += len(events)
             
-            external_events = self.get_events(now, time_max)
+            # Свои события (созданные для бронирований) - одним запросом по связям
+            own_events = self._diff_own_events(events)
+            own_count += len(own_events)
             
-            # Фильтруем события, созданные TerminFinder
-            external_only_events = [
-                event for event in external_events
-                if not self._is_terminfinder_event(event)
+            # Удаленные события и события TerminFinder не блокируют слоты;
+            # инкрементальные изменения могут быть и вне окна
+            changed_events = [
+                event for event in events
+                if event['id'] not in own_events
+                and event.get('status') != 'cancelled'
+                and not self._is_terminfinder_event(event)
+                and _as_utc_naive(event['end']) > now
+                and _as_utc_naive(event['start']) < time_max
             ]
-            
-            # Для каждого внешнего события блокируем пересекающиеся слоты
-            blocked_count = 0
-            for event in external_only_events:
-                blocked = self._block_overlapping_slots(event)
-                blocked_count += blocked
-            
-            # Обновить статус интеграции
-            self.integration.last_sync_at = datetime.utcnow()
-            self.integration.sync_status = 'active'
-            self.integration.reset_error_count()
+            external_count += len(changed_events)
+            blocked_count += self._block_overlapping_slots(changed_events)
+            # Commit до запроса следующей страницы: блокировки строк time_slots
+            # и транзакция не должны жить, пока идет сетевой запрос
             db.session.commit()
-            
-            return {
-                'success': True,
-                'external_events_count': len(external_only_events),
-                'slots_blocked': blocked_count
-            }
-            
+        
+        # Обновить статус интеграции (курсор известен после последней страницы)
+        self.integration.sync_cursor = feed.cursor
+        if fetched['full']:
+            self.integration.last_full_sync_at = now
+        self.integration.last_sync_at = datetime.utcnow()
+        self.integration.sync_status = 'active'
+        self.integration.reset_error_count()
+        db.session.commit()
+        
+        return {
+            'success': True,
+            'mode': 'full' if fetched['full'] else 'incremental',
+            'changes_count': changes_count,
+            'own_events_count': own_count,
+            'external_events_count': external_count,
+            'slots_blocked': blocked_count
+        }
+    
+    def _diff_own_events(self, events: List[Dict]) -> Dict[str, ExternalCalendarEvent]:
+        """
+        Сопоставить изменения провайдера со связями бронирований
+        
+        Связи выбираются пачками по external_event_id (без запроса на событие).
+        Удаленное во внешнем календаре событие снимает связь (бронирование
+        остается), измененное - обновляет etag.
+        
+        Returns:
+            Dict: external_event_id -> ExternalCalendarEvent для своих событий
+        """
+        event_ids = list({event['id'] for event in events})
+        own_events = {}
+        for i in range(0, len(event_ids), 1000):
+            mappings = ExternalCalendarEvent.query.filter(
+                ExternalCalendarEvent.integration_id == self.integration.id,
+                ExternalCalendarEvent.external_event_id.in_(event_ids[i:i + 1000])
+            ).all()
+            own_events.update((mapping.external_event_id, mapping) for mapping in mappings)
+        
+        for event in events:
+            mapping = own_events.get(event['id'])
+            if mapping is None:
+                continue
+            if event.get('status') == 'cancelled':
+                db.session.delete(mapping)
+            elif event.get('etag'):
+                mapping.etag = event['etag']
+        
+        return own_events
+    
+    def record_sync_error(self, error: Exception) -> Dict:
+        """Сохранить ошибку синхронизации в интеграции"""
+        # Откат только после ошибки БД: иначе обновленные токены потерялись бы
+        if not db.session.is_active:
+            db.session.rollback()
+        self.integration.sync_status = 'error'
+        self.integration.sync_error_message = str(error)
+        self.integration.increment_error_count()
+        db.session.commit()
+        
+        return {
+            'success': False,
+            'error': str(error)
+        }
+    
+    def sync_from_external(self, full: bool = False):
+        """
+        Синхронизация из внешнего календаря в TerminFinder
+        
+        Блокирует слоты, которые заняты во внешнем календаре. По сохраненному
+        курсору обрабатываются только изменившиеся события; при истекшем
+        курсоре (или full=True) окно перечитывается целиком. Страницы
+        провайдера читаются по мере обработки.
+        
+        Args:
+            full: принудительно полная синхронизация
+        """
+        try:
+            return self.apply_changes(self.fetch_changes(full, stream=True))
         except Exception as e:
-            self.integration.sync_status = 'error'
-            self.integration.sync_error_message = str(e)
-            self.integration.increment_error_count()
-            db.session.commit()
-            
-            return {
-                'success': False,
-                'error': str(e)
-            }
+            return self.record_sync_error(e)
     
     def sync_to_external(self, booking: Booking) -> Optional[str]:
         """
@@ -184,6 +403,44 @@ class CalendarService(ABC):
             print(f"Error syncing to external calendar: {e}")
             return None
     
+    def write_events(self, operations: List[Dict]) -> List[Dict]:
+        """
+        Пакетная запись событий
+        
+        Реализация по умолчанию - по одному запросу на операцию; провайдеры
+        с batch API переопределяют.
+        
+        Args:
+            operations: list of {'action': 'create'|'update'|'delete',
+                        'booking': Booking (create/update), 'event_id': str (update/delete),
+                        'replaces': str (create вместо удаленного у провайдера события)}
+        
+        Returns:
+            List[Dict]: результат на каждую операцию в том же порядке:
+                ok, event_id, etag, error, gone (события больше нет у провайдера)
+        """
+        results = []
+        for operation in operations:
+            action = operation['action']
+            try:
+                if action == 'create':
+                    event_id = self.create_event(operation['booking'])
+                    results.append({'ok': True, 'event_id': event_id, 'etag': self.etags.get(event_id)})
+                elif action == 'update':
+                    event_id = operation['event_id']
+                    try:
+                        ok = self.update_event(event_id, operation['booking'])
+                    except ExternalEventGone as e:
+                        results.append({'ok': False, 'event_id': event_id, 'error': str(e), 'gone': True})
+                    else:
+                        results.append({'ok': ok, 'event_id': event_id, 'etag': self.etags.get(event_id)})
+                else:
+                    ok = self.delete_event(operation['event_id'])
+                    results.append({'ok': ok, 'event_id': operation['event_id']})
+            except Exception as e:
+                results.append({'ok': False, 'error': str(e)})
+        return results
+    
     def _is_terminfinder_event(self, event: Dict) -> bool:
         """
         Проверить создано ли событие TerminFinder
@@ -194,45 +451,58 @@ class CalendarService(ABC):
         description = event.get('description', '')
         return 'TerminFinder' in description or '[TF]' in description
     
-    def _block_overlapping_slots(self, event: Dict) -> int:
+    def _block_overlapping_slots(self, events: List[Dict]) -> int:
         """
-        Заблокировать слоты, которые пересекаются с событием
+        Заблокировать слоты, которые пересекаются с событиями
+        
+        Один запрос на пачку: события передаются в VALUES и соединяются со
+        свободными слотами календаря по пересечению интервалов. Слот,
+        пересекающийся с несколькими событиями, получает причину первого.
         
         Args:
-            event: Событие из внешнего календаря
+            events: События из внешнего календаря
         
         Returns:
             int: Количество заблокированных слотов
         """
-        if not self.integration.auto_block_conflicts:
+        if not events or not self.integration.auto_block_conflicts:
             return 0
         
-        event_start = event['start']
-        event_end = event['end']
-        event_title = event.get('title', 'External Event')
-        
         # Найти календарь врача
         doctor = self.integration.doctor
         if not doctor.calendar:
             return 0
         
-        # Найти все слоты, которые пересекаются с событием
-        overlapping_slots = TimeSlot.query.filter(
+        external_events = values(
+            column('position', Integer),
+            column('start_time', DateTime(timezone=True)),
+            column('end_time', DateTime(timezone=True)),
+            column('title', String),
+            name='external_events'
+        ).data([
+            (position, event['start'], event['end'], event.get('title', 'External Event'))
+            for position, event in enumerate(events)
+        ])
+        
+        # Найти все слоты, которые пересекаются с событиями
+        overlapping_slots = db.session.query(TimeSlot, external_events.c.title).join(
+            external_events, and_(
+                TimeSlot.start_time < external_events.c.end_time,
+                TimeSlot.end_time > external_events.c.start_time
+            )
+        ).filter(
             TimeSlot.calendar_id == doctor.calendar.id,
-            TimeSlot.start_time < event_end,
-            TimeSlot.end_time > event_start,
             TimeSlot.status == 'available'
-        ).all()
+        ).order_by(external_events.c.position).all()
         
         blocked_count = 0
-        for slot in overlapping_slots:
+        for slot, event_title in overlapping_slots:
+            if slot.status == 'blocked':
+                continue
             slot.status = 'blocked'
             slot.blocked_reason = f'External: {event_title}' if self.integration.import_event_titles else 'External Calendar'
             blocked_count += 1
         
-        if blocked_count > 0:
-            db.session.commit()
-        
         return blocked_count
     
     def format_event_title(self, booking: Booking) -> str:
@@ -304,78 +574,261 @@ def get_calendar_service(integration: CalendarIntegration) -> CalendarService:
         raise ValueError(f"Unknown calendar provider: {integration.provider}")
 
 
-def create_external_event_for_booking(booking: Booking):
+def _fill_event_mapping(mapping: Optional[ExternalCalendarEvent], integration: CalendarIntegration,
+                        booking: Booking, external_event_id: str, etag: Optional[str]) -> ExternalCalendarEvent:
+    """Заполнить связь (новую, если mapping=None) текущим событием и временем термина"""
+    if mapping is None:
+        mapping = ExternalCalendarEvent(
+            integration_id=integration.id,
+            booking_id=booking.id,
+            provider=integration.provider
+        )
+        db.session.add(mapping)
+    
+    mapping.external_event_id = external_event_id
+    mapping.etag = etag
+    mapping.start_time = booking.timeslot.start_time
+    mapping.end_time = booking.timeslot.end_time
+    return mapping
+
+
+# Операция write_events -> счетчик результата
+_WRITE_COUNTERS = {'create': 'created', 'update': 'updated', 'delete': 'deleted'}
+
+# Первый ключ advisory lock записи в интеграцию (второй - hashtext(integration_id))
+_PUSH_LOCK_NAMESPACE = 72047
+
+
+def push_bookings_to_integration(service: CalendarService, bookings: List[Booking]) -> Dict:
     """
-    Создать события во всех подключенных календарях врача
+    Привести события интеграции к состоянию бронирований одной пакетной записью
     
-    Args:
-        booking: Booking instance
+    Связи всех бронирований читаются одним запросом; отмененные - delete,
+    без связи - create (если интеграция выгружает события), с устаревшим
+    временем - update. Событие, удаленное у провайдера, создается заново.
+    Сервис должен быть аутентифицирован.
+    
+    Записи в одну интеграцию идут по очереди (pg_advisory_xact_lock до
+    commit): иначе push и backfill создадут два события для одного
+    бронирования, а отмена не увидит связь, которую создание еще не
+    сохранило. Бронирования перечитываются после получения блокировки.
+    
+    Returns:
+        Dict: счетчики created, updated, deleted, failed
     """
-    doctor = booking.timeslot.calendar.doctor
+    integration = service.integration
+    counts = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+    if not bookings:
+        return counts
     
-    # Получить все активные интеграции
-    integrations = CalendarIntegration.query.filter_by(
-        doctor_id=doctor.id,
-        sync_enabled=True,
-        sync_status='active'
-    ).filter(
-        CalendarIntegration.sync_direction.in_(['both', 'to_external'])
+    db.session.execute(
+        text('SELECT pg_advisory_xact_lock(:namespace, hashtext(:integration_id))'),
+        {'namespace': _PUSH_LOCK_NAMESPACE, 'integration_id': str(integration.id)}
+    )
+    bookings = Booking.query.options(
+        joinedload(Booking.timeslot)
+    ).populate_existing().filter(
+        Booking.id.in_([booking.id for booking in bookings])
     ).all()
     
-    for integration in integrations:
-        try:
-            service = get_calendar_service(integration)
-            external_id = service.sync_to_external(booking)
-            
-            # Сохранить external_id в booking (если нужно отслеживать)
-            # booking.external_calendar_ids = {integration.provider: external_id}
-            
-        except Exception as e:
-            print(f"Error creating event in {integration.provider}: {e}")
-            # Не прерываем процесс, продолжаем с другими интеграциями
+    mappings = {
+        mapping.booking_id: mapping
+        for mapping in ExternalCalendarEvent.query.filter(
+            ExternalCalendarEvent.integration_id == integration.id,
+            ExternalCalendarEvent.booking_id.in_([booking.id for booking in bookings])
+        )
+    }
+    exports = integration.sync_direction in ('both', 'to_external')
+    
+    operations = []
+    for booking in bookings:
+        mapping = mappings.get(booking.id)
+        if booking.status == 'cancelled':
+            if mapping:
+                operations.append({'action': 'delete', 'event_id': mapping.external_event_id, 'booking': booking})
+        elif mapping is None:
+            if exports:
+                operations.append({'action': 'create', 'booking': booking})
+        elif mapping.is_outdated(booking):
+            operations.append({'action': 'update', 'event_id': mapping.external_event_id, 'booking': booking})
+    
+    while operations:
+        recreate = []
+        for operation, result in zip(operations, service.write_events(operations)):
+            booking = operation['booking']
+            action = operation['action']
+            if result.get('ok'):
+                if action == 'delete':
+                    db.session.delete(mappings.pop(booking.id))
+                else:
+                    mappings[booking.id] = _fill_event_mapping(
+                        mappings.get(booking.id), integration, booking, result['event_id'], result.get('etag')
+                    )
+                counts[_WRITE_COUNTERS[action]] += 1
+            elif action == 'update' and result.get('gone'):
+                recreate.append({'action': 'create', 'booking': booking, 'replaces': operation['event_id']})
+            else:
+                counts['failed'] += 1
+                print(f"Error on {action} event in {integration.provider} for booking {booking.id}: {result.get('error')}")
+        operations = recreate
+    
+    db.session.commit()
+    return counts
 
 
-def update_external_event_for_booking(booking: Booking):
+def push_bookings_to_external(booking_ids) -> Dict:
     """
-    Обновить события во всех подключенных календарях
+    Привести события бронирований во всех календарях их врачей к состоянию
+    бронирований (обработчик задачи 'calendar.push_booking')
     
-    Args:
-        booking: Booking instance
+    Повторный запуск безопасен: успешные записи сохранены в связях, поэтому
+    при неудачных операциях функция падает, и задачу повторяет очередь
+    (с backoff).
+    
+    Returns:
+        Dict: суммарные счетчики
+    
+    Raises:
+        Exception: часть операций не выполнена
     """
-    doctor = booking.timeslot.calendar.doctor
+    rows = db.session.query(Booking, Calendar.doctor_id).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).filter(Booking.id.in_(booking_ids)).all()
+    
+    bookings_by_doctor = {}
+    for booking, doctor_id in rows:
+        bookings_by_doctor.setdefault(doctor_id, []).append(booking)
+    
+    totals = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+    if not bookings_by_doctor:
+        return totals
     
-    integrations = CalendarIntegration.query.filter_by(
-        doctor_id=doctor.id,
-        sync_enabled=True
+    integrations = CalendarIntegration.query.filter(
+        CalendarIntegration.doctor_id.in_(list(bookings_by_doctor)),
+        CalendarIntegration.sync_enabled == True,
+        CalendarIntegration.sync_status == 'active'
     ).all()
     
+    errors = []
     for integration in integrations:
         try:
             service = get_calendar_service(integration)
-            # TODO: Получить external_event_id из booking
-            # service.update_event(external_event_id, booking)
+            if not service.authenticate():
+                raise Exception("Authentication failed")
+            counts = push_bookings_to_integration(service, bookings_by_doctor[integration.doctor_id])
         except Exception as e:
-            print(f"Error updating event in {integration.provider}: {e}")
+            db.session.rollback()
+            print(f"Error pushing bookings to {integration.provider}: {e}")
+            errors.append(f"{integration.provider}: {e}")
+            continue
+        for key, value in counts.items():
+            totals[key] += value
+    
+    # Остальные интеграции уже записаны - повтор задачи дойдет только до неудачных
+    if errors or totals['failed']:
+        raise Exception(f"Calendar push incomplete: {totals['failed']} failed operations, errors: {errors}")
+    
+    return totals
+
+
+def push_booking_to_external(booking_id):
+    """Привести события одного бронирования к его состоянию"""
+    return push_bookings_to_external([booking_id])
+
+
+def create_external_event_for_booking(booking: Booking):
+    """Создать события бронирования во всех подключенных календарях врача"""
+    return push_bookings_to_external([booking.id])
+
+
+def update_external_event_for_booking(booking: Booking):
+    """Обновить события бронирования (перенос термина)"""
+    return push_bookings_to_external([booking.id])
 
 
 def delete_external_event_for_booking(booking: Booking):
+    """Удалить события бронирования (отмена термина)"""
+    return push_bookings_to_external([booking.id])
+
+
+def backfill_external_events(integration_id, page_size=500) -> Dict:
     """
-    Удалить события из всех подключенных календарей
+    Выгрузить будущие бронирования врача в только что подключенный календарь
+    (обработчик задачи 'calendar.backfill')
+    
+    Бронирования читаются страницами по page_size, каждая страница - одна
+    пакетная запись. Уже выгруженные (есть связь) пропускаются, поэтому при
+    неудачных операциях функция падает и задачу повторяет очередь.
+    
+    Returns:
+        Dict: счетчики
+    
+    Raises:
+        Exception: часть операций не выполнена
+    """
+    integration = CalendarIntegration.query.get(integration_id)
+    totals = {'created': 0, 'updated': 0, 'deleted': 0, 'failed': 0}
+    if not integration or not integration.sync_enabled:
+        return totals
+    
+    service = get_calendar_service(integration)
+    if not service.authenticate():
+        raise Exception("Authentication failed")
+    
+    query = Booking.query.join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).filter(
+        Calendar.doctor_id == integration.doctor_id,
+        Booking.status.in_(['confirmed', 'pending']),
+        TimeSlot.start_time > datetime.utcnow()
+    ).order_by(TimeSlot.start_time, Booking.id)
+    
+    offset = 0
+    while True:
+        bookings = query.offset(offset).limit(page_size).all()
+        if not bookings:
+            break
+        counts = push_bookings_to_integration(service, bookings)
+        for key, value in counts.items():
+            totals[key] += value
+        offset += len(bookings)
+    
+    print(f"Backfill {integration.provider} for doctor {integration.doctor_id}: {totals}")
+    if totals['failed']:
+        raise Exception(f"Calendar backfill incomplete: {totals['failed']} failed operations")
+    return totals
+
+
+def on_booking_changed(booking: Booking, doctor_id=None, commit=False):
+    """
+    Поставить задачу 'calendar.push_booking', если бронирование касается
+    внешних календарей (есть связь или интеграция врача с выгрузкой)
     
     Args:
-        booking: Booking instance
+        booking: Booking instance (id уже задан)
+        doctor_id: UUID врача (по умолчанию - через слот)
+        commit: сохранить задачу сразу (False - в транзакции вызывающего кода)
     """
-    doctor = booking.timeslot.calendar.doctor
+    from app.services.job_queue import enqueue_job
     
-    integrations = CalendarIntegration.query.filter_by(
-        doctor_id=doctor.id,
-        sync_enabled=True
-    ).all()
+    if booking.id is None:
+        db.session.flush()
     
-    for integration in integrations:
-        try:
-            service = get_calendar_service(integration)
-            # TODO: Получить external_event_id из booking
-            # service.delete_event(external_event_id)
-        except Exception as e:
-            print(f"Error deleting event from {integration.provider}: {e}")
+    if doctor_id is None:
+        doctor_id = db.session.query(Calendar.doctor_id).join(
+            TimeSlot, TimeSlot.calendar_id == Calendar.id
+        ).filter(TimeSlot.id == booking.timeslot_id).scalar()
+    
+    has_integration = db.session.query(CalendarIntegration.id).filter(
+        CalendarIntegration.doctor_id == doctor_id,
+        CalendarIntegration.sync_enabled == True,
+        CalendarIntegration.sync_direction.in_(['both', 'to_external'])
+    ).first() is not None
+    if not has_integration and not db.session.query(ExternalCalendarEvent.id).filter_by(booking_id=booking.id).first():
+        return
+    
+    enqueue_job('calendar.push_booking', {'booking_id': str(booking.id)}, commit=commit)
@@ -0,0 +1,404 @@
+"""
+Calendar Sync Executor - параллельная синхронизация внешних календарей с лимитами провайдеров
+"""
+from flask import current_app
+from sqlalchemy import func, or_, update
+from app import db
+from app.models import CalendarIntegration, TaskRun
+from app.services.calendar_integration_service import get_calendar_service
+from app.services.job_queue import enqueue_job
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import random
+import threading
+import time
+import uuid
+
+
+SCHEDULE_TASK_NAME = 'calendar.schedule'
+
+# Статусы, при которых интеграция синхронизируется по расписанию ('paused' - нет)
+SCHEDULED_STATUSES = ('active', 'error')
+
+
+# ==================== ЛИМИТЫ ПРОВАЙДЕРОВ ====================
+
+class TokenBucket:
+    """
+    Token bucket: в среднем rate операций в секунду, всплеск до capacity
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Взять токен (ждет, если корзина пуста)"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderLimiter:
+    """
+    Лимит провайдера: не больше concurrency одновременных синхронизаций
+    и не чаще rate новых в секунду
+    """
+
+    def __init__(self, concurrency, rate):
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._bucket = TokenBucket(rate)
+
+    def __enter__(self):
+        self._slots.acquire()
+        self._bucket.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self._slots.release()
+        return False
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def provider_limiter(provider):
+    """Общий на процесс лимитер провайдера (CALENDAR_PROVIDER_LIMITS)"""
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limits = current_app.config.get('CALENDAR_PROVIDER_LIMITS', {})
+            concurrency, rate = limits.get(provider, (2, 2))
+            limiter = _limiters[provider] = ProviderLimiter(concurrency, rate)
+        return limiter
+
+
+# ==================== ИСПОЛНИТЕЛЬ ====================
+
+class SyncExecutor:
+    """
+    Синхронизация нескольких интеграций параллельно
+
+    Сетевая часть (fetch_changes) идет в пуле потоков под лимитом провайдера.
+    Запись результатов (apply_changes) - в вызывающем потоке через его сессию,
+    по мере готовности: потоки пула в БД не пишут.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or current_app.config.get('CALENDAR_SYNC_MAX_WORKERS', 8)
+
+    @staticmethod
+    def _fetch(app, service, full):
+        with app.app_context():
+            try:
+                with provider_limiter(service.integration.provider):
+                    return service.fetch_changes(full)
+            finally:
+                db.session.remove()
+
+    def run(self, integrations, full=False, progress=None):
+        """
+        Синхронизировать интеграции
+
+        Args:
+            integrations: list of CalendarIntegration из текущей сессии
+            full: принудительно полная синхронизация
+            progress: callable(dict) - вызывается в начале и после каждой интеграции
+
+        Returns:
+            list of dict: результат по каждой интеграции
+        """
+        app = current_app._get_current_object()
+        state = {'total': len(integrations), 'done': 0, 'succeeded': 0, 'failed': 0, 'results': []}
+
+        def record(integration, result):
+            state['done'] += 1
+            state['succeeded' if result.get('success') else 'failed'] += 1
+            state['results'].append({
+                'integration_id': str(integration.id),
+                'provider': integration.provider,
+                **result
+            })
+            if progress:
+                progress(state)
+
+        if progress:
+            progress(state)
+
+        services = []
+        for integration in integrations:
+            try:
+                services.append(get_calendar_service(integration))
+            except Exception as e:
+                record(integration, {'success': False, 'error': str(e)})
+
+        # Потоки читают отсоединенные копии: commit этой сессии не должен
+        # истекать атрибуты, которые в этот момент читает другой поток
+        for service in services:
+            db.session.expunge(service.integration)
+
+        if services:
+            workers = min(self.max_workers, len(services))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='calendar-sync') as pool:
+                futures = {pool.submit(self._fetch, app, service, full): service for service in services}
+                for future in as_completed(futures):
+                    service = futures[future]
+                    # Новые токены и курсор из потока попадают в сессию здесь
+                    service.integration = db.session.merge(service.integration)
+                    try:
+                        result = service.apply_changes(future.result())
+                    except Exception as e:
+                        result = service.record_sync_error(e)
+                    record(service.integration, result)
+
+        return state['results']
+
+
+def lease_integrations(*criteria, now=None):
+    """
+    Взять аренду sync_locked_until на интеграции, которые сейчас никто не синхронизирует
+
+    Один UPDATE ... RETURNING: из двух одновременных синхронизаций (ручной и
+    плановой) интеграцию получает только одна. Вызывать до загрузки
+    интеграций в сессию, чтобы их атрибуты уже содержали аренду.
+
+    Args:
+        *criteria: фильтр интеграций
+
+    Returns:
+        list of integration ids, на которые взята аренда
+    """
+    now = now or datetime.utcnow()
+    lease = timedelta(seconds=current_app.config.get('CALENDAR_SYNC_LEASE_SECONDS', 900))
+    integration_ids = db.session.execute(
+        update(CalendarIntegration).where(
+            *criteria,
+            or_(CalendarIntegration.sync_locked_until.is_(None), CalendarIntegration.sync_locked_until <= now)
+        ).values(sync_locked_until=now + lease).returning(CalendarIntegration.id),
+        execution_options={'synchronize_session': False}
+    ).scalars().all()
+    db.session.commit()
+    return integration_ids
+
+
+def release_integrations(integration_ids):
+    """Снять аренду после синхронизации"""
+    if not integration_ids:
+        return
+    CalendarIntegration.query.filter(
+        CalendarIntegration.id.in_(integration_ids)
+    ).update({'sync_locked_until': None}, synchronize_session=False)
+    db.session.commit()
+
+
+def sync_doctor_calendars(doctor_id, integration_ids=None, full=False, progress=None):
+    """
+    Синхронизировать активные интеграции врача (обработчик задачи 'calendar.sync')
+
+    Интеграции, которые в этот момент синхронизирует планировщик (аренда
+    sync_locked_until), пропускаются.
+
+    Args:
+        doctor_id: UUID врача
+        integration_ids: только эти интеграции (None - все активные)
+        full: принудительно полная синхронизация
+        progress: callable(dict) для прогресса
+
+    Returns:
+        list of dict
+    """
+    criteria = [
+        CalendarIntegration.doctor_id == doctor_id,
+        CalendarIntegration.sync_enabled == True,
+        CalendarIntegration.sync_status == 'active'
+    ]
+    if integration_ids:
+        criteria.append(CalendarIntegration.id.in_(integration_ids))
+
+    leased_ids = lease_integrations(*criteria)
+    try:
+        integrations = CalendarIntegration.query.filter(
+            CalendarIntegration.id.in_(leased_ids)
+        ).all() if leased_ids else []
+        return SyncExecutor().run(integrations, full=full, progress=progress)
+    finally:
+        if not db.session.is_active:
+            db.session.rollback()
+        release_integrations(leased_ids)
+
+
+# ==================== ПЛАНИРОВЩИК ====================
+
+def next_sync_delay(integration, result):
+    """
+    Интервал до следующей плановой синхронизации
+
+    Ошибка - экспоненциальный backoff по sync_error_count. Успех - адаптивный
+    интервал: были изменения - вдвое чаще, не было - в 1.5 раза реже, в
+    пределах [MIN, MAX]. С живым webhook изменения приходят push'ем, и
+    плановая синхронизация лишь страхует - сразу MAX. Плюс jitter +-10%,
+    чтобы интеграции, подключенные одновременно, не синхронизировались разом.
+
+    Returns:
+        timedelta
+    """
+    config = current_app.config
+    min_interval = config.get('CALENDAR_SYNC_MIN_INTERVAL_SECONDS', 300)
+    max_interval = config.get('CALENDAR_SYNC_MAX_INTERVAL_SECONDS', 3600)
+
+    if not result.get('success'):
+        cap = config.get('CALENDAR_SYNC_BACKOFF_MAX_SECONDS', 21600)
+        delay = min(cap, min_interval * (2 ** max(integration.sync_error_count - 1, 0)))
+    elif integration.external_webhook_id and not integration.is_webhook_expired():
+        delay = integration.sync_interval_seconds = max_interval
+    else:
+        previous = integration.sync_interval_seconds or min_interval
+        if result.get('changes_count'):
+            delay = max(min_interval, previous // 2)
+        else:
+            delay = min(max_interval, int(previous * 1.5))
+        integration.sync_interval_seconds = delay
+
+    return timedelta(seconds=delay * random.uniform(0.9, 1.1))
+
+
+def request_webhook_sync(*criteria, now=None):
+    """
+    Пометить интеграции как измененные (push-уведомление провайдера)
+
+    Только ставит sync_requested_at (если еще не стоит) одним UPDATE -
+    webhook отвечает сразу. Синхронизацию запустит планировщик через
+    CALENDAR_WEBHOOK_DEBOUNCE_SECONDS после первого уведомления, так что
+    серия уведомлений схлопывается в одну синхронизацию.
+
+    Args:
+        *criteria: фильтр интеграций (например по external_webhook_id)
+
+    Returns:
+        int: количество помеченных интеграций
+    """
+    now = now or datetime.utcnow()
+    count = CalendarIntegration.query.filter(*criteria).update(
+        {'sync_requested_at': func.coalesce(CalendarIntegration.sync_requested_at, now)},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+
+def claim_due_integrations(limit, now=None):
+    """
+    Захватить интеграции, которым пора синхронизироваться
+
+    Пора - наступил next_sync_at или с первого webhook-уведомления прошло
+    окно debounce. FOR UPDATE SKIP LOCKED + аренда sync_locked_until в одной
+    транзакции: после commit другие воркеры эти интеграции не видят (и не
+    захватят, пока идет синхронизация), а если воркер упадет - аренда истечет.
+    Метка webhook снимается при захвате: уведомления во время синхронизации
+    поставят новую.
+
+    Returns:
+        list of integration ids
+    """
+    now = now or datetime.utcnow()
+    config = current_app.config
+    lease = timedelta(seconds=config.get('CALENDAR_SYNC_LEASE_SECONDS', 900))
+    debounce = timedelta(seconds=config.get('CALENDAR_WEBHOOK_DEBOUNCE_SECONDS', 30))
+    integrations = CalendarIntegration.query.filter(
+        CalendarIntegration.sync_enabled == True,
+        CalendarIntegration.sync_status.in_(SCHEDULED_STATUSES),
+        CalendarIntegration.sync_direction.in_(['both', 'from_external']),
+        or_(CalendarIntegration.sync_locked_until.is_(None), CalendarIntegration.sync_locked_until <= now),
+        or_(
+            CalendarIntegration.next_sync_at.is_(None),
+            CalendarIntegration.next_sync_at <= now,
+            CalendarIntegration.sync_requested_at <= now - debounce
+        )
+    ).order_by(
+        CalendarIntegration.next_sync_at.asc().nullsfirst()
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    for integration in integrations:
+        integration.sync_locked_until = now + lease
+        integration.sync_requested_at = None
+
+    integration_ids = [integration.id for integration in integrations]
+    db.session.commit()
+    return integration_ids
+
+
+def schedule_due_syncs(batch_size=None, now=None):
+    """
+    Периодическая задача: захватить пачками интеграции, которым пора
+    синхронизироваться, и поставить по задаче 'calendar.sync_scheduled' на пачку
+
+    Сама синхронизация идет в пуле воркера, главный цикл не блокируется.
+    Сюда же попадают интеграции, помеченные webhook'ом (request_webhook_sync).
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    batch_size = batch_size or current_app.config.get('CALENDAR_SYNC_BATCH_SIZE', 20)
+    now = now or datetime.utcnow()
+    run = TaskRun(task_name=SCHEDULE_TASK_NAME, started_at=datetime.utcnow())
+
+    while True:
+        integration_ids = claim_due_integrations(batch_size, now)
+        if not integration_ids:
+            break
+        enqueue_job('calendar.sync_scheduled', {
+            'integration_ids': [str(integration_id) for integration_id in integration_ids]
+        }, max_attempts=1)
+        run.batches += 1
+        run.processed += len(integration_ids)
+        if len(integration_ids) < batch_size:
+            break
+
+    run.succeeded = run.processed
+    run.finish({'batch_size': batch_size})
+    # Задача запускается каждые 10 секунд - пустые запуски не журналируем
+    if not run.processed:
+        return run
+    db.session.add(run)
+    db.session.commit()
+
+    print(f"Calendar sync: {run.processed} integrations scheduled in {run.batches} batches")
+    return run
+
+
+def sync_scheduled_integrations(integration_ids):
+    """
+    Синхронизировать захваченные планировщиком интеграции (обработчик
+    'calendar.sync_scheduled') и назначить им next_sync_at
+
+    Returns:
+        list of dict
+    """
+    integrations = CalendarIntegration.query.filter(
+        CalendarIntegration.id.in_(integration_ids),
+        CalendarIntegration.sync_enabled == True,
+        CalendarIntegration.sync_status.in_(SCHEDULED_STATUSES)
+    ).all()
+
+    results = SyncExecutor().run(integrations)
+
+    now = datetime.utcnow()
+    for result in results:
+        integration = CalendarIntegration.query.get(uuid.UUID(result['integration_id']))
+        if integration:
+            integration.next_sync_at = now + next_sync_delay(integration, result)
+    db.session.commit()
+    release_integrations(integration_ids)
+
+    return results
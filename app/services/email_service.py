@@ -107,6 +107,18 @@ class EmailService:
             body_html=html_body
         )
     
+    @staticmethod
+    def get_recipient(patient):
+        """
+        Email пациента для уведомлений
+        
+        Returns:
+            str или None - если email нет или уведомления отключены
+        """
+        if not patient or patient.notification_email is False:
+            return None
+        return getattr(patient, 'email', None) or None
+    
     @staticmethod
     def send_reminder(booking):
         """
@@ -115,6 +127,34 @@ class EmailService:
         Args:
             booking: Booking object
         """
+        msg = EmailService.build_reminder_message(booking)
+        if msg is None:
+            return False
+        
+        try:
+            mail.send(msg)
+            return True
+        except Exception as e:
+            print(f"Failed to send email: {str(e)}")
+            return False
+    
+    @staticmethod
+    def build_reminder_message(booking):
+        """
+        Собрать письмо-напоминание (без отправки)
+        
+        Используется для пакетной отправки через одно SMTP соединение
+        
+        Args:
+            booking: Booking object
+        
+        Returns:
+            Message или None если у пациента нет email
+        """
+        recipient = EmailService.get_recipient(booking.patient)
+        if not recipient:
+            return None
+        
         slot = booking.timeslot
         doctor = slot.calendar.doctor
         practice = doctor.practice
@@ -161,8 +201,139 @@ class EmailService:
         </html>
         """
         
+        return Message(
+            subject=subject,
+            recipients=[recipient],
+            html=html_body,
+            sender=Config.MAIL_DEFAULT_SENDER
+        )
+    
+    @staticmethod
+    def build_alert_digest_message(patient, groups):
+        """
+        Собрать дайджест новых слотов по алертам пациента (без отправки)
+        
+        Args:
+            patient: Patient object
+            groups: list of {'doctor': Doctor, 'total': int, 'starts': [datetime]}
+        
+        Returns:
+            Message или None если у пациента нет email
+        """
+        recipient = EmailService.get_recipient(patient)
+        if not recipient:
+            return None
+        
+        total = sum(group['total'] for group in groups)
+        if len(groups) == 1:
+            subject = f"🔔 {total} neue Termine bei {groups[0]['doctor'].name}"
+        else:
+            subject = f"🔔 {total} neue Termine bei {len(groups)} Ärzten"
+        
+        sections = ""
+        for group in groups:
+            doctor = group['doctor']
+            times = "".join(
+                f"<li>{start.strftime('%a, %d.%m.%Y %H:%M')} Uhr</li>"
+                for start in group['starts'][:5]
+            )
+            more = group['total'] - min(len(group['starts']), 5)
+            sections += f"""
+            <div style="background: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                <p><strong>👨‍⚕️ {doctor.name}</strong> - {doctor.display_speciality}<br>
+                {group['total']} neue Termine</p>
+                <ul>{times}</ul>
+                {f'<p>und {more} weitere</p>' if more > 0 else ''}
+            </div>
+            """
+        
+        html_body = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <h2 style="color: #2563eb;">Neue freie Termine für Sie</h2>
+            {sections}
+            <div style="margin: 30px 0;">
+                <a href="{Config.FRONTEND_URL}/patient/search" 
+                   style="background: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block;">
+                    Jetzt buchen
+                </a>
+            </div>
+            
+            <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
+            <p style="color: #9ca3af; font-size: 12px;">
+                Sie erhalten diese E-Mail, weil Sie eine Terminbenachrichtigung eingerichtet haben.<br>
+                Ihr TerminFinder Team
+            </p>
+        </body>
+        </html>
+        """
+        
+        return Message(
+            subject=subject,
+            recipients=[recipient],
+            html=html_body,
+            sender=Config.MAIL_DEFAULT_SENDER
+        )
+    
+    @staticmethod
+    def send_slot_offer(offer):
+        """
+        Предложить освободившийся слот пациенту из листа ожидания
+        
+        Args:
+            offer: SlotOffer object
+        
+        Returns:
+            bool - отправлено ли письмо (False если у пациента нет email)
+        """
+        recipient = EmailService.get_recipient(offer.patient)
+        if not recipient:
+            return False
+        
+        slot = offer.timeslot
+        doctor = slot.calendar.doctor
+        practice = doctor.practice
+        
+        subject = f"⏳ Freier Termin bei {doctor.name} - nur bis {offer.expires_at.strftime('%H:%M')} Uhr reserviert"
+        
+        html_body = f"""
+        <html>
+        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+            <h2 style="color: #2563eb;">Ein Termin ist für Sie frei geworden!</h2>
+            
+            <div style="background: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                <p><strong>📅 {slot.start_time.strftime('%A, %d.%m.%Y')}</strong><br>
+                <strong>⏰ {slot.start_time.strftime('%H:%M')} Uhr</strong></p>
+                
+                <p><strong>👨‍⚕️ {doctor.name}</strong><br>
+                {doctor.display_speciality}</p>
+                
+                <p><strong>🏥 {practice.name if practice else ''}</strong></p>
+            </div>
+            
+            <div style="background: #fef3c7; padding: 15px; border-radius: 8px; margin: 20px 0;">
+                <p>Wir halten diesen Termin bis <strong>{offer.expires_at.strftime('%H:%M')} Uhr</strong> für Sie frei.
+                Danach wird er dem nächsten Patienten angeboten.</p>
+            </div>
+            
+            <div style="margin: 30px 0;">
+                <a href="{Config.FRONTEND_URL}/patient/offers" 
+                   style="background: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; display: inline-block;">
+                    Termin jetzt buchen
+                </a>
+            </div>
+            
+            <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
+            <p style="color: #9ca3af; font-size: 12px;">
+                Mit freundlichen Grüßen,<br>
+                Ihr TerminFinder Team
+            </p>
+        </body>
+        </html>
+        """
+        
         return EmailService.send_email(
-            to=booking.patient.email,
+            to=recipient,
             subject=subject,
             body_html=html_body
         )
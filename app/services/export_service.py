@@ -0,0 +1,217 @@
+"""
+Export Service - потоковая выгрузка бронирований, пациентов и врачей (CSV / NDJSON)
+"""
+from flask import current_app
+from app import db
+from app.models import Booking, TimeSlot, Calendar, Doctor, Practice, Patient
+from datetime import datetime, date
+from decimal import Decimal
+import csv
+import io
+import json
+import uuid
+import zlib
+
+
+FORMATS = ('csv', 'ndjson')
+
+
+# ==================== ОПИСАНИЕ ВЫГРУЗОК ====================
+
+def _booking_columns():
+    return {
+        'id': Booking.id,
+        'booking_code': Booking.booking_code,
+        'status': Booking.status,
+        'patient_id': Booking.patient_id,
+        'patient_name': Patient.name,
+        'patient_phone': Patient.phone,
+        'doctor_id': Doctor.id,
+        'doctor_first_name': Doctor.first_name,
+        'doctor_last_name': Doctor.last_name,
+        'speciality': Doctor.speciality,
+        'practice_name': Practice.name,
+        'start_time': TimeSlot.start_time,
+        'end_time': TimeSlot.end_time,
+        'amount_paid': Booking.amount_paid,
+        'refund_amount': Booking.refund_amount,
+        'attended': Booking.attended,
+        'cancelled_at': Booking.cancelled_at,
+        'cancelled_by': Booking.cancelled_by,
+        'created_at': Booking.created_at,
+    }
+
+
+def _booking_query(columns):
+    return db.session.query(*columns).select_from(Booking).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).join(
+        Doctor, Calendar.doctor_id == Doctor.id
+    ).outerjoin(
+        Practice, Doctor.practice_id == Practice.id
+    ).outerjoin(
+        Patient, Booking.patient_id == Patient.id
+    )
+
+
+def _patient_columns():
+    return {
+        'id': Patient.id,
+        'name': Patient.name,
+        'phone': Patient.phone,
+        'total_bookings': Patient.total_bookings,
+        'attended_appointments': Patient.attended_appointments,
+        'no_show_count': Patient.no_show_count,
+        'late_cancellations': Patient.late_cancellations,
+        'created_at': Patient.created_at,
+        'last_login': Patient.last_login,
+    }
+
+
+def _patient_query(columns):
+    return db.session.query(*columns).select_from(Patient)
+
+
+def _doctor_columns():
+    return {
+        'id': Doctor.id,
+        'first_name': Doctor.first_name,
+        'last_name': Doctor.last_name,
+        'email': Doctor.email,
+        'speciality': Doctor.speciality,
+        'is_verified': Doctor.is_verified,
+        'practice_id': Doctor.practice_id,
+        'practice_name': Practice.name,
+        'created_at': Doctor.created_at,
+    }
+
+
+def _doctor_query(columns):
+    return db.session.query(*columns).select_from(Doctor).outerjoin(
+        Practice, Doctor.practice_id == Practice.id
+    )
+
+
+# entity -> (колонки, запрос, колонки дат для фильтра (первая - по умолчанию), колонка статуса, порядок)
+EXPORTS = {
+    'bookings': (_booking_columns, _booking_query,
+                 {'created_at': Booking.created_at, 'start_time': TimeSlot.start_time},
+                 Booking.status, Booking.created_at),
+    'patients': (_patient_columns, _patient_query,
+                 {'created_at': Patient.created_at},
+                 None, Patient.created_at),
+    'doctors': (_doctor_columns, _doctor_query,
+                {'created_at': Doctor.created_at},
+                None, Doctor.created_at),
+}
+
+
+def export_columns(entity):
+    """Доступные колонки выгрузки (в порядке по умолчанию)"""
+    return list(EXPORTS[entity][0]().keys())
+
+
+# ==================== ЗАПРОС ====================
+
+def build_export_query(entity, columns=None, date_from=None, date_to=None, date_field=None, status=None):
+    """
+    Запрос выгрузки (только нужные колонки, без ORM объектов)
+
+    Args:
+        entity: 'bookings', 'patients' или 'doctors'
+        columns: list имен колонок (None - все)
+        date_from, date_to: date, включительно
+        date_field: колонка дат для фильтра (по умолчанию первая)
+        status: фильтр по статусу (только bookings)
+
+    Returns:
+        tuple: (query, names)
+
+    Raises:
+        ValueError: неизвестная сущность, колонка или поле даты
+    """
+    if entity not in EXPORTS:
+        raise ValueError(f'Unknown export: {entity}')
+    columns_factory, query_factory, date_fields, status_column, order_column = EXPORTS[entity]
+    available = columns_factory()
+
+    names = columns or list(available.keys())
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f'Unknown columns: {", ".join(unknown)}')
+
+    date_field = date_field or next(iter(date_fields))
+    if date_field not in date_fields:
+        raise ValueError(f'Invalid date field. Use one of: {", ".join(date_fields)}')
+    date_column = date_fields[date_field]
+
+    query = query_factory([available[name].label(name) for name in names])
+    if date_from:
+        query = query.filter(date_column >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.filter(date_column <= datetime.combine(date_to, datetime.max.time()))
+    if status and status_column is not None:
+        query = query.filter(status_column == status)
+
+    return query.order_by(order_column), names
+
+
+# ==================== ПОТОК ====================
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def _csv_chunks(rows, names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for i, row in enumerate(rows, 1):
+        writer.writerow(['' if value is None else _plain(value) for value in row])
+        if i % 500 == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows, names):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps({name: _plain(value) for name, value in zip(names, row)}, ensure_ascii=False))
+        if len(lines) == 500:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = формат gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(query, names, fmt='csv', gzip=False):
+    """
+    Генератор байтов выгрузки
+
+    Строки читаются серверным курсором пачками по EXPORT_YIELD_PER,
+    поэтому память не зависит от размера выгрузки.
+    """
+    yield_per = current_app.config.get('EXPORT_YIELD_PER', 1000)
+    rows = query.yield_per(yield_per)
+    text_chunks = _ndjson_chunks(rows, names) if fmt == 'ndjson' else _csv_chunks(rows, names)
+    chunks = (chunk.encode('utf-8') for chunk in text_chunks)
+    return _gzip(chunks) if gzip else chunks
@@ -1,9 +1,12 @@
 """
 Google Calendar Service - Интеграция с Google Calendar API
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterator
 from datetime import datetime, timedelta
+from flask import current_app
 import os
+import random
+import time
 import uuid
 import requests
 
@@ -13,7 +16,7 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
 from app import db
-from app.services.calendar_integration_service import CalendarService
+from app.services.calendar_integration_service import CalendarService, ChangeFeed, SyncCursorExpired, ExternalEventGone
 from app.models.booking import Booking
 from app.models.calendar_integration import CalendarIntegration
 
@@ -25,6 +28,9 @@ class GoogleCalendarService(CalendarService):
     Использует OAuth 2.0 для авторизации и Google Calendar API v3
     """
     
+    # Google ограничивает batch 50 запросами
+    BATCH_LIMIT = 50
+    
     def __init__(self, integration: CalendarIntegration):
         super().__init__(integration)
         self.service = None
@@ -67,21 +73,9 @@ class GoogleCalendarService(CalendarService):
             print(f"Google Calendar authentication error: {e}")
             return False
     
-    def create_event(self, booking: Booking) -> str:
-        """
-        Создать событие в Google Calendar
-        
-        Args:
-            booking: Booking instance
-        
-        Returns:
-            str: ID созданного события в Google Calendar
-        """
-        if not self.service:
-            raise Exception("Not authenticated. Call authenticate() first.")
-        
-        # Подготовить данные события
-        event = {
+    def _event_changes(self, booking: Booking) -> Dict:
+        """Поля события, зависящие от бронирования (для patch)"""
+        return {
             'summary': self.format_event_title(booking),
             'description': self.format_event_description(booking),
             'start': {
@@ -93,6 +87,23 @@ class GoogleCalendarService(CalendarService):
                 'timeZone': self.integration.external_calendar_timezone,
             },
         }
+    
+    def _event_id(self, booking: Booking, replaces: Optional[str] = None) -> str:
+        """
+        Собственный id нового события: повтор вставки после сбоя получает
+        409, а не создает дубль
+        
+        Google принимает id из символов base32hex (a-v, 0-9) длиной 5-1024,
+        hex - их подмножество. Событие, пересоздаваемое вместо удаленного
+        (replaces), получает другой id: id удаленного события занят.
+        """
+        name = f'{booking.id}:{replaces}' if replaces else str(booking.id)
+        return 'tf' + uuid.uuid5(self.integration.id, name).hex
+    
+    def _event_body(self, booking: Booking, replaces: Optional[str] = None) -> Dict:
+        """Полное тело нового события"""
+        event = self._event_changes(booking)
+        event['id'] = self._event_id(booking, replaces)
         
         # Добавить цвет если настроено
         if self.integration.event_color_id:
@@ -110,16 +121,36 @@ class GoogleCalendarService(CalendarService):
         else:
             event['reminders'] = {'useDefault': False}
         
+        return event
+    
+    def create_event(self, booking: Booking) -> str:
+        """
+        Создать событие в Google Calendar
+        
+        Args:
+            booking: Booking instance
+        
+        Returns:
+            str: ID созданного события в Google Calendar
+        """
+        if not self.service:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        body = self._event_body(booking)
         try:
             # Создать событие
             created_event = self.service.events().insert(
                 calendarId='primary',
-                body=event
+                body=body
             ).execute()
             
+            self.etags[created_event['id']] = created_event.get('etag')
             return created_event['id']
             
         except HttpError as e:
+            # Событие с этим id уже создано предыдущей попыткой
+            if e.resp.status == 409:
+                return body['id']
             raise Exception(f"Failed to create Google Calendar event: {e}")
     
     def update_event(self, external_event_id: str, booking: Booking) -> bool:
@@ -132,41 +163,28 @@ class GoogleCalendarService(CalendarService):
         
         Returns:
             bool: True если обновление успешно
+        
+        Raises:
+            ExternalEventGone: события больше нет в Google Calendar (404/410)
         """
         if not self.service:
             raise Exception("Not authenticated. Call authenticate() first.")
         
         try:
-            # Получить существующее событие
-            existing_event = self.service.events().get(
-                calendarId='primary',
-                eventId=external_event_id
-            ).execute()
-            
-            # Обновить поля
-            existing_event['summary'] = self.format_event_title(booking)
-            existing_event['description'] = self.format_event_description(booking)
-            existing_event['start'] = {
-                'dateTime': booking.timeslot.start_time.isoformat(),
-                'timeZone': self.integration.external_calendar_timezone,
-            }
-            existing_event['end'] = {
-                'dateTime': booking.timeslot.end_time.isoformat(),
-                'timeZone': self.integration.external_calendar_timezone,
-            }
-            
-            # Обновить событие
-            self.service.events().update(
+            # Только изменяемые поля: patch без предварительного get
+            updated_event = self.service.events().patch(
                 calendarId='primary',
                 eventId=external_event_id,
-                body=existing_event
+                body=self._event_changes(booking)
             ).execute()
             
+            self.etags[external_event_id] = updated_event.get('etag')
             return True
             
         except HttpError as e:
-            print(f"Failed to update Google Calendar event: {e}")
-            return False
+            if e.resp.status in (404, 410):
+                raise ExternalEventGone(str(e))
+            raise Exception(f"Failed to update Google Calendar event: {e}")
     
     def delete_event(self, external_event_id: str) -> bool:
         """
@@ -190,9 +208,182 @@ class GoogleCalendarService(CalendarService):
             return True
             
         except HttpError as e:
+            # Событие уже удалено во внешнем календаре
+            if e.resp.status in (404, 410):
+                return True
             print(f"Failed to delete Google Calendar event: {e}")
             return False
     
+    def _batch_request(self, operation: Dict):
+        """HttpRequest операции write_events (не выполняется)"""
+        events = self.service.events()
+        action = operation['action']
+        if action == 'create':
+            return events.insert(
+                calendarId='primary',
+                body=self._event_body(operation['booking'], operation.get('replaces'))
+            )
+        if action == 'update':
+            return events.patch(
+                calendarId='primary',
+                eventId=operation['event_id'],
+                body=self._event_changes(operation['booking'])
+            )
+        return events.delete(calendarId='primary', eventId=operation['event_id'])
+    
+    @staticmethod
+    def _is_retryable(error: HttpError) -> bool:
+        """Временная ошибка: лимит запросов или сбой на стороне Google"""
+        status = error.resp.status
+        if status in (429, 500, 502, 503, 504):
+            return True
+        return status == 403 and b'ratelimitexceeded' in (error.content or b'').lower()
+    
+    def write_events(self, operations: List[Dict]) -> List[Dict]:
+        """
+        Пакетная запись через batch HTTP (до 50 операций в одном запросе)
+        
+        Результат разбирается по каждой операции. Операции с временной
+        ошибкой (429, rateLimitExceeded, 5xx) повторяются отдельным batch
+        с экспоненциальной паузой, до GOOGLE_BATCH_MAX_RETRIES раз;
+        остальные ошибки возвращаются сразу. Удаление уже удаленного
+        события и повторное создание события с тем же id (409) считаются
+        успешными.
+        """
+        if not self.service:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        config = current_app.config
+        max_retries = config.get('GOOGLE_BATCH_MAX_RETRIES', 3)
+        results = [None] * len(operations)
+        pending = list(range(len(operations)))
+        
+        for attempt in range(max_retries + 1):
+            retry = []
+            
+            def on_response(request_id, response, exception):
+                index = int(request_id)
+                operation = operations[index]
+                if exception is None:
+                    event_id = response['id'] if response else operation.get('event_id')
+                    etag = response.get('etag') if response else None
+                    if etag:
+                        self.etags[event_id] = etag
+                    results[index] = {'ok': True, 'event_id': event_id, 'etag': etag}
+                    return
+                
+                status = exception.resp.status if isinstance(exception, HttpError) else None
+                if operation['action'] == 'delete' and status in (404, 410):
+                    results[index] = {'ok': True, 'event_id': operation['event_id']}
+                    return
+                if operation['action'] == 'create' and status == 409:
+                    event_id = self._event_id(operation['booking'], operation.get('replaces'))
+                    results[index] = {'ok': True, 'event_id': event_id, 'etag': None}
+                    return
+                results[index] = {
+                    'ok': False,
+                    'event_id': operation.get('event_id'),
+                    'error': str(exception),
+                    'gone': status in (404, 410)
+                }
+                if isinstance(exception, HttpError) and self._is_retryable(exception):
+                    retry.append(index)
+            
+            for i in range(0, len(pending), self.BATCH_LIMIT):
+                chunk = pending[i:i + self.BATCH_LIMIT]
+                batch = self.service.new_batch_http_request(callback=on_response)
+                for index in chunk:
+                    batch.add(self._batch_request(operations[index]), request_id=str(index))
+                try:
+                    batch.execute()
+                except HttpError as e:
+                    # Отказ всего batch - все его операции повторяются
+                    for index in chunk:
+                        results[index] = {'ok': False, 'event_id': operations[index].get('event_id'), 'error': str(e)}
+                    if self._is_retryable(e):
+                        retry.extend(chunk)
+            
+            if not retry or attempt == max_retries:
+                break
+            
+            pending = sorted(retry)
+            delay = config.get('GOOGLE_BATCH_RETRY_BASE_SECONDS', 1) * (2 ** attempt)
+            print(f"Google batch: retrying {len(pending)} of {len(operations)} operations in {delay}s")
+            time.sleep(delay * random.uniform(0.8, 1.2))
+        
+        return results
+    
+    @staticmethod
+    def _standardize_event(event: Dict) -> Optional[Dict]:
+        """
+        Событие Google -> стандартизированный формат
+        
+        Returns:
+            Dict или None для целодневных событий
+        """
+        # Удаленное событие (в инкрементальной выдаче приходит только id и статус)
+        if event.get('status') == 'cancelled':
+            return {'id': event['id'], 'status': 'cancelled'}
+        
+        # Пропустить события без времени (целодневные)
+        if 'dateTime' not in event.get('start', {}):
+            return None
+        
+        return {
+            'id': event['id'],
+            'title': event.get('summary', 'Busy'),
+            'description': event.get('description', ''),
+            'start': datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00')),
+            'end': datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00')),
+            'status': event.get('status', 'confirmed'),
+            'etag': event.get('etag'),
+        }
+    
+    def _pages(self, params: Dict) -> Iterator[Dict]:
+        """
+        Страницы events.list по nextPageToken (следующая запрашивается,
+        только когда предыдущая обработана)
+        """
+        params = dict(params, maxResults=current_app.config.get('CALENDAR_EVENTS_PAGE_SIZE', 250))
+        page_token = None
+        while True:
+            response = self.service.events().list(pageToken=page_token, **params).execute()
+            yield response
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return
+    
+    def _standardize_page(self, response: Dict) -> List[Dict]:
+        events = (self._standardize_event(event) for event in response.get('items', []))
+        return [event for event in events if event]
+    
+    def iter_events(self, time_min: datetime, time_max: datetime) -> Iterator[Dict]:
+        """
+        События Google Calendar за период постранично
+        
+        Args:
+            time_min: Начало периода
+            time_max: Конец периода
+        
+        Yields:
+            Dict: событие в стандартизированном формате
+        """
+        if not self.service:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        try:
+            for response in self._pages({
+                'calendarId': 'primary',
+                'timeMin': time_min.isoformat() + 'Z',
+                'timeMax': time_max.isoformat() + 'Z',
+                'singleEvents': True,
+                'orderBy': 'startTime'
+            }):
+                yield from self._standardize_page(response)
+                
+        except HttpError as e:
+            raise Exception(f"Failed to fetch Google Calendar events: {e}")
+    
     def get_events(self, time_min: datetime, time_max: datetime) -> List[Dict]:
         """
         Получить события из Google Calendar за период
@@ -204,44 +395,50 @@ class GoogleCalendarService(CalendarService):
         Returns:
             List[Dict]: Список событий в стандартизированном формате
         """
-        if not self.service:
-            raise Exception("Not authenticated. Call authenticate() first.")
+        return list(self.iter_events(time_min, time_max))
+    
+    def _change_pages(self, cursor: Optional[str], time_min: datetime,
+                      time_max: datetime) -> Iterator[Tuple[List[Dict], Optional[str]]]:
+        params = {
+            'calendarId': 'primary',
+            'singleEvents': True
+        }
+        if cursor:
+            params['syncToken'] = cursor
+        else:
+            params['timeMin'] = time_min.isoformat() + 'Z'
+            params['timeMax'] = time_max.isoformat() + 'Z'
         
         try:
-            # Запрос событий
-            events_result = self.service.events().list(
-                calendarId='primary',
-                timeMin=time_min.isoformat() + 'Z',
-                timeMax=time_max.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime',
-                maxResults=2500  # Максимальное количество событий
-            ).execute()
-            
-            events = events_result.get('items', [])
-            
-            # Преобразовать в стандартизированный формат
-            standardized_events = []
-            for event in events:
-                # Пропустить события без времени (целодневные)
-                if 'dateTime' not in event['start']:
-                    continue
-                
-                standardized_event = {
-                    'id': event['id'],
-                    'title': event.get('summary', 'Busy'),
-                    'description': event.get('description', ''),
-                    'start': datetime.fromisoformat(event['start']['dateTime'].replace('Z', '+00:00')),
-                    'end': datetime.fromisoformat(event['end']['dateTime'].replace('Z', '+00:00')),
-                    'status': event.get('status', 'confirmed'),
-                }
+            for response in self._pages(params):
+                yield self._standardize_page(response), response.get('nextSyncToken')
                 
-                standardized_events.append(standardized_event)
-            
-            return standardized_events
-            
         except HttpError as e:
-            raise Exception(f"Failed to fetch Google Calendar events: {e}")
+            if cursor and e.resp.status == 410:
+                raise SyncCursorExpired(str(e))
+            raise Exception(f"Failed to fetch Google Calendar changes: {e}")
+    
+    def stream_changes(self, cursor: Optional[str], time_min: datetime,
+                       time_max: datetime) -> ChangeFeed:
+        """
+        Инкрементальная выборка через syncToken
+        
+        Без курсора - все события окна (без orderBy: иначе Google не выдает
+        nextSyncToken). С курсором - только изменения после него, включая
+        удаленные события. 410 Gone - токен истек. nextSyncToken приходит
+        с последней страницей.
+        """
+        if not self.service:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        return ChangeFeed(self._change_pages(cursor, time_min, time_max))
+    
+    def list_changes(self, cursor: Optional[str], time_min: datetime,
+                     time_max: datetime) -> Tuple[List[Dict], Optional[str]]:
+        """Все страницы stream_changes() сразу"""
+        feed = self.stream_changes(cursor, time_min, time_max)
+        events = list(feed)
+        return events, feed.cursor
     
     def setup_webhook(self, callback_url: str) -> bool:
         """
@@ -0,0 +1,393 @@
+"""
+Job Queue - персистентная очередь фоновых задач на PostgreSQL (SKIP LOCKED)
+"""
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models import BackgroundJob
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+import json
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+
+# ==================== ОБРАБОТЧИКИ ====================
+
+def _check_alerts_for_doctor(doctor_id, date_from, date_to, created_since=None):
+    from app.services.alert_service import check_alerts_for_doctor
+    return check_alerts_for_doctor(
+        uuid.UUID(doctor_id),
+        date.fromisoformat(date_from),
+        date.fromisoformat(date_to),
+        created_since=datetime.fromisoformat(created_since) if created_since else None
+    )
+
+
+def _offer_slot(slot_id, exclude_patient_id=None):
+    from app.services.waitlist_service import offer_slot
+    offer_slot(
+        uuid.UUID(slot_id),
+        exclude_patient_id=uuid.UUID(exclude_patient_id) if exclude_patient_id else None
+    )
+
+
+def _rebuild_recommendations(speciality=None):
+    from app.services.recommendation_service import rebuild_recommendations
+    rebuild_recommendations(speciality=speciality)
+
+
+def _sync_calendars(doctor_id, integration_ids=None, full=False):
+    from app.services.calendar_sync_executor import sync_doctor_calendars
+    sync_doctor_calendars(
+        uuid.UUID(doctor_id),
+        integration_ids=[uuid.UUID(i) for i in integration_ids] if integration_ids else None,
+        full=full,
+        progress=report_progress
+    )
+
+
+def _sync_scheduled_calendars(integration_ids):
+    from app.services.calendar_sync_executor import sync_scheduled_integrations
+    sync_scheduled_integrations([uuid.UUID(i) for i in integration_ids])
+
+
+def _push_booking(booking_id):
+    from app.services.calendar_integration_service import push_booking_to_external
+    push_booking_to_external(uuid.UUID(booking_id))
+
+
+def _backfill_calendar(integration_id):
+    from app.services.calendar_integration_service import backfill_external_events
+    backfill_external_events(uuid.UUID(integration_id))
+
+
+# job_type -> функция(**payload)
+JOB_HANDLERS = {
+    'alerts.check_doctor': _check_alerts_for_doctor,
+    'waitlist.offer_slot': _offer_slot,
+    'recommendations.rebuild': _rebuild_recommendations,
+    'calendar.sync': _sync_calendars,
+    'calendar.sync_scheduled': _sync_scheduled_calendars,
+    'calendar.push_booking': _push_booking,
+    'calendar.backfill': _backfill_calendar,
+}
+
+# Задача, выполняемая текущим потоком (для report_progress)
+_current = threading.local()
+
+
+# ==================== ПОСТАНОВКА В ОЧЕРЕДЬ ====================
+
+def enqueue_job(job_type, payload=None, run_at=None, max_attempts=None, commit=True):
+    """
+    Поставить задачу в очередь
+
+    Args:
+        job_type: ключ JOB_HANDLERS
+        payload: dict JSON-сериализуемых аргументов обработчика
+        run_at: не раньше этого времени (по умолчанию сейчас)
+        max_attempts: число попыток (по умолчанию JOB_MAX_ATTEMPTS)
+        commit: сразу сохранить (False - в транзакции вызывающего кода)
+
+    Returns:
+        BackgroundJob
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job type: {job_type}')
+
+    job = BackgroundJob(
+        job_type=job_type,
+        payload=json.dumps(payload or {}),
+        run_at=run_at or datetime.utcnow(),
+        max_attempts=max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 5)
+    )
+    db.session.add(job)
+    if commit:
+        db.session.commit()
+    return job
+
+
+# ==================== ВЫПОЛНЕНИЕ ====================
+
+def claim_jobs(worker_id, limit, now=None):
+    """
+    Захватить готовые к выполнению задачи
+
+    FOR UPDATE SKIP LOCKED + перевод в 'running' в одной транзакции:
+    каждую задачу получает ровно один воркер.
+
+    Returns:
+        list of job ids
+    """
+    now = now or datetime.utcnow()
+    jobs = BackgroundJob.query.filter(
+        BackgroundJob.status == 'queued',
+        BackgroundJob.run_at <= now
+    ).order_by(
+        BackgroundJob.run_at
+    ).limit(limit).with_for_update(skip_locked=True).all()
+
+    for job in jobs:
+        job.status = 'running'
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.attempts += 1
+
+    job_ids = [job.id for job in jobs]
+    db.session.commit()
+    return job_ids
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка с jitter: base * 2^(attempts-1), не больше JOB_RETRY_MAX_SECONDS"""
+    config = current_app.config
+    base = config.get('JOB_RETRY_BASE_SECONDS', 10)
+    cap = config.get('JOB_RETRY_MAX_SECONDS', 900)
+    delay = min(cap, base * (2 ** max(attempts - 1, 0)))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def execute_job(job_id):
+    """
+    Выполнить захваченную задачу (в app context)
+
+    Успех -> 'succeeded'; ошибка -> снова 'queued' с backoff или 'failed',
+    если попытки исчерпаны. Время ожидания и выполнения сохраняются в задаче.
+    """
+    job = BackgroundJob.query.get(job_id)
+    if not job or job.status != 'running':
+        return
+
+    handler = JOB_HANDLERS.get(job.job_type)
+    started = datetime.utcnow()
+    job.started_at = started
+    job.wait_ms = max(int((started - job.run_at).total_seconds() * 1000), 0)
+    payload = job.payload_dict
+    db.session.commit()
+
+    error = None
+    _current.job_id = job_id
+    try:
+        if handler is None:
+            raise ValueError(f'Unknown job type: {job.job_type}')
+        handler(**payload)
+    except Exception as e:
+        db.session.rollback()
+        error = f"{e}\n{traceback.format_exc(limit=5)}"
+    finally:
+        _current.job_id = None
+
+    job = BackgroundJob.query.get(job_id)
+    finished = datetime.utcnow()
+    job.finished_at = finished
+    job.duration_ms = int((finished - started).total_seconds() * 1000)
+    job.locked_by = None
+    job.locked_at = None
+
+    if error is None:
+        job.status = 'succeeded'
+        job.last_error = None
+    elif job.attempts < job.max_attempts:
+        job.status = 'queued'
+        job.run_at = finished + retry_delay(job.attempts)
+        job.last_error = error
+        print(f"Job {job.job_type} {job.id} failed (attempt {job.attempts}), retry at {job.run_at}")
+    else:
+        job.status = 'failed'
+        job.last_error = error
+        print(f"Job {job.job_type} {job.id} failed permanently after {job.attempts} attempts")
+
+    db.session.commit()
+
+
+def report_progress(progress):
+    """
+    Сохранить прогресс выполняемой задачи (виден в to_dict() при опросе)
+
+    Пишет отдельным UPDATE и коммитит текущую транзакцию обработчика;
+    заодно продлевает locked_at (heartbeat). Вне задачи - ничего не делает.
+
+    Args:
+        progress: dict JSON-сериализуемых данных
+    """
+    job_id = getattr(_current, 'job_id', None)
+    if job_id is None:
+        return
+    BackgroundJob.query.filter_by(id=job_id).update(
+        {'progress': json.dumps(progress), 'locked_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+
+
+def heartbeat_jobs(worker_id, now=None):
+    """
+    Продлить locked_at задач, которые выполняет этот воркер
+
+    Вызывается главным потоком воркера чаще JOB_LOCK_TIMEOUT_SECONDS:
+    пока процесс жив, его задачи не считаются зависшими, сколько бы
+    они ни выполнялись.
+
+    Returns:
+        int: количество задач
+    """
+    count = BackgroundJob.query.filter(
+        BackgroundJob.status == 'running',
+        BackgroundJob.locked_by == worker_id
+    ).update(
+        {'locked_at': now or datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.session.commit()
+    return count
+
+
+def requeue_stale_jobs(now=None):
+    """
+    Вернуть в очередь задачи, зависшие в 'running' (воркер упал)
+
+    Живой воркер продлевает locked_at (heartbeat_jobs), поэтому сюда
+    попадают только задачи умерших процессов. Прерванный запуск считается
+    попыткой: задачи с исчерпанными попытками (в том числе max_attempts=1)
+    не перезапускаются, а переводятся в 'failed'.
+
+    Returns:
+        int: количество задач
+    """
+    now = now or datetime.utcnow()
+    timeout = timedelta(seconds=current_app.config.get('JOB_LOCK_TIMEOUT_SECONDS', 600))
+    stale = (
+        BackgroundJob.status == 'running',
+        BackgroundJob.locked_at < now - timeout
+    )
+    failed = BackgroundJob.query.filter(
+        *stale, BackgroundJob.attempts >= BackgroundJob.max_attempts
+    ).update(
+        {'status': 'failed', 'locked_by': None, 'locked_at': None, 'finished_at': now,
+         'last_error': 'Worker lost: lock timeout'},
+        synchronize_session=False
+    )
+    count = BackgroundJob.query.filter(*stale).update(
+        {'status': 'queued', 'locked_by': None, 'locked_at': None, 'run_at': now},
+        synchronize_session=False
+    )
+    db.session.commit()
+    if failed:
+        print(f"Jobs: {failed} stale jobs failed (attempts exhausted)")
+    return count
+
+
+def job_metrics(since=None):
+    """
+    Метрики задач по типу и статусу: количество, среднее/максимальное время
+
+    Returns:
+        list of dict
+    """
+    since = since or datetime.utcnow() - timedelta(hours=24)
+    rows = db.session.query(
+        BackgroundJob.job_type,
+        BackgroundJob.status,
+        func.count(BackgroundJob.id),
+        func.avg(BackgroundJob.duration_ms),
+        func.max(BackgroundJob.duration_ms),
+        func.avg(BackgroundJob.wait_ms)
+    ).filter(
+        BackgroundJob.created_at >= since
+    ).group_by(
+        BackgroundJob.job_type, BackgroundJob.status
+    ).all()
+
+    return [{
+        'job_type': job_type,
+        'status': status,
+        'count': count,
+        'avg_duration_ms': round(float(avg_duration), 1) if avg_duration is not None else None,
+        'max_duration_ms': max_duration,
+        'avg_wait_ms': round(float(avg_wait), 1) if avg_wait is not None else None
+    } for job_type, status, count, avg_duration, max_duration, avg_wait in rows]
+
+
+class JobWorker:
+    """
+    Воркер очереди: ограниченный пул потоков + периодические задачи
+
+    Главный поток захватывает задачи только под свободные потоки пула,
+    поэтому параллельно выполняется не больше concurrency задач.
+    """
+
+    def __init__(self, app, concurrency=None, poll_interval=None, periodic=None):
+        """
+        Args:
+            app: Flask приложение
+            concurrency: размер пула (по умолчанию JOB_WORKER_CONCURRENCY)
+            poll_interval: пауза при пустой очереди, секунд
+            periodic: list of (interval_seconds, callable) - выполняются в главном потоке
+        """
+        self.app = app
+        self.concurrency = concurrency or app.config.get('JOB_WORKER_CONCURRENCY', 4)
+        self.poll_interval = poll_interval or app.config.get('JOB_POLL_INTERVAL_SECONDS', 2)
+        self.periodic = [[interval, func, 0.0] for interval, func in (periodic or [])]
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._in_flight = set()
+        self._stopping = False
+
+    def _run_in_context(self, job_id):
+        with self.app.app_context():
+            try:
+                execute_job(job_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Job {job_id} crashed: {e}")
+            finally:
+                db.session.remove()
+
+    def _run_periodic(self):
+        now = time.monotonic()
+        for entry in self.periodic:
+            interval, func, last_run = entry
+            if now - last_run < interval:
+                continue
+            entry[2] = now
+            try:
+                func()
+            except Exception as e:
+                db.session.rollback()
+                print(f"Periodic task {func.__name__} failed: {e}")
+
+    def stop(self):
+        self._stopping = True
+
+    def run_forever(self):
+        print(f"Job worker {self.worker_id} started: {self.concurrency} threads")
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='job') as pool:
+            last_recovery = 0.0
+            last_heartbeat = 0.0
+            heartbeat_interval = self.app.config.get('JOB_HEARTBEAT_SECONDS', 60)
+            while not self._stopping:
+                with self.app.app_context():
+                    if self._in_flight and time.monotonic() - last_heartbeat > heartbeat_interval:
+                        heartbeat_jobs(self.worker_id)
+                        last_heartbeat = time.monotonic()
+
+                    if time.monotonic() - last_recovery > 60:
+                        requeue_stale_jobs()
+                        last_recovery = time.monotonic()
+
+                    self._run_periodic()
+
+                    self._in_flight = {f for f in self._in_flight if not f.done()}
+                    free = self.concurrency - len(self._in_flight)
+                    job_ids = claim_jobs(self.worker_id, free) if free > 0 else []
+                    db.session.remove()
+
+                for job_id in job_ids:
+                    self._in_flight.add(pool.submit(self._run_in_context, job_id))
+
+                if not job_ids:
+                    time.sleep(self.poll_interval)
@@ -0,0 +1,251 @@
+"""
+Notification Service - outbox уведомлений по алертам и отправка дайджестов
+"""
+from flask import current_app
+from sqlalchemy import func, case
+from app import db, mail
+from app.models import NotificationOutbox, PatientAlert, Patient, Doctor, TaskRun
+from app.services.email_service import EmailService
+from collections import defaultdict
+from datetime import datetime, timedelta
+import hashlib
+import json
+
+
+TASK_NAME = 'notifications.digest'
+
+
+class SlotSeenSet:
+    """
+    Компактное множество уже отправленных алерту слотов (Bloom-фильтр)
+
+    256 байт на алерт, ~1% ложных срабатываний при CAPACITY слотах.
+    После заполнения фильтр начинается заново: старые слоты к тому
+    времени, как правило, уже прошли или заняты.
+    """
+    SIZE_BYTES = 256
+    HASHES = 4
+    CAPACITY = 200
+
+    def __init__(self, data=None, count=0):
+        if data and len(data) == self.SIZE_BYTES and count < self.CAPACITY:
+            self.bits = bytearray(data)
+            self.count = count
+        else:
+            self.bits = bytearray(self.SIZE_BYTES)
+            self.count = 0
+
+    @classmethod
+    def for_alert(cls, alert):
+        return cls(alert.seen_slots, alert.seen_slots_count or 0)
+
+    def _positions(self, slot_id):
+        digest = hashlib.blake2b(slot_id.bytes, digest_size=4 * self.HASHES).digest()
+        size_bits = self.SIZE_BYTES * 8
+        for i in range(self.HASHES):
+            yield int.from_bytes(digest[i * 4:(i + 1) * 4], 'big') % size_bits
+
+    def __contains__(self, slot_id):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(slot_id))
+
+    def add(self, slot_id):
+        for pos in self._positions(slot_id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def store(self, alert):
+        alert.seen_slots = bytes(self.bits)
+        alert.seen_slots_count = self.count
+
+
+def enqueue_alert_slots(alert, doctor_id, slots, total=None):
+    """
+    Поставить уведомление о новых слотах в outbox
+
+    Слоты, о которых алерт уже уведомлял, отбрасываются по seen-set.
+    Не делает commit - вызывающий код сохраняет все одной транзакцией.
+
+    Args:
+        alert: PatientAlert
+        doctor_id: врач слотов
+        slots: list of (slot_id, start_time) в порядке времени
+        total: всего подходящих слотов (если slots - только первые)
+
+    Returns:
+        NotificationOutbox или None если новых слотов нет
+    """
+    seen = SlotSeenSet.for_alert(alert)
+    new_slots = [(slot_id, start) for slot_id, start in slots if slot_id not in seen]
+    if not new_slots:
+        return None
+
+    for slot_id, _ in new_slots:
+        seen.add(slot_id)
+    seen.store(alert)
+
+    total = total if total is not None else len(slots)
+    item = NotificationOutbox(
+        kind='alert.slots',
+        patient_id=alert.patient_id,
+        alert_id=alert.id,
+        doctor_id=doctor_id,
+        payload=json.dumps({
+            'slots': [{'id': str(slot_id), 'start': start.isoformat()} for slot_id, start in new_slots],
+            'total': total - (len(slots) - len(new_slots))
+        })
+    )
+    db.session.add(item)
+    return item
+
+
+def _claim_digest_items(cutoff, batch_size):
+    """
+    Захватить уведомления пациентов, у которых окно объединения закрылось
+
+    Окно пациента считается от его самого старого pending уведомления,
+    поэтому все, что пришло в течение окна, уходит одним письмом.
+    """
+    due_patients = db.session.query(
+        NotificationOutbox.patient_id
+    ).filter(
+        NotificationOutbox.status == 'pending'
+    ).group_by(
+        NotificationOutbox.patient_id
+    ).having(
+        func.min(NotificationOutbox.created_at) <= cutoff
+    ).limit(batch_size).subquery()
+
+    return NotificationOutbox.query.filter(
+        NotificationOutbox.status == 'pending',
+        NotificationOutbox.patient_id.in_(db.session.query(due_patients.c.patient_id))
+    ).order_by(
+        NotificationOutbox.patient_id, NotificationOutbox.created_at
+    ).with_for_update(skip_locked=True).all()
+
+
+def _build_digest_groups(items, doctors):
+    """Сгруппировать уведомления пациента по врачу: всего слотов и ближайшие"""
+    groups = {}
+    for item in items:
+        payload = item.payload_dict
+        group = groups.setdefault(item.doctor_id, {
+            'doctor': doctors.get(item.doctor_id),
+            'total': 0,
+            'slots': {}
+        })
+        group['total'] += payload.get('total', 0)
+        for slot in payload.get('slots', []):
+            group['slots'][slot['id']] = datetime.fromisoformat(slot['start'])
+
+    result = []
+    for group in groups.values():
+        if not group['doctor']:
+            continue
+        starts = sorted(group['slots'].values())
+        result.append({
+            'doctor': group['doctor'],
+            'total': max(group['total'], len(starts)),
+            'starts': starts
+        })
+    return sorted(result, key=lambda g: g['starts'][0] if g['starts'] else datetime.max)
+
+
+def dispatch_notification_digests(batch_size=None, now=None):
+    """
+    Отправить дайджесты уведомлений из outbox
+
+    Каждая пачка: claim (SKIP LOCKED) -> одно письмо на пациента через одно
+    SMTP соединение -> массовое обновление outbox и статистики алертов ->
+    commit. Несколько процессов могут работать параллельно.
+
+    Args:
+        batch_size: пациентов за пачку (по умолчанию NOTIFICATION_BATCH_SIZE)
+        now: текущее время (по умолчанию utcnow)
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('NOTIFICATION_BATCH_SIZE', 100)
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(minutes=config.get('NOTIFICATION_DIGEST_WINDOW_MINUTES', 10))
+
+    run = TaskRun(task_name=TASK_NAME, started_at=datetime.utcnow())
+
+    while True:
+        items = _claim_digest_items(cutoff, batch_size)
+        if not items:
+            db.session.rollback()
+            break
+
+        by_patient = defaultdict(list)
+        for item in items:
+            by_patient[item.patient_id].append(item)
+
+        patients = {p.id: p for p in Patient.query.filter(Patient.id.in_(by_patient.keys())).all()}
+        doctor_ids = {item.doctor_id for item in items if item.doctor_id}
+        doctors = {d.id: d for d in Doctor.query.filter(Doctor.id.in_(doctor_ids)).all()} if doctor_ids else {}
+
+        sent_ids, skipped_ids, failed_ids = [], [], []
+        notified_alert_ids = set()
+
+        with mail.connect() as connection:
+            for patient_id, patient_items in by_patient.items():
+                item_ids = [item.id for item in patient_items]
+                groups = _build_digest_groups(patient_items, doctors)
+                msg = EmailService.build_alert_digest_message(patients.get(patient_id), groups) if groups else None
+                if msg is None:
+                    skipped_ids.extend(item_ids)
+                    continue
+                try:
+                    connection.send(msg)
+                    sent_ids.extend(item_ids)
+                    notified_alert_ids.update(item.alert_id for item in patient_items if item.alert_id)
+                except Exception as e:
+                    print(f"Failed to send alert digest to patient {patient_id}: {e}")
+                    failed_ids.extend(item_ids)
+
+        processed_at = datetime.utcnow()
+        for status, ids in (('sent', sent_ids), ('skipped', skipped_ids)):
+            if ids:
+                NotificationOutbox.query.filter(NotificationOutbox.id.in_(ids)).update(
+                    {'status': status, 'processed_at': processed_at},
+                    synchronize_session=False
+                )
+        if failed_ids:
+            # Повторим в следующем запуске; после 3 попыток - failed
+            NotificationOutbox.query.filter(NotificationOutbox.id.in_(failed_ids)).update(
+                {
+                    'attempts': NotificationOutbox.attempts + 1,
+                    'status': case((NotificationOutbox.attempts >= 2, 'failed'), else_='pending')
+                },
+                synchronize_session=False
+            )
+        if notified_alert_ids:
+            PatientAlert.query.filter(PatientAlert.id.in_(notified_alert_ids)).update(
+                {
+                    'notifications_sent': func.coalesce(PatientAlert.notifications_sent, 0) + 1,
+                    'last_notification_at': processed_at
+                },
+                synchronize_session=False
+            )
+        db.session.commit()
+
+        run.batches += 1
+        run.processed += len(items)
+        run.succeeded += len(sent_ids)
+        run.skipped += len(skipped_ids)
+        run.failed += len(failed_ids)
+
+        if len(by_patient) < batch_size or failed_ids:
+            break
+
+    run.finish({'window_cutoff': cutoff.isoformat()})
+    db.session.add(run)
+    db.session.commit()
+
+    print(
+        f"Notification digests: {run.succeeded} sent, {run.skipped} skipped, {run.failed} failed "
+        f"in {run.batches} batches ({run.duration_ms} ms)"
+    )
+    return run
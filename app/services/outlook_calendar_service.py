@@ -1,14 +1,16 @@
 """
 Outlook Calendar Service - Интеграция с Microsoft Outlook/Office 365
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, Iterator
 from datetime import datetime, timedelta
+from flask import current_app
 import os
 import requests
 import msal
 
 from app import db
-from app.services.calendar_integration_service import CalendarService
+from app.services.calendar_integration_service import CalendarService, ChangeFeed, SyncCursorExpired, ExternalEventGone
+from app.services.calendar_http import calendar_session
 from app.models.booking import Booking
 from app.models.calendar_integration import CalendarIntegration
 
@@ -75,7 +77,7 @@ class OutlookCalendarService(CalendarService):
         
         Args:
             method: HTTP метод (GET, POST, PATCH, DELETE)
-            endpoint: API endpoint (без базового URL)
+            endpoint: API endpoint (без базового URL) или полный URL (nextLink/deltaLink)
             data: JSON данные для отправки
         
         Returns:
@@ -90,19 +92,16 @@ class OutlookCalendarService(CalendarService):
             'Prefer': 'outlook.timezone="Europe/Berlin"'
         }
         
-        url = f"{self.GRAPH_API_ENDPOINT}{endpoint}"
+        url = endpoint if endpoint.startswith('https://') else f"{self.GRAPH_API_ENDPOINT}{endpoint}"
         
-        if method == 'GET':
-            response = requests.get(url, headers=headers)
-        elif method == 'POST':
-            response = requests.post(url, headers=headers, json=data)
-        elif method == 'PATCH':
-            response = requests.patch(url, headers=headers, json=data)
-        elif method == 'DELETE':
-            response = requests.delete(url, headers=headers)
-        else:
+        if method not in ('GET', 'POST', 'PATCH', 'DELETE'):
             raise ValueError(f"Unsupported HTTP method: {method}")
         
+        # Общий пул соединений с таймаутами и повтором на 429/5xx
+        response = calendar_session('outlook').request(
+            method, url, headers=headers, json=data if method in ('POST', 'PATCH') else None
+        )
+        
         response.raise_for_status()
         
         # DELETE возвращает 204 без тела
@@ -147,6 +146,7 @@ class OutlookCalendarService(CalendarService):
         
         try:
             response = self._make_request('POST', '/me/events', event_data)
+            self.etags[response['id']] = response.get('@odata.etag')
             return response['id']
             
         except requests.HTTPError as e:
@@ -162,6 +162,9 @@ class OutlookCalendarService(CalendarService):
         
         Returns:
             bool: True если обновление успешно
+        
+        Raises:
+            ExternalEventGone: события больше нет в Outlook (404/410)
         """
         if not self.access_token:
             raise Exception("Not authenticated. Call authenticate() first.")
@@ -184,12 +187,14 @@ class OutlookCalendarService(CalendarService):
         }
         
         try:
-            self._make_request('PATCH', f'/me/events/{external_event_id}', event_data)
+            response = self._make_request('PATCH', f'/me/events/{external_event_id}', event_data)
+            self.etags[external_event_id] = response.get('@odata.etag')
             return True
             
         except requests.HTTPError as e:
-            print(f"Failed to update Outlook Calendar event: {e}")
-            return False
+            if e.response is not None and e.response.status_code in (404, 410):
+                raise ExternalEventGone(str(e))
+            raise Exception(f"Failed to update Outlook Calendar event: {e}")
     
     def delete_event(self, external_event_id: str) -> bool:
         """
@@ -209,9 +214,55 @@ class OutlookCalendarService(CalendarService):
             return True
             
         except requests.HTTPError as e:
+            # Событие уже удалено во внешнем календаре
+            if e.response is not None and e.response.status_code == 404:
+                return True
             print(f"Failed to delete Outlook Calendar event: {e}")
             return False
     
+    def _pages(self, url: str) -> Iterator[Dict]:
+        """Страницы ответа Graph по @odata.nextLink (следующая - когда предыдущая обработана)"""
+        while url:
+            response = self._make_request('GET', url)
+            yield response
+            url = response.get('@odata.nextLink')
+    
+    def _standardize_page(self, response: Dict) -> List[Dict]:
+        events = (self._standardize_event(event) for event in response.get('value', []))
+        return [event for event in events if event]
+    
+    def iter_events(self, time_min: datetime, time_max: datetime) -> Iterator[Dict]:
+        """
+        События Outlook Calendar за период постранично
+        
+        Args:
+            time_min: Начало периода
+            time_max: Конец периода
+        
+        Yields:
+            Dict: событие в стандартизированном формате
+        """
+        if not self.access_token:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        # Использовать calendarView для получения событий за период
+        params = {
+            'startDateTime': time_min.isoformat(),
+            'endDateTime': time_max.isoformat(),
+            '$select': 'id,subject,body,start,end,isAllDay',
+            '$top': current_app.config.get('CALENDAR_EVENTS_PAGE_SIZE', 250)
+        }
+        
+        # Построить query string
+        query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
+        
+        try:
+            for response in self._pages(f'/me/calendarView?{query_string}'):
+                yield from self._standardize_page(response)
+                
+        except requests.HTTPError as e:
+            raise Exception(f"Failed to fetch Outlook Calendar events: {e}")
+    
     def get_events(self, time_min: datetime, time_max: datetime) -> List[Dict]:
         """
         Получить события из Outlook Calendar за период
@@ -223,55 +274,76 @@ class OutlookCalendarService(CalendarService):
         Returns:
             List[Dict]: Список событий в стандартизированном формате
         """
-        if not self.access_token:
-            raise Exception("Not authenticated. Call authenticate() first.")
+        return list(self.iter_events(time_min, time_max))
+    
+    @staticmethod
+    def _standardize_event(event: Dict) -> Optional[Dict]:
+        """
+        Событие Graph -> стандартизированный формат
         
-        try:
-            # Использовать calendarView для получения событий за период
+        Returns:
+            Dict или None для целодневных событий
+        """
+        # Удаленное событие в delta-выдаче
+        if '@removed' in event or event.get('isCancelled'):
+            return {'id': event['id'], 'status': 'cancelled'}
+        
+        # Пропустить целодневные события
+        if event.get('isAllDay', False):
+            return None
+        
+        # Microsoft Graph возвращает время в формате ISO без 'Z'
+        return {
+            'id': event['id'],
+            'title': event.get('subject', 'Busy'),
+            'description': event.get('body', {}).get('content', ''),
+            'start': datetime.fromisoformat(event['start']['dateTime']),
+            'end': datetime.fromisoformat(event['end']['dateTime']),
+            'status': 'confirmed',
+            'etag': event.get('@odata.etag'),
+        }
+    
+    def _change_pages(self, cursor: Optional[str], time_min: datetime,
+                      time_max: datetime) -> Iterator[Tuple[List[Dict], Optional[str]]]:
+        if cursor:
+            url = cursor
+        else:
             params = {
                 'startDateTime': time_min.isoformat(),
-                'endDateTime': time_max.isoformat(),
-                '$select': 'id,subject,body,start,end,isAllDay',
-                '$top': 999
+                'endDateTime': time_max.isoformat()
             }
-            
-            # Построить query string
             query_string = '&'.join([f"{k}={v}" for k, v in params.items()])
-            endpoint = f'/me/calendarView?{query_string}'
-            
-            response = self._make_request('GET', endpoint)
-            events = response.get('value', [])
-            
-            # Преобразовать в стандартизированный формат
-            standardized_events = []
-            
-            for event in events:
-                # Пропустить целодневные события
-                if event.get('isAllDay', False):
-                    continue
-                
-                start_str = event['start']['dateTime']
-                end_str = event['end']['dateTime']
-                
-                # Microsoft Graph возвращает время в формате ISO без 'Z'
-                start_dt = datetime.fromisoformat(start_str)
-                end_dt = datetime.fromisoformat(end_str)
-                
-                standardized_event = {
-                    'id': event['id'],
-                    'title': event.get('subject', 'Busy'),
-                    'description': event.get('body', {}).get('content', ''),
-                    'start': start_dt,
-                    'end': end_dt,
-                    'status': 'confirmed',
-                }
+            url = f'/me/calendarView/delta?{query_string}'
+        
+        try:
+            for response in self._pages(url):
+                yield self._standardize_page(response), response.get('@odata.deltaLink')
                 
-                standardized_events.append(standardized_event)
-            
-            return standardized_events
-            
         except requests.HTTPError as e:
-            raise Exception(f"Failed to fetch Outlook Calendar events: {e}")
+            if cursor and e.response is not None and e.response.status_code == 410:
+                raise SyncCursorExpired(str(e))
+            raise Exception(f"Failed to fetch Outlook Calendar changes: {e}")
+    
+    def stream_changes(self, cursor: Optional[str], time_min: datetime,
+                       time_max: datetime) -> ChangeFeed:
+        """
+        Инкрементальная выборка через calendarView/delta
+        
+        Без курсора - delta-запрос по окну; страницы идут по @odata.nextLink,
+        последняя содержит @odata.deltaLink (он и есть курсор). С курсором -
+        запрос по deltaLink возвращает только изменения. 410 Gone - курсор истек.
+        """
+        if not self.access_token:
+            raise Exception("Not authenticated. Call authenticate() first.")
+        
+        return ChangeFeed(self._change_pages(cursor, time_min, time_max))
+    
+    def list_changes(self, cursor: Optional[str], time_min: datetime,
+                     time_max: datetime) -> Tuple[List[Dict], Optional[str]]:
+        """Все страницы stream_changes() сразу"""
+        feed = self.stream_changes(cursor, time_min, time_max)
+        events = list(feed)
+        return events, feed.cursor
     
     def setup_webhook(self, callback_url: str) -> bool:
         """
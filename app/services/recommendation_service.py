@@ -0,0 +1,155 @@
+"""
+Recommendation Service - снимок рекомендуемых врачей по специальности и городу
+"""
+from flask import current_app
+from sqlalchemy import func, case, text, insert
+from app import db
+from app.models import DoctorRecommendation, Doctor, Practice, Calendar, TimeSlot, PatientAlert, TaskRun
+from app.constants.specialities import SPECIALITIES
+from app.services.booking_service import practice_city
+from collections import defaultdict
+from datetime import datetime
+
+
+TASK_NAME = 'recommendations.rebuild'
+
+# Один пересчет снимка за раз (иначе два процесса вставят дубли рангов)
+_REBUILD_LOCK_ID = 72040
+
+
+def _availability_rows(speciality, now):
+    """Свободные будущие слоты по верифицированным врачам: один GROUP BY"""
+    query = db.session.query(
+        Doctor.id,
+        Doctor.first_name,
+        Doctor.last_name,
+        Doctor.speciality,
+        Practice,
+        func.count(TimeSlot.id),
+        func.min(TimeSlot.start_time)
+    ).join(
+        Calendar, Calendar.doctor_id == Doctor.id
+    ).join(
+        TimeSlot, TimeSlot.calendar_id == Calendar.id
+    ).outerjoin(
+        Practice, Doctor.practice_id == Practice.id
+    ).filter(
+        Doctor.is_verified == True,
+        TimeSlot.status == 'available',
+        TimeSlot.start_time > now
+    )
+    if speciality:
+        query = query.filter(Doctor.speciality == speciality)
+    return query.group_by(Doctor.id, Practice.id).all()
+
+
+def rebuild_recommendations(speciality=None, top_n=None, now=None):
+    """
+    Пересчитать снимок рекомендаций
+
+    Врачи ранжируются по числу свободных слотов (больше - выше), затем по
+    ближайшему слоту. Для каждой специальности сохраняются top_n по всем
+    городам (city_key = '') и top_n в каждом городе.
+
+    Args:
+        speciality: пересчитать только эту специальность (None - все)
+        top_n: врачей в корзине (по умолчанию RECOMMENDATIONS_PER_BUCKET)
+        now: текущее время (по умолчанию utcnow)
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    top_n = top_n or current_app.config.get('RECOMMENDATIONS_PER_BUCKET', 10)
+    now = now or datetime.utcnow()
+    run = TaskRun(task_name=TASK_NAME, started_at=datetime.utcnow())
+
+    buckets = defaultdict(list)
+    rows = _availability_rows(speciality, now)
+    for doctor_id, first_name, last_name, doctor_speciality, practice, free_count, next_slot in rows:
+        city = practice_city(practice)
+        entry = {
+            'doctor_id': doctor_id,
+            'doctor_name': f'{first_name} {last_name}',
+            'practice_name': practice.name if practice else None,
+            'practice_city': city,
+            'free_slots_count': free_count,
+            'next_slot_at': next_slot,
+        }
+        buckets[(doctor_speciality, DoctorRecommendation.ANY_CITY)].append(entry)
+        city_key = PatientAlert.normalize_city(city)
+        if city_key:
+            buckets[(doctor_speciality, city_key)].append(entry)
+
+    values = []
+    for (bucket_speciality, city_key), entries in buckets.items():
+        entries.sort(key=lambda e: (-e['free_slots_count'], e['next_slot_at']))
+        for rank, entry in enumerate(entries[:top_n], 1):
+            values.append(dict(
+                entry, speciality=bucket_speciality, city_key=city_key, rank=rank, computed_at=now
+            ))
+
+    db.session.execute(text('SELECT pg_advisory_xact_lock(:lock_id)'), {'lock_id': _REBUILD_LOCK_ID})
+    delete_query = DoctorRecommendation.query
+    if speciality:
+        delete_query = delete_query.filter(DoctorRecommendation.speciality == speciality)
+    delete_query.delete(synchronize_session=False)
+    if values:
+        db.session.execute(insert(DoctorRecommendation), values)
+    db.session.commit()
+
+    run.batches = 1
+    run.processed = len(rows)
+    run.succeeded = len(values)
+    run.finish({'speciality': speciality, 'buckets': len(buckets)})
+    db.session.add(run)
+    db.session.commit()
+
+    print(f"Recommendations: {len(values)} rows in {len(buckets)} buckets ({run.duration_ms} ms)")
+    return run
+
+
+def get_recommendations(speciality, city=None, limit=3, exclude_doctor_ids=()):
+    """
+    Рекомендуемые врачи одним запросом к снимку
+
+    Сначала врачи из города пациента, затем добор из корзины всех городов.
+
+    Returns:
+        list of DoctorRecommendation
+    """
+    city_key = PatientAlert.normalize_city(city) or DoctorRecommendation.ANY_CITY
+    rows = DoctorRecommendation.query.filter(
+        DoctorRecommendation.speciality == speciality,
+        DoctorRecommendation.city_key.in_([city_key, DoctorRecommendation.ANY_CITY])
+    ).order_by(
+        case((DoctorRecommendation.city_key == city_key, 0), else_=1),
+        DoctorRecommendation.rank
+    ).limit(2 * limit + len(exclude_doctor_ids)).all()
+
+    seen = set(exclude_doctor_ids)
+    result = []
+    for row in rows:
+        if row.doctor_id in seen:
+            continue
+        seen.add(row.doctor_id)
+        result.append(row)
+        if len(result) == limit:
+            break
+    return result
+
+
+def serialize_recommendation(recommendation):
+    """Формат recommended_doctors в дашборде пациента"""
+    speciality = recommendation.speciality
+    return {
+        'id': str(recommendation.doctor_id),
+        'name': recommendation.doctor_name,
+        'speciality': speciality,
+        'speciality_display': SPECIALITIES.get(speciality, {}).get('de', speciality),
+        'free_slots_count': recommendation.free_slots_count,
+        'next_slot_at': recommendation.next_slot_at.isoformat() if recommendation.next_slot_at else None,
+        'practice': {
+            'name': recommendation.practice_name,
+            'city': recommendation.practice_city
+        } if recommendation.practice_name else None
+    }
@@ -0,0 +1,140 @@
+"""
+Reminder Service - пакетная отправка напоминаний о терминах
+"""
+from flask import current_app
+from app import db, mail
+from app.models import Booking, TimeSlot, TaskRun
+from app.services.booking_service import booking_load_options
+from app.services.email_service import EmailService
+from datetime import datetime, timedelta
+
+
+TASK_NAME = 'booking.reminders'
+
+
+def claim_due_reminders(now, horizon, batch_size, exclude_ids=()):
+    """
+    Захватить пачку бронирований, которым пора отправить напоминание
+
+    Один запрос: диапазон по time_slots.start_time (индекс) + join по
+    уникальному bookings.timeslot_id, фильтр reminder_sent (индекс
+    ix_bookings_reminder_due). FOR UPDATE SKIP LOCKED позволяет нескольким
+    воркерам работать параллельно без двойной отправки.
+
+    Args:
+        now: текущее время
+        horizon: верхняя граница start_time
+        batch_size: размер пачки
+        exclude_ids: не захватывать (неудачные в этом запуске)
+
+    Returns:
+        list of Booking (строки заблокированы до commit)
+    """
+    query = Booking.query.options(*booking_load_options()).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).filter(
+        Booking.reminder_sent == False,
+        Booking.status == 'confirmed',
+        TimeSlot.start_time > now,
+        TimeSlot.start_time <= horizon
+    )
+    if exclude_ids:
+        query = query.filter(~Booking.id.in_(list(exclude_ids)))
+    return query.order_by(
+        TimeSlot.start_time
+    ).limit(batch_size).with_for_update(
+        of=Booking, skip_locked=True
+    ).all()
+
+
+def dispatch_due_reminders(batch_size=None, max_batches=None, now=None):
+    """
+    Отправить все напоминания, срок которых наступил
+
+    Каждая пачка: claim (SKIP LOCKED) -> отправка через одно SMTP соединение
+    -> одно массовое UPDATE -> commit. Неудачные отправки остаются
+    reminder_sent=False и будут повторены при следующем запуске. Если SMTP
+    недоступен, запуск прерывается, но все равно записывается в task_runs.
+
+    Args:
+        batch_size: размер пачки (по умолчанию REMINDER_BATCH_SIZE)
+        max_batches: ограничение числа пачек за запуск (None - без ограничения)
+        now: текущее время (по умолчанию utcnow)
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    config = current_app.config
+    batch_size = batch_size or config.get('REMINDER_BATCH_SIZE', 100)
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(hours=config.get('REMINDER_HOURS_BEFORE', 24))
+
+    run = TaskRun(task_name=TASK_NAME, started_at=datetime.utcnow())
+    failed_ids = set()
+    error = None
+
+    while max_batches is None or run.batches < max_batches:
+        # Неудачные в этом запуске не захватываем повторно (фильтр в SQL - до LIMIT)
+        bookings = claim_due_reminders(now, horizon, batch_size, exclude_ids=failed_ids)
+        if not bookings:
+            db.session.rollback()
+            break
+
+        sent_ids = []
+        skipped_ids = []
+
+        try:
+            with mail.connect() as connection:
+                for booking in bookings:
+                    msg = EmailService.build_reminder_message(booking)
+                    if msg is None:
+                        # Нет email или уведомления отключены - больше не пытаемся
+                        skipped_ids.append(booking.id)
+                        continue
+                    try:
+                        connection.send(msg)
+                        sent_ids.append(booking.id)
+                    except Exception as e:
+                        print(f"Failed to send reminder for booking {booking.id}: {e}")
+                        failed_ids.add(booking.id)
+        except Exception as e:
+            # Ошибка соединения с SMTP: отправленное до нее фиксируем, остальное - в следующий запуск
+            print(f"Reminder SMTP connection failed: {e}")
+            error = str(e)
+            if not sent_ids and not skipped_ids:
+                db.session.rollback()
+                break
+
+        if sent_ids:
+            Booking.query.filter(Booking.id.in_(sent_ids)).update(
+                {'reminder_sent': True, 'reminder_sent_at': datetime.utcnow()},
+                synchronize_session=False
+            )
+        if skipped_ids:
+            Booking.query.filter(Booking.id.in_(skipped_ids)).update(
+                {'reminder_sent': True},
+                synchronize_session=False
+            )
+        db.session.commit()
+
+        run.batches += 1
+        run.processed += len(bookings)
+        run.succeeded += len(sent_ids)
+        run.skipped += len(skipped_ids)
+        run.failed = len(failed_ids)
+
+        if error or len(bookings) < batch_size:
+            break
+
+    details = {'batch_size': batch_size, 'horizon': horizon.isoformat()}
+    if error:
+        details['error'] = error
+    run.finish(details)
+    db.session.add(run)
+    db.session.commit()
+
+    print(
+        f"Reminders: {run.succeeded} sent, {run.skipped} skipped, {run.failed} failed "
+        f"in {run.batches} batches ({run.duration_ms} ms)"
+    )
+    return run
@@ -0,0 +1,448 @@
+"""
+Stats Service - дневная статистика (daily_stats): пометка, пересчет, backfill, чтение
+"""
+from flask import current_app
+from sqlalchemy import func, event, cast, Date, tuple_, inspect, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app import db
+from app.models import DailyStat, TimeSlot, Booking, Calendar, Doctor, TaskRun
+from datetime import datetime, date, timedelta
+import uuid
+
+
+TASK_NAME = 'stats.daily'
+
+# Какие изменения влияют на статистику
+_SLOT_FIELDS = ('status', 'start_time', 'calendar_id')
+_BOOKING_FIELDS = ('status', 'timeslot_id', 'amount_paid', 'refund_amount')
+
+# Сериализация пересчета строк практик/платформы между процессами
+_ROLLUP_LOCK_ID = 72036
+
+# Сколько пар (врач, день) помечать одним INSERT
+_MARK_CHUNK = 1000
+
+# Ключ session.info: врачи, чьи слоты/бронирования изменены в транзакции
+_CHANGED_DOCTORS_KEY = 'changed_doctor_ids'
+
+# Ключи session.info: измененное во flush'ах транзакции, помечается в before_commit
+_CHANGED_CALENDAR_DAYS_KEY = 'changed_calendar_days'
+_CHANGED_BOOKING_SLOTS_KEY = 'changed_booking_slot_ids'
+
+# callable(doctor_ids) - вызываются после commit (сброс кэшей врача)
+_doctor_change_listeners = []
+
+
+def _slot_day():
+    return cast(TimeSlot.start_time, Date)
+
+
+def _zero_counters():
+    return {name: 0 for name in DailyStat.COUNTERS}
+
+
+# ==================== ПОМЕТКА ДНЕЙ ====================
+
+def mark_days_dirty(pairs, connection=None):
+    """
+    Пометить дни врачей для пересчета (INSERT ... ON CONFLICT DO UPDATE dirty)
+
+    Не делает commit - пометка уходит в транзакции вызывающего кода.
+
+    Args:
+        pairs: iterable of (doctor_id, day)
+        connection: соединение (по умолчанию db.session)
+
+    Returns:
+        int: количество пар
+    """
+    pairs = sorted({(doctor_id, day) for doctor_id, day in pairs if doctor_id and day})
+    if connection is None:
+        db.session.info.setdefault(_CHANGED_DOCTORS_KEY, set()).update(doctor_id for doctor_id, _ in pairs)
+    executor = connection or db.session
+    for i in range(0, len(pairs), _MARK_CHUNK):
+        stmt = pg_insert(DailyStat.__table__).values([
+            dict(_zero_counters(), id=uuid.uuid4(), scope='doctor', scope_id=doctor_id, day=day, dirty=True)
+            for doctor_id, day in pairs[i:i + _MARK_CHUNK]
+        ])
+        executor.execute(stmt.on_conflict_do_update(
+            constraint='uq_daily_stats_scope_day',
+            set_={'dirty': True}
+        ))
+    return len(pairs)
+
+
+def _doctor_days(*criteria):
+    """Различные (doctor_id, день термина) слотов по условию"""
+    return db.session.query(
+        Calendar.doctor_id, _slot_day()
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).filter(*criteria).distinct().all()
+
+
+def mark_slot_days_dirty(slot_ids):
+    """Пометить дни слотов (для массовых UPDATE мимо ORM)"""
+    slot_ids = list(slot_ids)
+    if not slot_ids:
+        return 0
+    return mark_days_dirty(_doctor_days(TimeSlot.id.in_(slot_ids)))
+
+
+def mark_booking_days_dirty(booking_ids):
+    """Пометить дни терминов бронирований (для массовых UPDATE мимо ORM)"""
+    booking_ids = list(booking_ids)
+    if not booking_ids:
+        return 0
+    slot_ids = db.session.query(Booking.timeslot_id).filter(Booking.id.in_(booking_ids))
+    return mark_days_dirty(_doctor_days(TimeSlot.id.in_(slot_ids)))
+
+
+def mark_calendar_range_dirty(calendar_id, start, end=None):
+    """Пометить дни слотов календаря в диапазоне (перед массовым DELETE)"""
+    criteria = [TimeSlot.calendar_id == calendar_id, TimeSlot.start_time >= start]
+    if end is not None:
+        criteria.append(TimeSlot.start_time < end)
+    return mark_days_dirty(_doctor_days(*criteria))
+
+
+# ==================== ИНКРЕМЕНТАЛЬНОЕ ОБНОВЛЕНИЕ (ORM) ====================
+
+def _changed(obj, fields):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in fields)
+
+
+def _collect_stat_changes(session, flush_context):
+    """
+    after_flush: запомнить дни слотов и бронирований, измененных через ORM
+
+    Только накопление в session.info, без запросов: flush'ей в транзакции
+    много (autoflush на каждый слот при генерации), а помечаются дни один
+    раз в before_commit.
+    """
+    calendar_days = session.info.setdefault(_CHANGED_CALENDAR_DAYS_KEY, set())
+    booking_slot_ids = session.info.setdefault(_CHANGED_BOOKING_SLOTS_KEY, set())
+
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TimeSlot):
+            if obj in session.dirty and not _changed(obj, _SLOT_FIELDS):
+                continue
+            if obj.calendar_id and obj.start_time:
+                calendar_days.add((obj.calendar_id, obj.start_time.date()))
+            # Перенос слота: старый день тоже меняется
+            for old_start in inspect(obj).attrs.start_time.history.deleted:
+                if old_start:
+                    calendar_days.add((obj.calendar_id, old_start.date()))
+        elif isinstance(obj, Booking):
+            if obj in session.dirty and not _changed(obj, _BOOKING_FIELDS):
+                continue
+            if obj.timeslot_id:
+                booking_slot_ids.add(obj.timeslot_id)
+
+
+def _mark_stat_changes(session):
+    """
+    before_commit: пометить накопленные за транзакцию дни
+
+    Один запрос врачей/дней и один upsert daily_stats на commit; строки
+    daily_stats блокируются только на время commit.
+    """
+    # Изменения, еще не сброшенные в БД, попадут в after_flush только при flush
+    session.flush()
+    calendar_days = session.info.pop(_CHANGED_CALENDAR_DAYS_KEY, None) or set()
+    booking_slot_ids = session.info.pop(_CHANGED_BOOKING_SLOTS_KEY, None) or set()
+    if not calendar_days and not booking_slot_ids:
+        return
+
+    connection = session.connection()
+    if connection.dialect.name != 'postgresql':
+        return
+
+    pairs = set()
+    if calendar_days:
+        doctors = dict(connection.execute(
+            select(Calendar.id, Calendar.doctor_id).where(
+                Calendar.id.in_({calendar_id for calendar_id, _ in calendar_days})
+            )
+        ).all())
+        pairs.update((doctors.get(calendar_id), day) for calendar_id, day in calendar_days)
+    if booking_slot_ids:
+        pairs.update(connection.execute(
+            select(Calendar.doctor_id, _slot_day()).join(
+                Calendar, TimeSlot.calendar_id == Calendar.id
+            ).where(TimeSlot.id.in_(booking_slot_ids)).distinct()
+        ).all())
+
+    session.info.setdefault(_CHANGED_DOCTORS_KEY, set()).update(
+        doctor_id for doctor_id, _ in pairs if doctor_id
+    )
+    mark_days_dirty(pairs, connection=connection)
+
+
+def _notify_doctor_changes(session):
+    """after_commit: сообщить подписчикам, у каких врачей изменились слоты/бронирования"""
+    doctor_ids = session.info.pop(_CHANGED_DOCTORS_KEY, None)
+    if not doctor_ids:
+        return
+    for listener in _doctor_change_listeners:
+        listener(doctor_ids)
+
+
+def _drop_doctor_changes(session):
+    """after_rollback: изменения не сохранены"""
+    for key in (_CHANGED_DOCTORS_KEY, _CHANGED_CALENDAR_DAYS_KEY, _CHANGED_BOOKING_SLOTS_KEY):
+        session.info.pop(key, None)
+
+
+def on_doctor_changes(listener):
+    """
+    Подписаться на изменения слотов/бронирований (в этом процессе)
+
+    Args:
+        listener: callable(doctor_ids), вызывается после commit
+    """
+    if listener not in _doctor_change_listeners:
+        _doctor_change_listeners.append(listener)
+
+
+def register_daily_stats_events():
+    """Помечать дни при изменении TimeSlot/Booking (вызывается один раз в create_app)"""
+    if event.contains(Session, 'after_flush', _collect_stat_changes):
+        return
+    event.listen(Session, 'after_flush', _collect_stat_changes)
+    event.listen(Session, 'before_commit', _mark_stat_changes)
+    event.listen(Session, 'after_commit', _notify_doctor_changes)
+    event.listen(Session, 'after_rollback', _drop_doctor_changes)
+
+
+# ==================== ПЕРЕСЧЕТ ====================
+
+def _recompute_doctor_rows(rows):
+    """Пересчитать строки врачей двумя сгруппированными запросами"""
+    keys = {(row.scope_id, row.day): row for row in rows}
+    first_day = min(day for _, day in keys)
+    last_day = max(day for _, day in keys)
+    day = _slot_day()
+    criteria = (
+        TimeSlot.start_time >= datetime.combine(first_day, datetime.min.time()),
+        TimeSlot.start_time < datetime.combine(last_day + timedelta(days=1), datetime.min.time()),
+        tuple_(Calendar.doctor_id, day).in_(list(keys))
+    )
+
+    for row in rows:
+        for name in DailyStat.COUNTERS:
+            setattr(row, name, 0)
+
+    slot_rows = db.session.query(
+        Calendar.doctor_id, day, TimeSlot.status, func.count(TimeSlot.id)
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).filter(*criteria).group_by(Calendar.doctor_id, day, TimeSlot.status).all()
+
+    for doctor_id, slot_day, status, count in slot_rows:
+        row = keys[(doctor_id, slot_day)]
+        row.slots_total += count
+        if status in ('available', 'booked', 'blocked'):
+            setattr(row, f'slots_{status}', getattr(row, f'slots_{status}') + count)
+
+    booking_rows = db.session.query(
+        Calendar.doctor_id, day, Booking.status,
+        func.count(Booking.id),
+        func.coalesce(func.sum(Booking.amount_paid - Booking.refund_amount), 0)
+    ).join(
+        TimeSlot, Booking.timeslot_id == TimeSlot.id
+    ).join(
+        Calendar, TimeSlot.calendar_id == Calendar.id
+    ).filter(*criteria).group_by(Calendar.doctor_id, day, Booking.status).all()
+
+    for doctor_id, slot_day, status, count, revenue in booking_rows:
+        row = keys[(doctor_id, slot_day)]
+        row.bookings_total += count
+        row.revenue += revenue
+        if status in ('confirmed', 'completed', 'cancelled', 'no_show'):
+            setattr(row, f'bookings_{status}', getattr(row, f'bookings_{status}') + count)
+
+    now = datetime.utcnow()
+    for row in rows:
+        row.dirty = False
+        row.updated_at = now
+
+
+def _upsert_rollup(values):
+    if not values:
+        return
+    stmt = pg_insert(DailyStat.__table__).values(values)
+    db.session.execute(stmt.on_conflict_do_update(
+        constraint='uq_daily_stats_scope_day',
+        set_={name: getattr(stmt.excluded, name) for name in DailyStat.COUNTERS + ('dirty', 'updated_at')}
+    ))
+
+
+def _rollup_days(days):
+    """Строки практик и платформы за дни = суммы строк врачей"""
+    days = list(days)
+    sums = [func.coalesce(func.sum(getattr(DailyStat, name)), 0) for name in DailyStat.COUNTERS]
+    now = datetime.utcnow()
+
+    # Один пересчет сводных строк за раз: иначе параллельные воркеры
+    # могут перезаписать суммы, посчитанные до чужого commit
+    db.session.execute(text('SELECT pg_advisory_xact_lock(:lock_id)'), {'lock_id': _ROLLUP_LOCK_ID})
+
+    practice_rows = db.session.query(
+        Doctor.practice_id, DailyStat.day, *sums
+    ).join(
+        Doctor, DailyStat.scope_id == Doctor.id
+    ).filter(
+        DailyStat.scope == 'doctor',
+        DailyStat.day.in_(days)
+    ).group_by(Doctor.practice_id, DailyStat.day).all()
+
+    _upsert_rollup([
+        dict(zip(DailyStat.COUNTERS, values), id=uuid.uuid4(), scope='practice',
+             scope_id=practice_id, day=day, dirty=False, updated_at=now)
+        for practice_id, day, *values in practice_rows
+    ])
+
+    platform_rows = db.session.query(
+        DailyStat.day, *sums
+    ).filter(
+        DailyStat.scope == 'doctor',
+        DailyStat.day.in_(days)
+    ).group_by(DailyStat.day).all()
+
+    _upsert_rollup([
+        dict(zip(DailyStat.COUNTERS, values), id=uuid.uuid4(), scope='platform',
+             scope_id=DailyStat.PLATFORM_ID, day=day, dirty=False, updated_at=now)
+        for day, *values in platform_rows
+    ])
+
+
+def refresh_daily_stats(batch_size=None):
+    """
+    Пересчитать помеченные дни
+
+    Каждая пачка: claim строк врачей (SKIP LOCKED) -> два сгруппированных
+    запроса (слоты, бронирования) -> commit -> пересчет строк практик и
+    платформы за затронутые дни -> commit.
+
+    Args:
+        batch_size: строк врачей за пачку (по умолчанию DAILY_STATS_BATCH_SIZE)
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    batch_size = batch_size or current_app.config.get('DAILY_STATS_BATCH_SIZE', 500)
+    run = TaskRun(task_name=TASK_NAME, started_at=datetime.utcnow())
+    days_total = set()
+
+    while True:
+        rows = DailyStat.query.filter(
+            DailyStat.dirty == True,
+            DailyStat.scope == 'doctor'
+        ).order_by(
+            DailyStat.day
+        ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not rows:
+            db.session.rollback()
+            break
+
+        _recompute_doctor_rows(rows)
+        days = {row.day for row in rows}
+        db.session.commit()
+
+        _rollup_days(days)
+        db.session.commit()
+
+        days_total.update(days)
+        run.batches += 1
+        run.processed += len(rows)
+        run.succeeded += len(rows)
+
+        if len(rows) < batch_size:
+            break
+
+    run.finish({'days': len(days_total)})
+    db.session.add(run)
+    db.session.commit()
+
+    print(f"Daily stats: {run.processed} doctor-days in {run.batches} batches ({run.duration_ms} ms)")
+    return run
+
+
+def backfill_daily_stats(days_back=365, days_ahead=90, batch_size=None):
+    """
+    Заполнить daily_stats по существующим слотам
+
+    Помечает все дни врачей со слотами в диапазоне и пересчитывает их.
+
+    Returns:
+        TaskRun
+    """
+    today = date.today()
+    start = datetime.combine(today - timedelta(days=days_back), datetime.min.time())
+    end = datetime.combine(today + timedelta(days=days_ahead + 1), datetime.min.time())
+
+    marked = mark_days_dirty(_doctor_days(TimeSlot.start_time >= start, TimeSlot.start_time < end))
+    db.session.commit()
+    print(f"Daily stats backfill: {marked} doctor-days marked")
+
+    return refresh_daily_stats(batch_size=batch_size)
+
+
+# ==================== ЧТЕНИЕ ====================
+
+def daily_stat_rows(scope, scope_id, start_day, end_day):
+    """Строки за период (включительно), по дням"""
+    return DailyStat.query.filter(
+        DailyStat.scope == scope,
+        DailyStat.scope_id == scope_id,
+        DailyStat.day >= start_day,
+        DailyStat.day <= end_day
+    ).order_by(DailyStat.day).all()
+
+
+def sum_daily_stats(scope, scope_id, start_day, end_day):
+    """
+    Суммы счетчиков за период одним запросом
+
+    Returns:
+        dict: COUNTERS -> сумма
+    """
+    values = db.session.query(
+        *[func.coalesce(func.sum(getattr(DailyStat, name)), 0) for name in DailyStat.COUNTERS]
+    ).filter(
+        DailyStat.scope == scope,
+        DailyStat.scope_id == scope_id,
+        DailyStat.day >= start_day,
+        DailyStat.day <= end_day
+    ).one()
+    return dict(zip(DailyStat.COUNTERS, values))
+
+
+def daily_stats_report(scope, scope_id, start_day, end_day):
+    """
+    Итоги и ряд по дням за период (для админки)
+
+    Строки практик и платформы пишет _rollup_days, поэтому отчет по ним -
+    два запроса к daily_stats без агрегации по слотам и бронированиям.
+
+    Returns:
+        dict: totals, days
+    """
+    def plain(counters):
+        return {name: float(value) if name == 'revenue' else value for name, value in counters.items()}
+
+    return {
+        'scope': scope,
+        'scope_id': str(scope_id),
+        'date_from': start_day.isoformat(),
+        'date_to': end_day.isoformat(),
+        'totals': plain(sum_daily_stats(scope, scope_id, start_day, end_day)),
+        'days': [
+            dict(plain({name: getattr(row, name) for name in DailyStat.COUNTERS}), day=row.day.isoformat())
+            for row in daily_stat_rows(scope, scope_id, start_day, end_day)
+        ]
+    }
@@ -0,0 +1,216 @@
+"""
+Waitlist Service - автоматическое предложение освободившихся слотов
+"""
+from flask import current_app
+from sqlalchemy import case, exists
+from app import db
+from app.models import PatientAlert, TimeSlot, SlotOffer, TaskRun
+from app.services.alert_service import alert_match_filter
+from app.services.booking_service import practice_city
+from app.services.email_service import EmailService
+from app.services.job_queue import enqueue_job
+from app.services.stats_service import mark_slot_days_dirty
+from datetime import datetime, timedelta
+
+
+TASK_NAME = 'waitlist.expire_offers'
+
+# Сколько кандидатов читать из очереди за один запрос
+CANDIDATE_BATCH = 20
+
+
+def on_slot_released(slot_id, exclude_patient_id=None, commit=True):
+    """
+    Слот освободился (отмена бронирования) - предложить его в фоне
+
+    Ставит задачу 'waitlist.offer_slot' в очередь worker.py, поэтому запрос
+    на отмену не ждет поиска кандидатов и отправки письма.
+    """
+    enqueue_job('waitlist.offer_slot', {
+        'slot_id': str(slot_id),
+        'exclude_patient_id': str(exclude_patient_id) if exclude_patient_id else None
+    }, commit=commit)
+
+
+def find_waitlist_candidates(slot, doctor, exclude_patient_id=None, limit=CANDIDATE_BATCH):
+    """
+    Активные алерты, подходящие под слот, в порядке очереди
+
+    Те же бакеты, что и матчинг алертов (alert_match_filter). Сначала алерты на конкретного
+    врача, затем на специальность; внутри группы - кто дольше ждет.
+    Пациенты, которым этот слот уже предлагали, пропускаются.
+
+    Returns:
+        list of PatientAlert
+    """
+    city_key = PatientAlert.normalize_city(practice_city(doctor.practice))
+
+    query = PatientAlert.query.filter(
+        alert_match_filter(doctor, city_key, slot.start_time.date()),
+        ~exists().where(
+            SlotOffer.timeslot_id == slot.id,
+            SlotOffer.patient_id == PatientAlert.patient_id
+        )
+    )
+
+    if exclude_patient_id:
+        query = query.filter(PatientAlert.patient_id != exclude_patient_id)
+
+    return query.order_by(
+        case((PatientAlert.doctor_id == doctor.id, 0), else_=1),
+        PatientAlert.created_at.asc()
+    ).limit(limit).all()
+
+
+def offer_slot(slot_id, exclude_patient_id=None, now=None):
+    """
+    Предложить свободный слот следующему пациенту из очереди
+
+    Слот блокируется (FOR UPDATE) и переводится в статус 'held' на время
+    удержания, чтобы его не забронировал кто-то другой.
+
+    Args:
+        slot_id: ID освободившегося слота
+        exclude_patient_id: пациент, который только что отменил бронирование
+        now: текущее время (по умолчанию utcnow)
+
+    Returns:
+        SlotOffer или None если подходящих пациентов нет
+    """
+    now = now or datetime.utcnow()
+    hold = timedelta(minutes=current_app.config.get('WAITLIST_HOLD_MINUTES', 15))
+
+    slot = TimeSlot.query.filter(TimeSlot.id == slot_id).with_for_update().first()
+    # Предлагаем только если пациент успеет принять предложение до начала термина
+    if not slot or slot.status != 'available' or slot.start_time <= now + hold:
+        db.session.rollback()
+        return None
+
+    doctor = slot.calendar.doctor
+    alert = next(iter(find_waitlist_candidates(slot, doctor, exclude_patient_id)), None)
+    if not alert:
+        db.session.rollback()
+        return None
+
+    offer = SlotOffer(
+        timeslot_id=slot.id,
+        patient_id=alert.patient_id,
+        alert_id=alert.id,
+        offered_at=now,
+        expires_at=now + hold
+    )
+    slot.status = 'held'
+    alert.notifications_sent = (alert.notifications_sent or 0) + 1
+    alert.last_notification_at = now
+    alert.last_slot_notified_id = slot.id
+
+    db.session.add(offer)
+    db.session.commit()
+
+    EmailService.send_slot_offer(offer)
+    print(f"Waitlist: slot {slot.id} offered to patient {offer.patient_id} until {offer.expires_at}")
+    return offer
+
+
+def accept_offer(slot, patient, now=None):
+    """
+    Принять предложение при бронировании слота в статусе 'held'
+
+    Не делает commit - вызывающий код сохраняет бронирование в той же транзакции.
+
+    Returns:
+        bool: есть ли у пациента действующее предложение на этот слот
+    """
+    now = now or datetime.utcnow()
+    offer = SlotOffer.query.filter_by(
+        timeslot_id=slot.id,
+        patient_id=patient.id,
+        status='pending'
+    ).with_for_update().first()
+
+    if not offer or not offer.is_open(now):
+        return False
+
+    offer.status = 'accepted'
+    offer.responded_at = now
+    return True
+
+
+def decline_offer(offer, now=None):
+    """
+    Пациент отказался - освободить слот и сразу предложить следующему
+    """
+    now = now or datetime.utcnow()
+    offer.status = 'declined'
+    offer.responded_at = now
+    if offer.timeslot and offer.timeslot.status == 'held':
+        offer.timeslot.status = 'available'
+    on_slot_released(offer.timeslot_id, commit=False)
+    db.session.commit()
+
+
+def expire_offers(batch_size=None, now=None):
+    """
+    Истекшие предложения: вернуть слот и передать следующему в очереди
+
+    Запускается периодически (flask process-waitlist). Предложения
+    захватываются через FOR UPDATE SKIP LOCKED, поэтому несколько
+    процессов не обработают одно предложение дважды.
+
+    Returns:
+        TaskRun: запись с метриками запуска
+    """
+    batch_size = batch_size or current_app.config.get('WAITLIST_BATCH_SIZE', 100)
+    now = now or datetime.utcnow()
+
+    run = TaskRun(task_name=TASK_NAME, started_at=datetime.utcnow())
+    released_slot_ids = []
+
+    while True:
+        offers = SlotOffer.query.filter(
+            SlotOffer.status == 'pending',
+            SlotOffer.expires_at <= now
+        ).order_by(
+            SlotOffer.expires_at
+        ).limit(batch_size).with_for_update(skip_locked=True).all()
+
+        if not offers:
+            db.session.rollback()
+            break
+
+        slot_ids = [offer.timeslot_id for offer in offers]
+        for offer in offers:
+            offer.status = 'expired'
+
+        TimeSlot.query.filter(
+            TimeSlot.id.in_(slot_ids),
+            TimeSlot.status == 'held'
+        ).update({'status': 'available'}, synchronize_session=False)
+        mark_slot_days_dirty(slot_ids)
+        db.session.commit()
+
+        released_slot_ids.extend(slot_ids)
+        run.batches += 1
+        run.processed += len(offers)
+
+        if len(offers) < batch_size:
+            break
+
+    # Каскад: каждый освобожденный слот предлагаем следующему пациенту
+    for slot_id in released_slot_ids:
+        try:
+            if offer_slot(slot_id, now=now):
+                run.succeeded += 1
+            else:
+                run.skipped += 1
+        except Exception as e:
+            db.session.rollback()
+            run.failed += 1
+            print(f"Waitlist: failed to re-offer slot {slot_id}: {e}")
+
+    run.finish({'expired': run.processed, 're_offered': run.succeeded})
+    db.session.add(run)
+    db.session.commit()
+
+    print(f"Waitlist: {run.processed} offers expired, {run.succeeded} re-offered ({run.duration_ms} ms)")
+    return run
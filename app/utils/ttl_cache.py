@@ -0,0 +1,91 @@
+"""
+TTL cache - кэш в памяти процесса с устареванием и stale-while-revalidate
+"""
+from flask import current_app
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Потокобезопасный кэш значений по ключу
+
+    Значение моложе ttl отдается из кэша. В окне stale_ttl после этого
+    отдается старое значение, а пересчет идет в фоновом потоке (не больше
+    одного на ключ). Еще старше - пересчет синхронно в запросе.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (value, stored_at)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            if len(self._entries) > self.max_entries:
+                oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                self._entries.pop(oldest, None)
+
+    def _refresh_async(self, key, loader):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        app = current_app._get_current_object()
+
+        def refresh():
+            from app import db
+            with app.app_context():
+                try:
+                    self._store(key, loader())
+                except Exception as e:
+                    print(f"Cache refresh for {key} failed: {e}")
+                finally:
+                    db.session.remove()
+                    with self._lock:
+                        self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f'cache-refresh-{key}', daemon=True).start()
+
+    def get(self, key, loader, ttl, stale_ttl=0):
+        """
+        Значение из кэша или loader()
+
+        Args:
+            key: ключ
+            loader: функция без аргументов (вызывается в app context)
+            ttl: секунд свежести
+            stale_ttl: секунд, в течение которых после ttl отдается старое значение
+
+        Returns:
+            tuple: (value, age_seconds)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                return value, age
+            if age < ttl + stale_ttl:
+                self._refresh_async(key, loader)
+                return value, age
+
+        value = loader()
+        self._store(key, value)
+        return value, 0.0
+
+    def invalidate(self, key=None):
+        """Сбросить ключ (или весь кэш)"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -62,6 +62,57 @@ class Config:
     # Business Rules
     CANCELLATION_WINDOW_HOURS = 1  # Минимум за сколько часов можно отменить
     REMINDER_HOURS_BEFORE = 24  # За сколько часов напоминание
+    REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', 100))  # Напоминаний за одну пачку
+    SWEEPER_BATCH_SIZE = int(os.getenv('SWEEPER_BATCH_SIZE', 500))  # Бронирований за одну пачку sweeper'а
+    SWEEPER_GRACE_HOURS = int(os.getenv('SWEEPER_GRACE_HOURS', 12))  # Часов после термина на отметку врача
+    WAITLIST_HOLD_MINUTES = int(os.getenv('WAITLIST_HOLD_MINUTES', 15))  # Сколько слот держится за пациентом из листа ожидания
+    WAITLIST_BATCH_SIZE = int(os.getenv('WAITLIST_BATCH_SIZE', 100))  # Истекших предложений за одну пачку
+    ALERT_INDEX_IN_MEMORY = os.getenv('ALERT_INDEX_IN_MEMORY', 'False').lower() == 'true'  # Матчинг алертов через in-memory индекс
+    ALERT_INDEX_REFRESH_SECONDS = int(os.getenv('ALERT_INDEX_REFRESH_SECONDS', 300))  # Полная перестройка индекса (изменения других процессов)
+    NOTIFICATION_DIGEST_WINDOW_MINUTES = int(os.getenv('NOTIFICATION_DIGEST_WINDOW_MINUTES', 10))  # Окно объединения уведомлений пациента
+    NOTIFICATION_BATCH_SIZE = int(os.getenv('NOTIFICATION_BATCH_SIZE', 100))  # Пациентов за одну пачку дайджестов
+    NOTIFICATION_SLOTS_PER_ALERT = 10  # Сколько ближайших слотов показывать в уведомлении
+    DAILY_STATS_BATCH_SIZE = int(os.getenv('DAILY_STATS_BATCH_SIZE', 500))  # Дней врачей за одну пачку пересчета
+    ANALYTICS_FROM_DAILY_STATS = os.getenv('ANALYTICS_FROM_DAILY_STATS', 'False').lower() == 'true'  # Аналитика врача из daily_stats (после backfill-daily-stats)
+    ADMIN_STATS_CACHE_SECONDS = int(os.getenv('ADMIN_STATS_CACHE_SECONDS', 30))  # Сколько секунд статистика дашборда админа считается свежей
+    ADMIN_STATS_STALE_SECONDS = int(os.getenv('ADMIN_STATS_STALE_SECONDS', 300))  # Сколько еще отдавать старую, пересчитывая в фоне (0 - выкл.)
+    RECOMMENDATIONS_PER_BUCKET = int(os.getenv('RECOMMENDATIONS_PER_BUCKET', 10))  # Врачей в снимке рекомендаций на специальность/город
+    DOCTOR_DASHBOARD_CACHE_SECONDS = int(os.getenv('DOCTOR_DASHBOARD_CACHE_SECONDS', 30))  # Кэш дашборда врача (сбрасывается при изменениях)
+    EXPORT_YIELD_PER = int(os.getenv('EXPORT_YIELD_PER', 1000))  # Строк на одну выборку серверного курсора при выгрузке
+    CALENDAR_SYNC_WINDOW_DAYS = int(os.getenv('CALENDAR_SYNC_WINDOW_DAYS', 90))  # На сколько дней вперед синхронизируются внешние календари
+    CALENDAR_FULL_RESYNC_HOURS = int(os.getenv('CALENDAR_FULL_RESYNC_HOURS', 24))  # Полная синхронизация окна раз в N часов (0 - только по истечении курсора)
+    CALENDAR_EVENTS_PAGE_SIZE = int(os.getenv('CALENDAR_EVENTS_PAGE_SIZE', 250))  # Событий на страницу при выборке у провайдера (Google/Outlook)
+    CALENDAR_SYNC_CHUNK_SIZE = int(os.getenv('CALENDAR_SYNC_CHUNK_SIZE', 200))  # Событий на один запрос пересекающихся слотов
+    CALENDAR_SYNC_MAX_WORKERS = int(os.getenv('CALENDAR_SYNC_MAX_WORKERS', 8))  # Потоков сетевой части синхронизации календарей
+    CALENDAR_SYNC_BATCH_SIZE = int(os.getenv('CALENDAR_SYNC_BATCH_SIZE', 20))  # Интеграций в одной задаче плановой синхронизации
+    CALENDAR_SYNC_MIN_INTERVAL_SECONDS = int(os.getenv('CALENDAR_SYNC_MIN_INTERVAL_SECONDS', 300))  # Самый частый интервал плановой синхронизации
+    CALENDAR_SYNC_MAX_INTERVAL_SECONDS = int(os.getenv('CALENDAR_SYNC_MAX_INTERVAL_SECONDS', 3600))  # Самый редкий (и при живом webhook)
+    CALENDAR_SYNC_BACKOFF_MAX_SECONDS = int(os.getenv('CALENDAR_SYNC_BACKOFF_MAX_SECONDS', 21600))  # Максимальная пауза после ошибок
+    CALENDAR_SYNC_LEASE_SECONDS = int(os.getenv('CALENDAR_SYNC_LEASE_SECONDS', 900))  # Аренда захваченной интеграции (если воркер упал)
+    CALENDAR_WEBHOOK_DEBOUNCE_SECONDS = int(os.getenv('CALENDAR_WEBHOOK_DEBOUNCE_SECONDS', 30))  # Окно, в котором webhook-уведомления схлопываются в одну синхронизацию
+    CALENDAR_HTTP_CONNECT_TIMEOUT = int(os.getenv('CALENDAR_HTTP_CONNECT_TIMEOUT', 5))  # Таймаут соединения с Graph/CalDAV, секунд
+    CALENDAR_HTTP_READ_TIMEOUT = int(os.getenv('CALENDAR_HTTP_READ_TIMEOUT', 30))  # Таймаут ответа Graph/CalDAV, секунд
+    CALENDAR_HTTP_MAX_RETRIES = int(os.getenv('CALENDAR_HTTP_MAX_RETRIES', 4))  # Повторов на 429/5xx и сетевых ошибках
+    CALENDAR_HTTP_BACKOFF_BASE_SECONDS = 1  # Первая пауза повтора (дальше x2, если нет Retry-After)
+    CALENDAR_HTTP_BACKOFF_MAX_SECONDS = 60  # Максимальная пауза (больший Retry-After - ошибка сразу)
+    CALENDAR_HTTP_POOL_SIZE = int(os.getenv('CALENDAR_HTTP_POOL_SIZE', 20))  # Keep-alive соединений на хост провайдера
+    GOOGLE_BATCH_MAX_RETRIES = int(os.getenv('GOOGLE_BATCH_MAX_RETRIES', 3))  # Повторов операций batch с временной ошибкой
+    GOOGLE_BATCH_RETRY_BASE_SECONDS = 1  # Первая пауза перед повтором (дальше x2)
+    CALENDAR_PROVIDER_LIMITS = {  # Провайдер -> (одновременных синхронизаций, новых в секунду) на процесс
+        'google': (4, 5),
+        'outlook': (4, 4),
+        'apple': (2, 2),
+        'caldav': (2, 2),
+    }
+    
+    # Background Jobs (worker.py)
+    JOB_WORKER_CONCURRENCY = int(os.getenv('JOB_WORKER_CONCURRENCY', 4))  # Потоков в пуле воркера
+    JOB_POLL_INTERVAL_SECONDS = 2  # Пауза при пустой очереди
+    JOB_MAX_ATTEMPTS = 5  # Попыток до статуса failed
+    JOB_RETRY_BASE_SECONDS = 10  # Первая задержка повтора (дальше x2)
+    JOB_RETRY_MAX_SECONDS = 900  # Максимальная задержка повтора
+    JOB_LOCK_TIMEOUT_SECONDS = 600  # Через сколько без heartbeat 'running' задача считается зависшей
+    JOB_HEARTBEAT_SECONDS = 60  # Как часто воркер продлевает locked_at своих задач
     
     # Rate Limiting
     MAX_ACTIVE_BOOKINGS_PER_PATIENT = 3
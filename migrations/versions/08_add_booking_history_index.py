@@ -0,0 +1,40 @@
+"""add composite index for patient booking history
+
+Revision ID: 08_add_booking_history_index
+Revises: 1eb8c2797e5b
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '08_add_booking_history_index'
+down_revision = '1eb8c2797e5b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Индекс (patient_id, status, created_at) для keyset-пагинации истории бронирований"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_index(
+        'ix_bookings_patient_status_created',
+        'bookings',
+        ['patient_id', 'status', 'created_at'],
+        schema=schema
+    )
+    
+    print(f"✅ Added ix_bookings_patient_status_created to {schema}.bookings")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_bookings_patient_status_created', table_name='bookings', schema=schema)
+    
+    print(f"✅ Removed ix_bookings_patient_status_created from {schema}.bookings")
@@ -0,0 +1,60 @@
+"""add reminder index and task_runs table
+
+Revision ID: 09_add_reminders_and_task_runs
+Revises: 08_add_booking_history_index
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '09_add_reminders_and_task_runs'
+down_revision = '08_add_booking_history_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Индекс для поиска неотправленных напоминаний и журнал запусков задач"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_index(
+        'ix_bookings_reminder_due',
+        'bookings',
+        ['reminder_sent', 'status', 'timeslot_id'],
+        schema=schema
+    )
+    
+    op.create_table(
+        'task_runs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('task_name', sa.String(50), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('duration_ms', sa.Integer(), nullable=True),
+        sa.Column('processed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('succeeded', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('failed', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('skipped', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('batches', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('details', sa.Text(), nullable=True),
+        schema=schema
+    )
+    op.create_index('ix_task_runs_task_started', 'task_runs', ['task_name', 'started_at'], schema=schema)
+    
+    print(f"✅ Added ix_bookings_reminder_due and {schema}.task_runs")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_task_runs_task_started', table_name='task_runs', schema=schema)
+    op.drop_table('task_runs', schema=schema)
+    op.drop_index('ix_bookings_reminder_due', table_name='bookings', schema=schema)
+    
+    print(f"✅ Removed task_runs and ix_bookings_reminder_due from {schema}")
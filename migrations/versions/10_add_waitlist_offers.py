@@ -0,0 +1,84 @@
+"""add waitlist slot offers and partial unique booking index
+
+Revision ID: 10_add_waitlist_offers
+Revises: 09_add_reminders_and_task_runs
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '10_add_waitlist_offers'
+down_revision = '09_add_reminders_and_task_runs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Таблица предложений листа ожидания, индексы очереди и перебронирование отмененных слотов"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+
+    op.create_table(
+        'slot_offers',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('timeslot_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.time_slots.id'), nullable=False),
+        sa.Column('patient_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.patients.id'), nullable=False),
+        sa.Column('alert_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.patient_alerts.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('offered_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.Column('responded_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('timeslot_id', 'patient_id', name='uq_slot_offers_slot_patient'),
+        schema=schema
+    )
+    op.create_index('ix_slot_offers_timeslot_id', 'slot_offers', ['timeslot_id'], schema=schema)
+    op.create_index('ix_slot_offers_patient_id', 'slot_offers', ['patient_id'], schema=schema)
+    op.create_index('ix_slot_offers_status_expires', 'slot_offers', ['status', 'expires_at'], schema=schema)
+
+    op.create_index(
+        'ix_patient_alerts_waitlist_doctor',
+        'patient_alerts',
+        ['doctor_id', 'is_active', 'created_at'],
+        schema=schema
+    )
+    op.create_index(
+        'ix_patient_alerts_waitlist_speciality',
+        'patient_alerts',
+        ['speciality', 'is_active', 'created_at'],
+        schema=schema
+    )
+
+    # Уникальность timeslot_id только среди не отмененных бронирований
+    # (имя индекса отличается в разных ветках истории миграций)
+    op.execute(f'DROP INDEX IF EXISTS {schema}.ix_terminfinder_bookings_timeslot_id')
+    op.execute(f'DROP INDEX IF EXISTS {schema}.ix_bookings_timeslot_id')
+    op.execute(f'CREATE INDEX ix_bookings_timeslot_id ON {schema}.bookings (timeslot_id)')
+    op.execute(
+        f"CREATE UNIQUE INDEX uq_bookings_active_timeslot ON {schema}.bookings (timeslot_id) "
+        f"WHERE status <> 'cancelled'"
+    )
+
+    print(f"✅ Added {schema}.slot_offers, waitlist indexes and uq_bookings_active_timeslot")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+
+    op.execute(f'DROP INDEX IF EXISTS {schema}.uq_bookings_active_timeslot')
+    op.execute(f'DROP INDEX IF EXISTS {schema}.ix_bookings_timeslot_id')
+    op.execute(f'CREATE UNIQUE INDEX ix_bookings_timeslot_id ON {schema}.bookings (timeslot_id)')
+
+    op.drop_index('ix_patient_alerts_waitlist_speciality', table_name='patient_alerts', schema=schema)
+    op.drop_index('ix_patient_alerts_waitlist_doctor', table_name='patient_alerts', schema=schema)
+
+    op.drop_index('ix_slot_offers_status_expires', table_name='slot_offers', schema=schema)
+    op.drop_index('ix_slot_offers_patient_id', table_name='slot_offers', schema=schema)
+    op.drop_index('ix_slot_offers_timeslot_id', table_name='slot_offers', schema=schema)
+    op.drop_table('slot_offers', schema=schema)
+
+    print(f"✅ Removed slot_offers and waitlist indexes from {schema}")
@@ -0,0 +1,50 @@
+"""add normalized city key for alert matching
+
+Revision ID: 11_add_alert_city_key
+Revises: 10_add_waitlist_offers
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '11_add_alert_city_key'
+down_revision = '10_add_waitlist_offers'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Нормализованный город алерта и индекс бакета (специальность, город)"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.add_column('patient_alerts', sa.Column('city_key', sa.String(100), nullable=True), schema=schema)
+    
+    # Заполняем существующие алерты так же, как PatientAlert.normalize_city
+    op.execute(
+        f"UPDATE {schema}.patient_alerts "
+        f"SET city_key = NULLIF(lower(regexp_replace(trim(city), '\\s+', ' ', 'g')), '') "
+        f"WHERE city IS NOT NULL"
+    )
+    
+    op.create_index(
+        'ix_patient_alerts_speciality_city',
+        'patient_alerts',
+        ['speciality', 'city_key', 'is_active'],
+        schema=schema
+    )
+    
+    print(f"✅ Added city_key and ix_patient_alerts_speciality_city to {schema}.patient_alerts")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_patient_alerts_speciality_city', table_name='patient_alerts', schema=schema)
+    op.drop_column('patient_alerts', 'city_key', schema=schema)
+    
+    print(f"✅ Removed city_key from {schema}.patient_alerts")
@@ -0,0 +1,61 @@
+"""add notification outbox and alert seen-set
+
+Revision ID: 12_add_notification_outbox
+Revises: 11_add_alert_city_key
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '12_add_notification_outbox'
+down_revision = '11_add_alert_city_key'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Outbox уведомлений и компактный seen-set отправленных слотов алерта"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('kind', sa.String(50), nullable=False, server_default='alert.slots'),
+        sa.Column('patient_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.patients.id'), nullable=False),
+        sa.Column('alert_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.patient_alerts.id', ondelete='SET NULL'), nullable=True),
+        sa.Column('doctor_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.doctors.id'), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='pending'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        schema=schema
+    )
+    op.create_index(
+        'ix_notification_outbox_status_patient',
+        'notification_outbox',
+        ['status', 'patient_id', 'created_at'],
+        schema=schema
+    )
+    
+    op.add_column('patient_alerts', sa.Column('seen_slots', sa.LargeBinary(), nullable=True), schema=schema)
+    op.add_column('patient_alerts', sa.Column('seen_slots_count', sa.Integer(), nullable=False, server_default='0'), schema=schema)
+    
+    print(f"✅ Added {schema}.notification_outbox and patient_alerts seen-set columns")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_column('patient_alerts', 'seen_slots_count', schema=schema)
+    op.drop_column('patient_alerts', 'seen_slots', schema=schema)
+    op.drop_index('ix_notification_outbox_status_patient', table_name='notification_outbox', schema=schema)
+    op.drop_table('notification_outbox', schema=schema)
+    
+    print(f"✅ Removed notification_outbox and seen-set columns from {schema}")
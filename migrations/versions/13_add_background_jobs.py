@@ -0,0 +1,58 @@
+"""add background_jobs table
+
+Revision ID: 13_add_background_jobs
+Revises: 12_add_notification_outbox
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '13_add_background_jobs'
+down_revision = '12_add_notification_outbox'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Персистентная очередь фоновых задач (вместо Redis/RQ)"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_table(
+        'background_jobs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('job_type', sa.String(50), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='queued'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='5'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('run_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(100), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('wait_ms', sa.Integer(), nullable=True),
+        sa.Column('duration_ms', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        schema=schema
+    )
+    op.create_index('ix_background_jobs_status_run_at', 'background_jobs', ['status', 'run_at'], schema=schema)
+    op.create_index('ix_background_jobs_type_created', 'background_jobs', ['job_type', 'created_at'], schema=schema)
+    
+    print(f"✅ Added {schema}.background_jobs")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_background_jobs_type_created', table_name='background_jobs', schema=schema)
+    op.drop_index('ix_background_jobs_status_run_at', table_name='background_jobs', schema=schema)
+    op.drop_table('background_jobs', schema=schema)
+    
+    print(f"✅ Removed {schema}.background_jobs")
@@ -0,0 +1,57 @@
+"""add daily_stats table
+
+Revision ID: 14_add_daily_stats
+Revises: 13_add_background_jobs
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '14_add_daily_stats'
+down_revision = '13_add_background_jobs'
+branch_labels = None
+depends_on = None
+
+
+COUNTERS = (
+    'slots_total', 'slots_available', 'slots_booked', 'slots_blocked',
+    'bookings_total', 'bookings_confirmed', 'bookings_completed',
+    'bookings_cancelled', 'bookings_no_show',
+)
+
+
+def upgrade():
+    """Дневная статистика врача/практики/платформы (заполняется flask backfill-daily-stats)"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_table(
+        'daily_stats',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('scope', sa.String(20), nullable=False),
+        sa.Column('scope_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        *[sa.Column(name, sa.Integer(), nullable=False, server_default='0') for name in COUNTERS],
+        sa.Column('revenue', sa.Numeric(10, 2), nullable=False, server_default='0'),
+        sa.Column('dirty', sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('scope', 'scope_id', 'day', name='uq_daily_stats_scope_day'),
+        schema=schema
+    )
+    op.create_index('ix_daily_stats_dirty', 'daily_stats', ['dirty', 'scope'], schema=schema)
+    
+    print(f"✅ Added {schema}.daily_stats")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_daily_stats_dirty', table_name='daily_stats', schema=schema)
+    op.drop_table('daily_stats', schema=schema)
+    
+    print(f"✅ Removed {schema}.daily_stats")
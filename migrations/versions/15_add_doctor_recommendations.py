@@ -0,0 +1,53 @@
+"""add doctor_recommendations table
+
+Revision ID: 15_add_doctor_recommendations
+Revises: 14_add_daily_stats
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '15_add_doctor_recommendations'
+down_revision = '14_add_daily_stats'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Снимок рекомендуемых врачей (заполняется flask rebuild-recommendations / worker)"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_table(
+        'doctor_recommendations',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('speciality', sa.String(50), nullable=False),
+        sa.Column('city_key', sa.String(100), nullable=False, server_default=''),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('doctor_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.doctors.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('doctor_name', sa.String(200), nullable=False),
+        sa.Column('practice_name', sa.String(200), nullable=True),
+        sa.Column('practice_city', sa.String(100), nullable=True),
+        sa.Column('free_slots_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_slot_at', sa.DateTime(), nullable=True),
+        sa.Column('computed_at', sa.DateTime(), nullable=False),
+        schema=schema
+    )
+    op.create_index('ix_doctor_recommendations_bucket', 'doctor_recommendations',
+                    ['speciality', 'city_key', 'rank'], schema=schema)
+    
+    print(f"✅ Added {schema}.doctor_recommendations")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_doctor_recommendations_bucket', table_name='doctor_recommendations', schema=schema)
+    op.drop_table('doctor_recommendations', schema=schema)
+    
+    print(f"✅ Removed {schema}.doctor_recommendations")
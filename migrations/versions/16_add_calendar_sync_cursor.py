@@ -0,0 +1,39 @@
+"""add incremental sync cursor to calendar_integrations
+
+Revision ID: 16_add_calendar_sync_cursor
+Revises: 15_add_doctor_recommendations
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '16_add_calendar_sync_cursor'
+down_revision = '15_add_doctor_recommendations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Курсор инкрементальной синхронизации (первая синхронизация после миграции - полная)"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.add_column('calendar_integrations', sa.Column('sync_cursor', sa.Text(), nullable=True), schema=schema)
+    op.add_column('calendar_integrations', sa.Column('sync_ctag', sa.String(200), nullable=True), schema=schema)
+    op.add_column('calendar_integrations', sa.Column('last_full_sync_at', sa.DateTime(), nullable=True), schema=schema)
+    
+    print(f"✅ Added sync cursor columns to {schema}.calendar_integrations")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_column('calendar_integrations', 'last_full_sync_at', schema=schema)
+    op.drop_column('calendar_integrations', 'sync_ctag', schema=schema)
+    op.drop_column('calendar_integrations', 'sync_cursor', schema=schema)
+    
+    print(f"✅ Removed sync cursor columns from {schema}.calendar_integrations")
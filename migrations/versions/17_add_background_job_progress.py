@@ -0,0 +1,35 @@
+"""add progress to background_jobs
+
+Revision ID: 17_add_background_job_progress
+Revises: 16_add_calendar_sync_cursor
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '17_add_background_job_progress'
+down_revision = '16_add_calendar_sync_cursor'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Прогресс длинных задач (например calendar.sync), опрашивается через API"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.add_column('background_jobs', sa.Column('progress', sa.Text(), nullable=True), schema=schema)
+    
+    print(f"✅ Added progress to {schema}.background_jobs")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_column('background_jobs', 'progress', schema=schema)
+    
+    print(f"✅ Removed progress from {schema}.background_jobs")
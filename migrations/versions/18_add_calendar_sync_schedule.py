@@ -0,0 +1,38 @@
+"""add scheduled sync interval to calendar_integrations
+
+Revision ID: 18_add_calendar_sync_schedule
+Revises: 17_add_background_job_progress
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '18_add_calendar_sync_schedule'
+down_revision = '17_add_background_job_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Адаптивный интервал и индекс для выборки интеграций, которым пора синхронизироваться"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.add_column('calendar_integrations', sa.Column('sync_interval_seconds', sa.Integer(), nullable=True), schema=schema)
+    op.create_index('ix_calendar_integrations_next_sync_at', 'calendar_integrations',
+                    ['next_sync_at'], schema=schema)
+    
+    print(f"✅ Added sync schedule to {schema}.calendar_integrations")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_calendar_integrations_next_sync_at', table_name='calendar_integrations', schema=schema)
+    op.drop_column('calendar_integrations', 'sync_interval_seconds', schema=schema)
+    
+    print(f"✅ Removed sync schedule from {schema}.calendar_integrations")
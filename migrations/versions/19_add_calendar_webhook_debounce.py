@@ -0,0 +1,37 @@
+"""add webhook sync marker and worker lease to calendar_integrations
+
+Revision ID: 19_add_calendar_webhook_debounce
+Revises: 18_add_calendar_sync_schedule
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '19_add_calendar_webhook_debounce'
+down_revision = '18_add_calendar_sync_schedule'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Метка webhook-уведомления (debounce) и аренда воркера на время синхронизации"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.add_column('calendar_integrations', sa.Column('sync_requested_at', sa.DateTime(), nullable=True), schema=schema)
+    op.add_column('calendar_integrations', sa.Column('sync_locked_until', sa.DateTime(), nullable=True), schema=schema)
+    
+    print(f"✅ Added webhook debounce columns to {schema}.calendar_integrations")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_column('calendar_integrations', 'sync_locked_until', schema=schema)
+    op.drop_column('calendar_integrations', 'sync_requested_at', schema=schema)
+    
+    print(f"✅ Removed webhook debounce columns from {schema}.calendar_integrations")
@@ -0,0 +1,56 @@
+"""add external_calendar_events table
+
+Revision ID: 20_add_external_calendar_events
+Revises: 19_add_calendar_webhook_debounce
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '20_add_external_calendar_events'
+down_revision = '19_add_calendar_webhook_debounce'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    """Связь бронирований с событиями во внешних календарях"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.create_table(
+        'external_calendar_events',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('integration_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.calendar_integrations.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('booking_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('terminfinder.bookings.id', ondelete='CASCADE'), nullable=False),
+        sa.Column('provider', sa.String(20), nullable=False),
+        sa.Column('external_event_id', sa.String(500), nullable=False),
+        sa.Column('etag', sa.String(200), nullable=True),
+        sa.Column('start_time', sa.DateTime(), nullable=False),
+        sa.Column('end_time', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('integration_id', 'booking_id', name='uq_external_calendar_events_booking'),
+        schema=schema
+    )
+    op.create_index('ix_external_calendar_events_event', 'external_calendar_events',
+                    ['integration_id', 'external_event_id'], schema=schema)
+    op.create_index('ix_external_calendar_events_booking_id', 'external_calendar_events',
+                    ['booking_id'], schema=schema)
+    
+    print(f"✅ Added {schema}.external_calendar_events")
+
+
+def downgrade():
+    """Откатываем изменения"""
+    import os
+    schema = os.getenv('DB_SCHEMA', 'public')
+    
+    op.drop_index('ix_external_calendar_events_booking_id', table_name='external_calendar_events', schema=schema)
+    op.drop_index('ix_external_calendar_events_event', table_name='external_calendar_events', schema=schema)
+    op.drop_table('external_calendar_events', schema=schema)
+    
+    print(f"✅ Removed {schema}.external_calendar_events")
@@ -1,10 +1,10 @@
 #!/bin/bash
-# Startup script for Render.com - runs both Flask app and RQ worker
+# Startup script for Render.com - runs both Flask app and job worker
 
 echo "🚀 Starting TerminFinder services..."
 
-# Start RQ worker in background
-echo "📦 Starting RQ worker..."
+# Start job worker in background
+echo "📦 Starting job worker..."
 python worker.py &
 WORKER_PID=$!
 echo "✅ Worker started with PID: $WORKER_PID"
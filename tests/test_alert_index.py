@@ -0,0 +1,31 @@
+"""
+Тесты in-memory индекса алертов
+"""
+from datetime import date
+from app.services.alert_index import AlertIndex
+
+
+def test_match_open_and_bounded_ranges():
+    index = AlertIndex()
+    index.add('open', 'doc', None, None, None, None)
+    index.add('until', 'doc', None, None, None, date(2026, 3, 10))
+    index.add('from', 'doc', None, None, date(2026, 3, 5), None)
+    index.add('range', 'doc', None, None, date(2026, 3, 1), date(2026, 3, 31))
+    index.add('short', 'doc', None, None, date(2026, 3, 20), date(2026, 3, 21))
+
+    assert sorted(index.match('doc', None, None, date(2026, 3, 1))) == ['open', 'range', 'until']
+    assert sorted(index.match('doc', None, None, date(2026, 3, 7))) == ['from', 'open', 'range', 'until']
+    assert sorted(index.match('doc', None, None, date(2026, 3, 20))) == ['from', 'open', 'range', 'short']
+    assert sorted(index.match('doc', None, None, date(2026, 4, 1))) == ['from', 'open']
+
+
+def test_discard_removes_alert_from_its_range_list():
+    index = AlertIndex()
+    index.add('until', 'doc', None, None, None, date(2026, 3, 10))
+    index.add('range', 'doc', None, None, date(2026, 3, 1), date(2026, 3, 31))
+
+    index.discard('until')
+    index.discard('range')
+
+    assert index.match('doc', None, None, date(2026, 3, 5)) == []
+    assert len(index) == 0
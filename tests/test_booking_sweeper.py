@@ -0,0 +1,37 @@
+"""
+Тесты sweeper'а прошедших бронирований
+"""
+from datetime import datetime, timedelta
+from app.models import Booking, Patient
+from app.services.booking_sweeper import sweep_past_bookings
+
+
+def test_unmarked_past_bookings_are_completed_in_batches(db, make_booking):
+    now = datetime.utcnow()
+    bookings = [make_booking(now - timedelta(days=1, hours=hours)) for hours in range(1, 4)]
+    future = make_booking(now + timedelta(days=1))
+
+    run = sweep_past_bookings(batch_size=2, grace_hours=12, now=now)
+
+    assert run.batches == 2
+    assert run.succeeded == 3
+    for booking in bookings:
+        stored = db.session.get(Booking, booking.id)
+        assert stored.status == 'completed'
+        assert stored.attended is True
+        assert db.session.get(Patient, stored.patient_id).attended_appointments == 1
+    assert db.session.get(Booking, future.id).status == 'confirmed'
+
+
+def test_late_no_show_mark_corrects_swept_booking(db, make_booking):
+    now = datetime.utcnow()
+    booking = make_booking(now - timedelta(days=1))
+    sweep_past_bookings(grace_hours=12, now=now)
+
+    booking = db.session.get(Booking, booking.id)
+    booking.mark_attended(False)
+
+    patient = db.session.get(Patient, booking.patient_id)
+    assert booking.status == 'no_show'
+    assert patient.attended_appointments == 0
+    assert patient.no_show_count == 1
@@ -0,0 +1,22 @@
+"""
+Тесты планировщика синхронизации календарей
+"""
+from datetime import datetime
+from app.models import BackgroundJob, CalendarIntegration, TaskRun
+from app.services.calendar_sync_executor import schedule_due_syncs, SCHEDULE_TASK_NAME
+
+
+def test_due_integrations_are_scheduled_in_batches(db, doctor):
+    now = datetime.utcnow()
+    for _ in range(3):
+        db.session.add(CalendarIntegration(doctor_id=doctor.id, provider='google'))
+    db.session.commit()
+
+    run = schedule_due_syncs(batch_size=2, now=now)
+
+    assert run.batches == 2
+    assert run.processed == 3
+    assert TaskRun.query.filter_by(task_name=SCHEDULE_TASK_NAME).count() == 1
+    jobs = BackgroundJob.query.filter_by(job_type='calendar.sync_scheduled').all()
+    assert len(jobs) == 2
+    assert CalendarIntegration.query.filter(CalendarIntegration.sync_locked_until > now).count() == 3
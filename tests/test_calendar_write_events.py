@@ -0,0 +1,54 @@
+"""
+Тесты пакетной записи событий во внешние календари
+"""
+import pytest
+from cryptography.fernet import Fernet
+from app.services.calendar_integration_service import CalendarService, ExternalEventGone
+
+
+class FakeCalendarService(CalendarService):
+    """Провайдер с заданной ошибкой обновления"""
+
+    def __init__(self, update_error=None):
+        super().__init__(integration=None)
+        self.update_error = update_error
+
+    def authenticate(self):
+        return True
+
+    def create_event(self, booking):
+        return 'new-event'
+
+    def update_event(self, external_event_id, booking):
+        if self.update_error:
+            raise self.update_error
+        return True
+
+    def delete_event(self, external_event_id):
+        return True
+
+    def get_events(self, time_min, time_max):
+        return []
+
+
+@pytest.fixture(autouse=True)
+def encryption_key(monkeypatch):
+    monkeypatch.setenv('CALENDAR_ENCRYPTION_KEY', Fernet.generate_key().decode())
+
+
+def test_update_of_missing_event_is_reported_gone():
+    service = FakeCalendarService(update_error=ExternalEventGone('404 Not Found'))
+
+    [result] = service.write_events([{'action': 'update', 'event_id': 'old-event', 'booking': None}])
+
+    assert result['ok'] is False
+    assert result['gone'] is True
+
+
+def test_failed_update_is_not_reported_gone():
+    service = FakeCalendarService(update_error=Exception('503 Service Unavailable'))
+
+    [result] = service.write_events([{'action': 'update', 'event_id': 'old-event', 'booking': None}])
+
+    assert result['ok'] is False
+    assert not result.get('gone')
@@ -0,0 +1,24 @@
+"""
+Тесты пересчета daily_stats
+"""
+from datetime import datetime, timedelta
+from app.models import DailyStat, TaskRun
+from app.services.stats_service import refresh_daily_stats, TASK_NAME
+
+
+def test_refresh_daily_stats_runs_in_batches_end_to_end(db, doctor, make_slot):
+    start = datetime.utcnow().replace(hour=9, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    for days in range(3):
+        make_slot(start + timedelta(days=days))
+    make_slot(start + timedelta(hours=1), status='blocked')
+
+    run = refresh_daily_stats(batch_size=2)
+
+    stored = TaskRun.query.filter_by(task_name=TASK_NAME).one()
+    assert stored.id == run.id
+    assert stored.batches == 2
+    assert stored.processed == 3
+    assert DailyStat.query.filter_by(scope='doctor', dirty=True).count() == 0
+
+    first_day = DailyStat.query.filter_by(scope='doctor', scope_id=doctor.id, day=start.date()).one()
+    assert (first_day.slots_total, first_day.slots_available, first_day.slots_blocked) == (2, 1, 1)
@@ -0,0 +1,31 @@
+"""
+Тесты Google Calendar: собственные id событий
+"""
+import re
+import uuid
+from types import SimpleNamespace
+import pytest
+from cryptography.fernet import Fernet
+from app.services.google_calendar_service import GoogleCalendarService
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv('CALENDAR_ENCRYPTION_KEY', Fernet.generate_key().decode())
+    return GoogleCalendarService(SimpleNamespace(id=uuid.uuid4()))
+
+
+def test_event_id_is_stable_base32hex(service):
+    booking = SimpleNamespace(id=uuid.uuid4())
+
+    event_id = service._event_id(booking)
+
+    assert re.fullmatch(r'[a-v0-9]{5,1024}', event_id)
+    assert service._event_id(booking) == event_id
+
+
+def test_recreated_event_gets_new_id(service):
+    booking = SimpleNamespace(id=uuid.uuid4())
+    event_id = service._event_id(booking)
+
+    assert service._event_id(booking, replaces=event_id) != event_id
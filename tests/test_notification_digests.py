@@ -0,0 +1,25 @@
+"""
+Тесты дайджестов уведомлений
+"""
+from datetime import datetime, timedelta
+from app.models import NotificationOutbox, TaskRun
+from app.services.notification_service import dispatch_notification_digests, TASK_NAME
+
+
+def test_digests_run_in_batches_end_to_end(db, make_patient):
+    now = datetime.utcnow()
+    for _ in range(3):
+        db.session.add(NotificationOutbox(
+            patient_id=make_patient().id,
+            payload='{"slots": [], "total": 1}',
+            created_at=now - timedelta(hours=1)
+        ))
+    db.session.commit()
+
+    run = dispatch_notification_digests(batch_size=2, now=now)
+
+    stored = TaskRun.query.filter_by(task_name=TASK_NAME).one()
+    assert stored.id == run.id
+    assert stored.batches == 2
+    assert stored.processed == 3
+    assert NotificationOutbox.query.filter_by(status='pending').count() == 0
@@ -0,0 +1,31 @@
+"""
+Тесты журнала периодических задач (TaskRun)
+"""
+from datetime import datetime, timedelta
+from app.models import Booking, TaskRun
+from app.services.reminder_service import dispatch_due_reminders, TASK_NAME
+
+
+def test_new_task_run_counters_start_at_zero():
+    run = TaskRun(task_name='test.task', started_at=datetime.utcnow())
+
+    run.batches += 1
+    run.processed += 3
+
+    assert (run.processed, run.succeeded, run.failed, run.skipped, run.batches) == (3, 0, 0, 0, 1)
+
+
+def test_reminders_run_in_batches_end_to_end(db, make_booking):
+    now = datetime.utcnow()
+    for hours in range(1, 6):
+        make_booking(now + timedelta(hours=hours))
+
+    run = dispatch_due_reminders(batch_size=2, now=now)
+
+    stored = TaskRun.query.filter_by(task_name=TASK_NAME).one()
+    assert stored.id == run.id
+    assert stored.batches == 3
+    assert stored.processed == 5
+    assert stored.finished_at is not None
+    # У тестовых пациентов нет email - напоминания помечены как обработанные
+    assert Booking.query.filter_by(reminder_sent=False).count() == 0
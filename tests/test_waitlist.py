@@ -0,0 +1,33 @@
+"""
+Тесты листа ожидания
+"""
+from datetime import datetime, timedelta
+from app.models import PatientAlert, SlotOffer, TimeSlot
+from app.services.waitlist_service import expire_offers
+
+
+def test_expired_offer_is_handed_to_next_patient(db, doctor, make_slot, make_patient):
+    now = datetime.utcnow()
+    slot = make_slot(now + timedelta(days=2), status='held')
+    first, second = make_patient(), make_patient()
+    for patient in (first, second):
+        db.session.add(PatientAlert(patient_id=patient.id, doctor_id=doctor.id))
+        db.session.commit()
+
+    expired = SlotOffer(
+        timeslot_id=slot.id,
+        patient_id=first.id,
+        offered_at=now - timedelta(minutes=30),
+        expires_at=now - timedelta(minutes=15)
+    )
+    db.session.add(expired)
+    db.session.commit()
+
+    run = expire_offers(now=now)
+
+    assert run.processed == 1
+    assert run.succeeded == 1
+    assert db.session.get(SlotOffer, expired.id).status == 'expired'
+    new_offer = SlotOffer.query.filter_by(timeslot_id=slot.id, status='pending').one()
+    assert new_offer.patient_id == second.id
+    assert db.session.get(TimeSlot, slot.id).status == 'held'
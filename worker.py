@@ -1,52 +1,63 @@
 """
-RQ Worker Startup Script
+Job Worker Startup Script
 =========================
 
-Run this script to start RQ workers for processing background tasks.
+Run this script to start the background job worker.
 
 Usage:
     python worker.py
 
-This will start workers for all queues:
-- high: High priority tasks (notifications)
-- default: Medium priority tasks (calendar sync)
-- low: Low priority tasks (alerts, cleanup)
+The worker:
+- executes jobs from the background_jobs table (alert fan-out, waitlist offers,
+  calendar sync)
+  on a bounded thread pool (JOB_WORKER_CONCURRENCY), claimed with
+  PostgreSQL FOR UPDATE SKIP LOCKED, so several workers can run side by side
+- retries failed jobs with exponential backoff and records per-job timings
+- runs periodic tasks: reminders, booking sweeper, waitlist expiry, notification digests,
+  daily stats refresh, doctor recommendations, scheduled calendar sync,
+  calendar HTTP latency histograms
 """
 
 import os
+import signal
 import sys
-from redis import Redis
-from rq import Worker, Queue, Connection
-import ssl
 
 # Add app to path
 sys.path.insert(0, os.path.dirname(__file__))
 
-# Import app to ensure all models and services are loaded
 from app import create_app
+from app.services.job_queue import JobWorker
+from app.services.reminder_service import dispatch_due_reminders
+from app.services.booking_sweeper import sweep_past_bookings
+from app.services.waitlist_service import expire_offers
+from app.services.notification_service import dispatch_notification_digests
+from app.services.stats_service import refresh_daily_stats
+from app.services.recommendation_service import rebuild_recommendations
+from app.services.calendar_sync_executor import schedule_due_syncs
+from app.services.calendar_http import report_http_latency
+
+app = create_app(os.getenv('FLASK_ENV', 'development'))
+
+# (интервал в секундах, задача)
+PERIODIC_TASKS = [
+    (10, schedule_due_syncs),
+    (60, expire_offers),
+    (60, dispatch_notification_digests),
+    (60, refresh_daily_stats),
+    (300, dispatch_due_reminders),
+    (300, rebuild_recommendations),
+    (300, report_http_latency),
+    (900, sweep_past_bookings),
+]
 
-app = create_app()
-
-# Redis connection with SSL support for Upstash
-redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+if __name__ == '__main__':
+    worker = JobWorker(app, periodic=PERIODIC_TASKS)
 
-# SSL configuration for rediss:// URLs (Upstash)
-if redis_url.startswith('rediss://'):
-    redis_conn = Redis.from_url(
-        redis_url,
-        ssl_cert_reqs=None,  # Disable certificate verification for Upstash
-        decode_responses=False
-    )
-else:
-    redis_conn = Redis.from_url(redis_url)
+    def shutdown(signum, frame):
+        print("Stopping job worker...")
+        worker.stop()
 
-# Define queues to listen to
-listen = ['high', 'default', 'low']
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
 
-if __name__ == '__main__':
-    with app.app_context():
-        with Connection(redis_conn):
-            worker = Worker(list(map(Queue, listen)))
-            print(f"Starting RQ worker listening to queues: {listen}")
-            print(f"Redis URL: {redis_url}")
-            worker.work()
+    worker.run_forever()